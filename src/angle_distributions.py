@@ -28,8 +28,10 @@
 # This link validates our approach in structures.py of selecting \theta uniformly between 0 and 2*\pi.
 # The only question then is how to sample \phi, the angle which sets the "steepness" of the cone.
 #
-# For the nicked distribution, we just draw from the histogram since that is non-uniform anyway,
-# and convert to radians before we return.
+# For the nicked distribution, we draw from the inverse of the CDF of a kernel density estimate of the
+# measured angles (in degrees), interpolating linearly between the points of its table, and convert to radians
+# before we return. The table is precomputed from the raw data by buildNickedAngleTable, saved next to this
+# file, and loaded once per process (see loadNickedAngleTable).
 #
 # For the distributions that are intended to be uniform, we must compensate as per the link above.
 #
@@ -41,10 +43,18 @@
 #  Choose v uniformly distributed between 0 and 0.5
 #  Then, \phi = \arccos(2*v - 1)
 #
+# Each distribution can also sample \phi restricted to an interval [lo, hi] directly (sampleTruncatedAngle),
+# by drawing from the inverse CDF restricted to that interval rather than resampling until \phi falls in it.
+# This also returns the probability of the interval under the untruncated distribution, which is the
+# importance weight of the sample relative to the untruncated distribution.
+# For the full sphere, the CDF is F(\phi) = (1 - \cos(\phi))/2, and for the hemisphere it is F(\phi) = -\cos(\phi)
+# on [\pi/2, \pi]. For the nicked distribution, we just use the interpolated CDF table.
+#
 
 ########################################################################
 
-#from constants import *
+from constants import *
+import os
 import math
 import numpy as np
 from scipy.stats import gaussian_kde
@@ -58,6 +68,13 @@ class UniformSphereAngleDistribution:
         phi = math.acos(2*v - 1) # Circle compensation
         return phi
 
+    def sampleTruncatedAngle(self, prng, lo, hi):
+        F_lo = (1 - math.cos(lo)) / 2
+        F_hi = (1 - math.cos(hi)) / 2
+        v = prng.uniform(F_lo, F_hi)
+        phi = math.acos(max(-1.0, min(1.0, 1 - 2*v)))
+        return (phi, F_hi - F_lo)
+
 ########################################################################
 
 class UniformHemisphereAngleDistribution:
@@ -67,40 +84,102 @@ class UniformHemisphereAngleDistribution:
         phi = math.acos(2*v - 1) # Circle compensation
         return phi
 
+    def sampleTruncatedAngle(self, prng, lo, hi):
+        F_lo = max(0.0, min(1.0, -math.cos(lo)))
+        F_hi = max(0.0, min(1.0, -math.cos(hi)))
+        if F_hi <= F_lo:
+            return (max(lo, math.pi / 2), 0.0) # The interval has probability zero
+        v = prng.uniform(F_lo, F_hi)
+        phi = math.acos(-v)
+        return (phi, F_hi - F_lo)
+
 ########################################################################
 
 class NickedAngleDistribution:
 
-    def __init__(self):
-        # nicked_angles_data.tsv is raw data from Chatterjee et al SI.
-        # First column is true nick data.
-        # Second column is with one or more based deleted from the nick.
-        # So we only really care about the first column.
-        angles = []
-        with open('nicked_angles_data.tsv') as f:
-            next(f)
-            for line in f:
-                data = line.split("\t")
-                angles.append(float(data[1]))
-        self.angles = np.array(angles)
-        self.x_grid = np.linspace(min(self.angles), max(self.angles), len(self.angles))
-        self.kdepdf = self.kde(self.angles, self.x_grid, bandwith=0.1)
-        self.cdf = self.initalize_cdf()
-
-    def kde(self, x,x_grid,bandwith=0.2, **kwargs):
-        # Kernel Density Estimation with scipy
-        kde = gaussian_kde(x,bw_method=bandwith/x.std(ddof=1),**kwargs)
-        return kde.evaluate(x_grid)
-
-    def initalize_cdf(self):
-        cdf = np.cumsum(self.kdepdf)
-        cdf = cdf / cdf[-1]
-        return cdf
+    # The table is the path of a precomputed CDF table, by default the one in the source directory.
+    def __init__(self, table=None):
+        (self.x_grid, self.cdf) = loadNickedAngleTable(table)
+
+    # The angles (in degrees) at which the CDF takes the given values, for an array of values between 0 and 1.
+    def inverseCdf(self, values):
+        return np.interp(values, self.cdf, self.x_grid)
+
+    # The CDF at the given angles (in degrees).
+    def cdfAt(self, degrees):
+        return np.interp(degrees, self.x_grid, self.cdf, left=0.0, right=1.0)
 
     def sampleAngle(self, prng):
         value = prng.random()
-        value_bins = np.searchsorted(self.cdf, value)
-        degrees_random_from_cdf = self.x_grid[value_bins]
-        return math.radians(degrees_random_from_cdf)
+        return math.radians(float(self.inverseCdf(value)))
+
+    # Draw n angles at once, as an array, from a numpy Generator or a random.Random (see uniformArray).
+    def sampleAngles(self, prng, n):
+        return np.radians(self.inverseCdf(uniformArray(prng, n)))
+
+    def sampleTruncatedAngle(self, prng, lo, hi):
+        F_lo = float(self.cdfAt(math.degrees(lo)))
+        F_hi = float(self.cdfAt(math.degrees(hi)))
+        if F_hi <= F_lo:
+            return (lo, 0.0) # The interval has probability zero
+        value = prng.uniform(F_lo, F_hi)
+        phi = math.radians(float(self.inverseCdf(value)))
+        return (min(max(phi, lo), hi), F_hi - F_lo)
+
+# An array of n values uniformly distributed in [0, 1), drawn in a single call to prng, which is either a numpy
+# Generator or a random.Random (whose random bytes are turned into doubles with 53 random bits, as random() does).
+def uniformArray(prng, n):
+    if isinstance(prng, np.random.Generator):
+        return prng.random(n)
+    bits = np.frombuffer(prng.randbytes(8 * n), dtype=np.uint64)
+    return (bits >> np.uint64(11)) * (1.0 / 2**53)
+
+# Tables loaded so far, by path, so that each is only read once per process.
+__nicked_angle_tables__ = {}
+
+def nickedAnglePath(filename):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+
+# Load a precomputed nick angle CDF table (by default NICKED_ANGLE_TABLE in the source directory), as a pair
+# (x_grid, cdf) of arrays, where cdf increases from 0 at the smallest angle to 1 at the largest.
+# Loading never writes anything: a missing table has to be built from the raw data with buildNickedAngleTable.
+def loadNickedAngleTable(path=None):
+    if path is None:
+        path = nickedAnglePath(NICKED_ANGLE_TABLE)
+    if path not in __nicked_angle_tables__:
+        if not os.path.exists(path):
+            raise FileNotFoundError('No nick angle CDF table at ' + path + '. Build it from the raw nick angle data (see README.md) by running\n'
+                                    '  python -c "import angle_distributions; angle_distributions.buildNickedAngleTable(\'nicked_angles_data.tsv\')"\n'
+                                    'in ' + os.path.dirname(os.path.abspath(__file__)))
+        with np.load(path) as table:
+            __nicked_angle_tables__[path] = (table['x_grid'], table['cdf'])
+    return __nicked_angle_tables__[path]
+
+# Build the nick angle CDF table from the raw data file and save it (by default to NICKED_ANGLE_TABLE in the
+# source directory, for shipping with the code), replacing any table loaded from the same path. This is an offline
+# tool, which is never called when a table is loaded.
+# The raw data (nicked_angles_data.tsv) is from Chatterjee et al SI.
+# First column is true nick data.
+# Second column is with one or more based deleted from the nick.
+# So we only really care about the first column.
+def buildNickedAngleTable(data, path=None, bandwidth=NICKED_ANGLE_BANDWIDTH):
+    if path is None:
+        path = nickedAnglePath(NICKED_ANGLE_TABLE)
+    angles = []
+    with open(data) as f:
+        next(f)
+        for line in f:
+            fields = line.split("\t")
+            angles.append(float(fields[1]))
+    angles = np.array(angles)
+    x_grid = np.linspace(min(angles), max(angles), len(angles))
+    # Kernel Density Estimation with scipy
+    pdf = gaussian_kde(angles, bw_method=bandwidth/angles.std(ddof=1)).evaluate(x_grid)
+    # Integrate with the trapezoid rule, so the CDF is 0 at the first grid point and its linear interpolation is exact
+    cdf = np.concatenate(([0.0], np.cumsum((pdf[1:] + pdf[:-1]) / 2 * np.diff(x_grid))))
+    cdf = np.maximum.accumulate(cdf / cdf[-1])
+    np.savez(path, x_grid=x_grid, cdf=cdf)
+    __nicked_angle_tables__[path] = (x_grid, cdf)
+    return (x_grid, cdf)
 
 ########################################################################
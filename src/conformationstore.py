@@ -0,0 +1,126 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+import hashlib
+import os
+import sqlite3
+import numpy as np
+from constants import *
+from regiongraphcache import regionGraphFingerprint, speciesFingerprint
+
+#
+# Store of the satisfying conformations found by a constraint checker, for inspecting, plotting or reusing
+# them after a run without keeping them all in memory.
+#
+# The coordinates of the vertexes of the region graphs of the components are appended, as float32 (x, y, z) rows,
+# to a single binary file (path + '.coords'), which can be memory-mapped as an (N, 3) array (see coordinates).
+# An SQLite index (path + '.index') records, for each component of each stored species, where its rows start
+# and how many there are (one per vertex of its region graph, in vertex id order). Species are indexed by
+# speciesKey and components by componentFingerprint, both of which are hashes, so the same species
+# or component has the same key in every run.
+#
+# Appending takes the write lock of the index first, so several processes can append to the same store.
+# The conformation of a species is only stored once.
+#
+
+# A hash of the fingerprint of a connected component (see regionGraphFingerprint).
+def componentFingerprint(sg):
+    return hashlib.sha256(repr(regionGraphFingerprint(sg)).encode('utf-8')).hexdigest()
+
+# A hash of the fingerprint of a species (see speciesFingerprint).
+def speciesKey(sp):
+    return hashlib.sha256(repr(speciesFingerprint(sp)).encode('utf-8')).hexdigest()
+
+class ConformationStore:
+
+    def __init__(self, path, timeout=VERDICT_STORE_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.__connect__()
+
+    def __connect__(self):
+        self.connection = sqlite3.connect(self.path + '.index', timeout=self.timeout, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS conformations (species TEXT NOT NULL, component INTEGER NOT NULL, '
+                                'component_key TEXT NOT NULL, offset INTEGER NOT NULL, vertices INTEGER NOT NULL, '
+                                'PRIMARY KEY (species, component))')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS conformations_by_component ON conformations (component_key)')
+
+    # Connections cannot be shared between processes, so a pickled store reconnects when it is unpickled.
+    def __getstate__(self):
+        return {'path': self.path, 'timeout': self.timeout}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__connect__()
+
+    # The number of species stored.
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(DISTINCT species) FROM conformations').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    # Append the conformation of a species, given as a list with the list of coordinates (see
+    # SampledStructures.allCoords) or (V, 3) array of coordinates of each of its components, in order.
+    def put(self, sp, sg_list, conformation):
+        key = speciesKey(sp)
+        arrays = [np.asarray([(c.x, c.y, c.z) for c in coords] if isinstance(coords, list) else coords, dtype=np.float32).reshape(-1, 3) for coords in conformation]
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            if self.connection.execute('SELECT 1 FROM conformations WHERE species = ?', (key,)).fetchone() is None:
+                with open(self.path + '.coords', 'ab') as f:
+                    offset = f.seek(0, os.SEEK_END) // (3 * np.dtype(np.float32).itemsize)
+                    for (k, (sg, a)) in enumerate(zip(sg_list, arrays)):
+                        f.write(a.tobytes())
+                        self.connection.execute('INSERT INTO conformations (species, component, component_key, offset, vertices) VALUES (?, ?, ?, ?, ?)',
+                                                (key, k, componentFingerprint(sg), offset, len(a)))
+                        offset += len(a)
+            self.connection.execute('COMMIT')
+        except:
+            self.connection.execute('ROLLBACK')
+            raise
+
+    # All of the stored coordinates, as a read-only memory-mapped (N, 3) float32 array.
+    def coordinates(self):
+        filename = self.path + '.coords'
+        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+            return np.zeros((0, 3), dtype=np.float32)
+        return np.memmap(filename, dtype=np.float32, mode='r').reshape(-1, 3)
+
+    # The conformation of a species (or of the species with the given fingerprint), as a list with the (V, 3) array of
+    # coordinates of each of its components (views of the memory-mapped coordinates), or None if it is not stored.
+    def get(self, sp):
+        key = sp if isinstance(sp, str) else speciesKey(sp)
+        rows = self.connection.execute('SELECT offset, vertices FROM conformations WHERE species = ? ORDER BY component', (key,)).fetchall()
+        if len(rows) == 0:
+            return None
+        coords = self.coordinates()
+        return [coords[offset:offset + vertices] for (offset, vertices) in rows]
+
+    # All of the stored conformations of a connected component (e.g. as starting points for MCMC), as a list of (V, 3) arrays.
+    def componentConformations(self, sg):
+        rows = self.connection.execute('SELECT offset, vertices FROM conformations WHERE component_key = ? ORDER BY rowid', (componentFingerprint(sg),)).fetchall()
+        coords = self.coordinates()
+        return [coords[offset:offset + vertices] for (offset, vertices) in rows]
+
+    # The fingerprints of the stored species.
+    def speciesKeys(self):
+        return [row[0] for row in self.connection.execute('SELECT DISTINCT species FROM conformations ORDER BY rowid')]
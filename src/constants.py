@@ -32,6 +32,48 @@ NICKED_FLAG = True
 # Maximum number of sampling attempts
 SAMPLING_TRIALS = 1000
 
+# Parameters related to adaptive sampling (see ConstraintChecker_Sampling)
+ADAPTIVE_INITIAL_TRIALS = 100
+ADAPTIVE_ESCALATION_FACTOR = 4
+ADAPTIVE_NEAR_MISS_TOLERANCE = 0.5
+IMPLAUSIBLE_CONFIDENCE = 0.95
+
+# Maximum number of region graphs kept in a constraint checker's region graph cache
+REGION_GRAPH_CACHE_SIZE = 10000
+
+# Maximum number of vertex orderings tried when putting a region graph into canonical form
+# for its geometric signature (see geometricsignature.py)
+GEOMETRIC_SIGNATURE_SEARCH_LIMIT = 256
+
+# Parameters related to warm-started MCMC (see ConstraintChecker_MCMC)
+MCMC_STEPS = 500
+MCMC_TEMPERATURE = 0.05
+MCMC_PIVOT_ANGLE = 0.5 # Standard deviation of the random rotation angles (radians)
+
+# Seconds to wait for a lock on a persistent verdict store shared with other processes (see verdictstore.py)
+VERDICT_STORE_TIMEOUT = 60.0
+
+# Radii (nm) of double- and single-stranded regions for the optional excluded volume constraint (see excludedvolume.py).
+# Single-stranded regions are left out by default, since they are flexible and need not follow the straight line between their ends.
+EXCLUDED_VOLUME_DS_RADIUS = 1.0
+EXCLUDED_VOLUME_SS_RADIUS = 0.0
+
+# Side (nm) of the grid cells of the spatial index over the tethers of a tile species (see tetherindex.py)
+TETHER_INDEX_CELL_SIZE = 10.0
+
+# Parameters related to local concentrations for the rates of localized binding (see localconcentration.py):
+# the number of sampling trials for the ensemble of conformations of each component, the distance (nm) within
+# which two domains are taken to meet, and the concentration (molar) that the binding rates are relative to
+LOCAL_CONCENTRATION_SAMPLES = 200
+CAPTURE_RADIUS = 2.0
+RATE_CONCENTRATION_UNIT = 1e-9 # Binding rates are per nM per second
+
+# File (in the source directory) holding the CDF table for NickedAngleDistribution, precomputed from the raw nick
+# angle data from the Chatterjee et al SI, and the bandwidth (degrees) of the kernel density estimate used to smooth
+# the data (see angle_distributions.py)
+NICKED_ANGLE_TABLE = 'nicked_angles_cdf.npz'
+NICKED_ANGLE_BANDWIDTH = 0.1
+
 # Print some/all constants
 def printMainConstants(splitter=' '):
     print(f'ssDNA length per nucleotide (nm):{splitter}{DS_LENGTH}')
@@ -45,3 +87,21 @@ def printAllConstants(splitter=' '):
     print(f'ssDNA persistence length (nm):{splitter}{SSDNA_PERSISTENCE_LENGTH}')
     print(f'dsDNA persistence length (nm):{splitter}{DSDNA_PERSISTENCE_LENGTH}')
     printMainConstants()
+    print(f'Adaptive sampling initial trials:{splitter}{ADAPTIVE_INITIAL_TRIALS}')
+    print(f'Adaptive sampling escalation factor:{splitter}{ADAPTIVE_ESCALATION_FACTOR}')
+    print(f'Adaptive sampling near-miss tolerance:{splitter}{ADAPTIVE_NEAR_MISS_TOLERANCE}')
+    print(f'Confidence level for implausible verdicts:{splitter}{IMPLAUSIBLE_CONFIDENCE}')
+    print(f'Region graph cache size:{splitter}{REGION_GRAPH_CACHE_SIZE}')
+    print(f'Geometric signature search limit:{splitter}{GEOMETRIC_SIGNATURE_SEARCH_LIMIT}')
+    print(f'MCMC steps for warm starts:{splitter}{MCMC_STEPS}')
+    print(f'MCMC temperature:{splitter}{MCMC_TEMPERATURE}')
+    print(f'MCMC pivot angle standard deviation (radians):{splitter}{MCMC_PIVOT_ANGLE}')
+    print(f'Verdict store lock timeout (seconds):{splitter}{VERDICT_STORE_TIMEOUT}')
+    print(f'Excluded volume radius of double-stranded regions (nm):{splitter}{EXCLUDED_VOLUME_DS_RADIUS}')
+    print(f'Excluded volume radius of single-stranded regions (nm):{splitter}{EXCLUDED_VOLUME_SS_RADIUS}')
+    print(f'Tether index cell size (nm):{splitter}{TETHER_INDEX_CELL_SIZE}')
+    print(f'Sampling trials for local concentration ensembles:{splitter}{LOCAL_CONCENTRATION_SAMPLES}')
+    print(f'Capture radius for local concentrations (nm):{splitter}{CAPTURE_RADIUS}')
+    print(f'Concentration unit of binding rates (M):{splitter}{RATE_CONCENTRATION_UNIT}')
+    print(f'Nick angle CDF table file:{splitter}{NICKED_ANGLE_TABLE}')
+    print(f'Nick angle kernel density bandwidth (degrees):{splitter}{NICKED_ANGLE_BANDWIDTH}')
@@ -19,11 +19,55 @@
 ##########################################################################################
 
 from abc import ABC, abstractmethod
+from regiongraphcache import RegionGraphCache
 
 class ConstraintChecker_Abstract(ABC):
 
     def __init__(self):
         super().__init__()
+        self.regionGraphCache = RegionGraphCache()
+
+    # Get the region graph for a connected strand graph, from the region graph cache if possible.
+    # The fingerprint of sg (see regiongraphcache.py) can be supplied as key, if it is already known.
+    def getRegionGraph(self, sg, key=None):
+        return self.regionGraphCache.getRegionGraph(sg, key)
+
+    # Describe everything about this checker that can affect its verdict on the species sp (other than
+    # the species itself and the constants in constants.py), as a tuple of plain values. Persistent verdict
+    # stores use this to tell verdicts from differently configured checkers apart (see verdictstore.py).
+    def verdictParameters(self, sp):
+        return (type(self).__name__,)
+
+    # Whether the verdicts of this checker are reproducible, given its verdict parameters, so that they can be
+    # stored and served again later (see verdictstore.py). They are by default.
+    def reproducibleVerdicts(self):
+        return True
+
+    # Whether this checker rejects conformations in which regions overlap (see excludedvolume.py). It does not by default.
+    def excludesVolume(self):
+        return False
+
+    # Called by the enumerator before it checks the products of the reactions between the given species,
+    # so that checkers can make use of what they already know about the reactants. Does nothing by default.
+    def setReactants(self, species_list):
+        pass
+
+    # Called by a persistent verdict store (see verdictstore.py) when it serves its stored verdict on the species sp,
+    # with the list of sampling_info dicts of its components, instead of asking this checker. Does nothing by default.
+    def storedVerdict(self, sp, flag, info_list):
+        pass
+
+    # Called by the enumerator when it has finished, so that checkers can release what they hold on to
+    # between species (e.g. worker processes). Does nothing by default.
+    def close(self):
+        pass
+
+    # Estimate the local concentrations of the sites of each of the given pairs around each other, for the rates of
+    # localized binding, where the sites are numbered as in the composition of the given connected components, in order.
+    # Returns a list of concentrations in the concentration units of the binding rates (see localconcentration.py),
+    # or None if this checker cannot estimate them, which it cannot by default.
+    def localConcentrations(self, components, pairs):
+        return None
 
     #
     # ABSTRACT METHOD:
@@ -0,0 +1,188 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+########################################################################
+
+#
+# NOTES ON DECIDING TREE-SHAPED REGION GRAPHS
+# ===========================================
+#
+# If the region graph of a component is a tree (ignoring single-stranded self-loops, which are always
+# satisfied by a distance of zero), with at most one tether, the constraints can be decided exactly.
+#
+# A double-stranded self-loop can never be satisfied, since its ends would have to be a positive distance
+# from the same point. Otherwise, single-stranded regions impose nothing: they can always be given length
+# zero, and nick angles only involve double-stranded regions meeting at the same vertex.
+#
+# The nick angle at a junction is the deviation between the two regions, so the directions of the two
+# regions away from the shared vertex must be separated by an angle of at least
+# \alpha = 180 - NICKEDANGLE_UPPER_BOUND degrees. So a vertex with k double-stranded regions needs k
+# directions that are pairwise separated by at least \alpha. In a tree, the directions chosen at different
+# vertices are independent, since the subtree hanging off each region can be rotated rigidly about the
+# vertex to match whatever direction the region was given at its other end.
+#
+# Without a tether, the conformation can be translated and rotated freely, so the component is plausible
+# iff every vertex has at most N(\alpha) double-stranded regions, where N(\alpha) is the largest number of
+# points on the sphere that are pairwise separated by at least \alpha. This is the Tammes problem, whose
+# optimal separations are known for small N (see TAMMES_ANGLES below).
+#
+# With a single tether, the conformation must also stay above the surface. Laying the whole tree flat on the
+# surface, with the same rotation argument in the plane, shows that it is plausible if every vertex has at
+# most floor(360 / \alpha) double-stranded regions, and the Tammes bound still shows that it is implausible if
+# some vertex has more than N(\alpha). Components in between, cyclic components and components with several
+# tethers are left to the delegate checker.
+#
+# The analysis ignores excluded volume, so if the delegate checker rejects overlapping regions (see
+# excludedvolume.py), components can still be rejected analytically, but species are only accepted by the delegate.
+#
+
+########################################################################
+
+import math
+from constraintchecker_abstract import *
+from constraintchecker_sampling import *
+from regiongraph import *
+from tilespecies import TileSpecies
+from freespecies import FreeSpecies
+
+# Largest minimum angular separation (in degrees) of N points on the sphere, indexed by N.
+# These are the proven optimal solutions of the Tammes problem for N <= 14.
+TAMMES_ANGLES = [math.inf, math.inf, 180.0, 120.0, 109.4712, 90.0, 90.0, 77.8695, 74.8585,
+                 70.5288, 66.1468, 63.4349, 63.4349, 57.1367, 55.6706]
+
+# Constraint checker that decides components whose region graphs are trees with at most one tether exactly,
+# without sampling (see the notes above), and passes any species that it cannot decide on to a delegate checker
+# (by default a ConstraintChecker_Sampling constructed with the given keyword arguments).
+class ConstraintChecker_Analytic(ConstraintChecker_Abstract):
+
+    def __init__(self, delegate=None, **kwargs):
+        super().__init__()
+        if delegate is None:
+            delegate = ConstraintChecker_Sampling(**kwargs)
+        self.delegate = delegate
+        self.regionGraphCache = delegate.regionGraphCache
+        self.analyticDecisions = 0 # Number of species decided without the delegate
+
+    def verdictParameters(self, sp):
+        return (type(self).__name__, self.acceptsAnalytically(), self.delegate.verdictParameters(sp))
+
+    # Whether species can be accepted analytically, which they cannot if the delegate checks excluded volume.
+    def acceptsAnalytically(self):
+        return not self.delegate.excludesVolume()
+
+    def localConcentrations(self, components, pairs):
+        return self.delegate.localConcentrations(components, pairs)
+
+    def reproducibleVerdicts(self):
+        return self.delegate.reproducibleVerdicts()
+
+    def excludesVolume(self):
+        return self.delegate.excludesVolume()
+
+    def close(self):
+        self.delegate.close()
+
+    def setReactants(self, species_list):
+        self.delegate.setReactants(species_list)
+
+    def storedVerdict(self, sp, flag, info_list):
+        self.delegate.storedVerdict(sp, flag, info_list)
+
+    def isPlausible(self, sp, debug=False):
+        if(sp is None): return (False, 0)
+        sg_list = []
+        if isinstance(sp, FreeSpecies):
+            sg_list = [sp.sg]
+        elif(isinstance(sp, TileSpecies)):
+            sg_list = sp.tiles_sg
+        else:
+            assert False
+        verdicts = []
+        for sg in sg_list:
+            if (sg.isConnected()):
+                verdicts.append(analyticVerdict(self.getRegionGraph(sg)))
+            else:
+                assert False
+        # A component that is decided to be implausible decides the species, whatever the other components are
+        rejected = [k for (k, (verdict, reason)) in enumerate(verdicts) if verdict is False]
+        if (len(rejected) > 0):
+            verdicts = verdicts[:rejected[0] + 1]
+        elif (any(verdict is None for (verdict, reason) in verdicts) or not self.acceptsAnalytically()):
+            return self.delegate.isPlausible(sp)
+        self.analyticDecisions += 1
+        return (len(rejected) == 0, [(sp, analyticSamplingInfo(verdict, reason)) for (verdict, reason) in verdicts])
+
+# The sampling_info for a component decided analytically, with the same entries as the sampling_info from
+# ConstraintChecker_Sampling (with no trials), so that the diagnostics treat both alike (see rejectiondiagnostics.py).
+def analyticSamplingInfo(verdict, reason):
+    sampling_info = {'sampling_unsuccessful_trials': 0,
+                     'sampling_weighted_acceptance': 1.0 if verdict else 0.0,
+                     'sampling_rejections': {},
+                     'sampling_violations': {},
+                     'analytic_verdict': verdict,
+                     'analytic_reason': reason}
+    if verdict:
+        sampling_info['sampling_importance_weight'] = 1.0
+    else:
+        sampling_info['sampling_acceptance_upper_bound'] = 0.0
+    return sampling_info
+
+# Largest number of directions that can be pairwise separated by at least alpha degrees,
+# on the sphere (if the Tammes table is long enough to tell, and otherwise None).
+def sphereDirectionCapacity(alpha):
+    for n in range(2, len(TAMMES_ANGLES) - 1):
+        if (TAMMES_ANGLES[n] >= alpha and TAMMES_ANGLES[n + 1] < alpha):
+            return n
+    return None
+
+# Largest number of directions in the plane that can be pairwise separated by at least alpha degrees.
+def planeDirectionCapacity(alpha):
+    if (alpha <= 0):
+        return math.inf
+    return int(math.floor(360.0 / alpha + 1e-9))
+
+# Decide the constraints on a component exactly if its region graph is a tree with at most one tether
+# (see the notes above). Returns a pair (verdict, reason), where verdict is True or False if the component
+# was decided and None otherwise, and reason is a short description of the decision.
+def analyticVerdict(rg):
+    n = rg.numVertices()
+    self_loops = rg.edge_v1 == rg.edge_v2
+    if np.any(self_loops & rg.edge_ds):
+        return (False, 'double-stranded self-loop')
+    if (np.count_nonzero(~self_loops) != n - 1):
+        return (None, 'cyclic')
+    tethers = dict(rg.getTetherIds())
+    if (len(tethers) > 1):
+        return (None, 'multiple tethers')
+    if (not NICKED_FLAG):
+        return (True, 'tree')
+    ds = rg.edge_ds & ~self_loops
+    degree = int(np.bincount(np.concatenate((rg.edge_v1[ds], rg.edge_v2[ds])), minlength=n).max(initial=0))
+    alpha = 180.0 - NICKEDANGLE_UPPER_BOUND
+    sphere_capacity = sphereDirectionCapacity(alpha)
+    if (sphere_capacity is not None and degree > sphere_capacity):
+        return (False, 'nick angles at a vertex with ' + str(degree) + ' double-stranded regions')
+    if (len(tethers) == 0):
+        if (sphere_capacity is not None):
+            return (True, 'untethered tree')
+        return (None, 'nick angle bound outside the Tammes table')
+    if (degree <= planeDirectionCapacity(alpha)):
+        return (True, 'tethered tree')
+    return (None, 'tethered tree with a vertex of ' + str(degree) + ' double-stranded regions')
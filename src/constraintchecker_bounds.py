@@ -0,0 +1,97 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+import math
+from constraintchecker_abstract import *
+from constraintchecker_sampling import *
+from regiongraph import *
+from tilespecies import TileSpecies
+from freespecies import FreeSpecies
+
+
+# Constraint checker that first tries to prove a species implausible from distance bounds alone
+# (see RegionGraph.distanceBounds), and only passes the species on to a delegate checker
+# (by default a ConstraintChecker_Sampling constructed with the given keyword arguments)
+# if the bounds cannot rule it out. The bounds are a necessary condition only, so a species
+# is never rejected unless no conformation of it can satisfy the constraints.
+class ConstraintChecker_Bounds(ConstraintChecker_Abstract):
+
+    def __init__(self, delegate=None, **kwargs):
+        super().__init__()
+        if delegate is None:
+            delegate = ConstraintChecker_Sampling(**kwargs)
+        self.delegate = delegate
+        self.regionGraphCache = delegate.regionGraphCache
+        self.boundsRejections = 0 # Number of species rejected by the bounds alone
+
+    def verdictParameters(self, sp):
+        return (type(self).__name__, self.delegate.verdictParameters(sp))
+
+    def localConcentrations(self, components, pairs):
+        return self.delegate.localConcentrations(components, pairs)
+
+    def reproducibleVerdicts(self):
+        return self.delegate.reproducibleVerdicts()
+
+    def excludesVolume(self):
+        return self.delegate.excludesVolume()
+
+    def close(self):
+        self.delegate.close()
+
+    def setReactants(self, species_list):
+        self.delegate.setReactants(species_list)
+
+    def storedVerdict(self, sp, flag, info_list):
+        self.delegate.storedVerdict(sp, flag, info_list)
+
+    def isPlausible(self, sp, debug=False):
+        if(sp is None): return (False, 0)
+        sg_list = []
+        if isinstance(sp, FreeSpecies):
+            sg_list = [sp.sg]
+        elif(isinstance(sp, TileSpecies)):
+            sg_list = sp.tiles_sg
+        else:
+            assert False
+        for sg in sg_list:
+            if (sg.isConnected()):
+                conflict = distanceBoundsConflict(self.getRegionGraph(sg))
+                if (conflict is not None):
+                    (i, j, lower, upper) = conflict
+                    self.boundsRejections += 1
+                    bounds_info = {'bounds_conflict': (i, j),
+                                   'bounds_lower': lower,
+                                   'bounds_upper': upper}
+                    return (False, [(sp, bounds_info)])
+            else:
+                assert False
+        return self.delegate.isPlausible(sp)
+
+# Find a pair of vertices of the region graph whose distance bounds cross, i.e. whose lower bound
+# exceeds their upper bound (allowing for rounding). Returns a tuple (i, j, lower, upper)
+# for the first such pair, or None if the bounds are consistent.
+def distanceBoundsConflict(rg):
+    (lower, upper) = rg.distanceBounds()
+    crossed = (lower > upper) & ~isClose(lower, upper)
+    if not crossed.any():
+        return None
+    (i, j) = (int(x) for x in np.argwhere(crossed)[0])
+    return (i, j, float(lower[i, j]), float(upper[i, j]))
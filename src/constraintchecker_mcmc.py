@@ -0,0 +1,376 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+########################################################################
+
+#
+# NOTES ON WARM-STARTED MCMC
+# ==========================
+#
+# Most species checked during enumeration differ from one of the reactants by a single bound or unbound
+# domain, so a conformation that satisfied the constraints on the reactants is usually close to one that
+# satisfies the constraints on the product. ConstraintChecker_MCMC keeps the satisfying conformation
+# found for every component, and before the enumerator checks the products of a reaction (see
+# ConstraintChecker_Abstract.setReactants) it collects the coordinates of every strand end in the reactants,
+# keyed by the colour of the strand, its occurrence among the strands of that colour in its component,
+# and the site and tag of the position. A new component whose strand ends can all be found there starts
+# from those coordinates (the average of them, for a vertex that merges several positions), with the
+# tethers at their tether coordinates.
+#
+# The starting conformation is then improved by Metropolis moves on the total relative violation of the
+# constraints (the violations of the distance and nick angle constraints, relative to the region lengths and
+# the nick angle bound, summed over all of the constraints, plus the depth of any vertex below the surface,
+# which no vertex placed by the sampler is either). Each move only moves a set C of vertexes rigidly,
+# where C is a connected component of the graph of currently satisfied regions once the pivot vertexes have
+# been removed, so the move keeps every satisfied region within C, or between C and the pivots, satisfied:
+#  - a pivot move rotates C about a pivot vertex a (if C only touches a), or a crankshaft move rotates C
+#    about the axis through pivot vertexes a and b (if C touches both), by a random angle;
+#  - a closure move picks a violated region (u,v) and rotates the component of v about a pivot a by the
+#    smallest rotation that puts v at the right distance from u, or translates the component of v to that
+#    distance if it is not attached to the rest of the graph by satisfied regions at all.
+# Components containing tethered vertexes are never moved. If the constraints are not all satisfied after
+# mcmcSteps moves, the component is sampled from scratch as usual.
+#
+
+########################################################################
+
+import math
+import numpy as np
+from constants import *
+from constraintchecker_sampling import *
+from regiongraphcache import regionGraphFingerprint
+from tilespecies import TileSpecies
+from freespecies import FreeSpecies
+
+
+# Constraint checker that warm-starts each new component from the conformations of the reactants
+# and runs MCMC moves to satisfy its constraints (see the notes above), falling back to sampling
+# as in ConstraintChecker_Sampling (which takes the remaining keyword arguments).
+# Verdict reuse must be enabled, since the conformations of the reactants are found in the verdict cache.
+# Verdicts served by a persistent verdict store (see verdictstore.py) bring their conformations with them
+# (see storedVerdict), so the products of reactants whose verdicts were stored can still be warm-started.
+class ConstraintChecker_MCMC(ConstraintChecker_Sampling):
+
+    def __init__(self, mcmcSteps=MCMC_STEPS, temperature=MCMC_TEMPERATURE, pivotAngle=MCMC_PIVOT_ANGLE, **kwargs):
+        super().__init__(**kwargs)
+        if not self.reuseVerdicts:
+            raise ValueError('ConstraintChecker_MCMC needs reuseVerdicts, since it finds the conformations of the reactants in the verdict cache')
+        self.mcmcSteps = mcmcSteps
+        self.temperature = temperature
+        self.pivotAngle = pivotAngle
+        self.reactants = []
+        self.warmStart = None # Maps (colour, occurrence, site number, tag) to coordinates in the reactants, once collected
+        self.warmStarts = 0 # Number of components that were satisfied by MCMC from a warm start
+
+    def verdictParameters(self, sp):
+        return super().verdictParameters(sp) + (self.mcmcSteps, self.temperature, self.pivotAngle)
+
+    # Record the reactants, whose coordinates are only collected if a new component needs them.
+    def setReactants(self, species_list):
+        self.reactants = species_list
+        self.warmStart = None
+
+    # Collect the coordinates of every strand end in the satisfying conformations of the reactants.
+    def collectWarmStart(self):
+        self.warmStart = {}
+        for sp in self.reactants:
+            if isinstance(sp, FreeSpecies):
+                sg_list = [sp.sg]
+            elif isinstance(sp, TileSpecies):
+                sg_list = sp.tiles_sg
+            else:
+                continue
+            for (k, (sg, key)) in enumerate(zip(sg_list, self.speciesComponentKeys(sp, sg_list))):
+                if key not in self.componentVerdicts:
+                    continue
+                (flag, sampling_info, coordinates) = self.componentVerdicts[key]
+                if not flag:
+                    continue
+                rg = self.getRegionGraph(sg, key[0])
+                occurrences = colourOccurrences(sg)
+                for (i, vertex) in enumerate(rg.vertices_list):
+                    c = coordinates[i]
+                    for p in vertex:
+                        self.warmStart[(sg.vertex_colors[p.s.v], occurrences[p.s.v], p.s.n, p.w)] = (c.x, c.y, c.z)
+
+    # The component verdict keys (see componentVerdictKey) of the components of the species, in order.
+    def speciesComponentKeys(self, sp, sg_list):
+        fingerprints = [regionGraphFingerprint(sg) for sg in sg_list]
+        budget = self.getTrialBudget(sp)
+        return [self.componentVerdictKey(fingerprints[k], budget, [fingerprints[j] for j in self.obstacleComponents(sp, k)] if self.excludedVolume else [])
+                for k in range(len(sg_list))]
+
+    # Cache the satisfying conformations in a verdict served by a persistent verdict store, where they are
+    # recorded as the 'sampling_coordinates' of each component, so that they can be used for warm starts.
+    def storedVerdict(self, sp, flag, info_list):
+        if isinstance(sp, FreeSpecies):
+            sg_list = [sp.sg]
+        elif isinstance(sp, TileSpecies):
+            sg_list = sp.tiles_sg
+        else:
+            return
+        for (key, sampling_info) in zip(self.speciesComponentKeys(sp, sg_list), info_list):
+            if 'sampling_coordinates' in sampling_info and key not in self.componentVerdicts:
+                self.componentVerdicts[key] = (True, sampling_info, [CartesianCoords(*c) for c in sampling_info['sampling_coordinates']])
+        self.warmStart = None
+
+    # Try to satisfy the constraints on the component by MCMC from a warm start, before sampling it from scratch.
+    # The MCMC moves ignore excluded volume, so if excludedVolume is set, a conformation that it finds is only
+    # accepted if no regions overlap (see excludedvolume.py).
+    def sampleComponent(self, rg, global_coordinates, budget, sg=None, obstacles=None):
+        if sg is not None:
+            coords = self.warmStartCoords(rg, sg)
+            if coords is not None:
+                steps = self.runMCMC(rg, coords)
+                if steps is not None and self.excludedVolume and excludedVolumeViolation(rg, coords, self.dsRadius, self.ssRadius, obstacles) > 0.0:
+                    steps = None
+                if steps is not None:
+                    self.warmStarts += 1
+                    sampled_structures = SampledStructures(rg)
+                    for i in range(rg.numVertices()):
+                        sampled_structures.place(i, CartesianCoords(*coords[i].tolist()), None)
+                    sampling_info = {'sampling_unsuccessful_trials': 0,
+                                     'sampling_trial_budget': budget,
+                                     'sampling_importance_weight': 1.0,
+                                     'sampling_mcmc_steps': steps,
+                                     'sampling_coordinates': sampled_structures.coords.tolist()}
+                    return (True, sampling_info, sampled_structures)
+        flag, sampling_info, sampled_structures = super().sampleComponent(rg, global_coordinates, budget, sg, obstacles)
+        if flag:
+            sampling_info['sampling_coordinates'] = sampled_structures.coords.tolist()
+        return (flag, sampling_info, sampled_structures)
+
+    # The starting coordinates for the component from the reactants, as a (V, 3) array indexed by vertex id,
+    # or None if some vertex has no strand end in the reactants.
+    def warmStartCoords(self, rg, sg):
+        if self.warmStart is None:
+            self.collectWarmStart()
+        occurrences = colourOccurrences(sg)
+        coords = np.zeros((rg.numVertices(), 3))
+        for (i, vertex) in enumerate(rg.vertices_list):
+            found = [self.warmStart[k] for k in ((sg.vertex_colors[p.s.v], occurrences[p.s.v], p.s.n, p.w) for p in vertex) if k in self.warmStart]
+            if len(found) == 0:
+                return None
+            coords[i] = np.mean(found, axis=0)
+        for (i, (x, y)) in rg.getTetherIds():
+            coords[i] = (x, y, 0.0)
+        return coords
+
+    # Run Metropolis moves on the coordinates (in place) until they satisfy the constraints.
+    # Returns the number of moves made, or None if the constraints were still not satisfied after mcmcSteps moves
+    # (or if the chain stalled, without improving on its lowest energy for a fifth of that many moves).
+    def runMCMC(self, rg, coords):
+        fixed = np.zeros(rg.numVertices(), dtype=bool)
+        for (i, tether_coord) in rg.getTetherIds():
+            fixed[i] = True
+        energy = self.conformationEnergy(rg, coords)
+        (best_energy, best_step) = (energy, 0)
+        for step in range(self.mcmcSteps + 1):
+            if self.conformationSatisfies(rg, coords):
+                return step
+            if step == self.mcmcSteps or step - best_step > self.mcmcSteps // 5:
+                break
+            satisfied = self.satisfiedEdges(rg, coords)
+            violated = np.flatnonzero(~satisfied & (rg.edge_v1 != rg.edge_v2))
+            if len(violated) > 0 and self.prng.random() < 0.5:
+                move = self.closureMove(rg, coords, satisfied, fixed, int(violated[self.prng.randrange(len(violated))]))
+            else:
+                move = self.pivotMove(rg, coords, satisfied, fixed)
+            if move is None:
+                continue
+            (moved, new_positions) = move
+            old_positions = coords[moved].copy()
+            coords[moved] = new_positions
+            new_energy = self.conformationEnergy(rg, coords)
+            if new_energy <= energy or self.prng.random() < math.exp((energy - new_energy) / self.temperature):
+                energy = new_energy
+                if energy < best_energy:
+                    (best_energy, best_step) = (energy, step)
+            else:
+                coords[moved] = old_positions
+        return None
+
+    # Total relative violation of the constraints by the coordinates (see the notes above).
+    def conformationEnergy(self, rg, coords):
+        d = np.linalg.norm(coords[rg.edge_v1] - coords[rg.edge_v2], axis=1)
+        l = rg.edge_max_length
+        close = isClose(d, l)
+        energy = float(np.sum(np.where(rg.edge_ds & ~close, np.abs(d - l) / l, 0.0)))
+        energy += float(np.sum(np.where(~rg.edge_ds & ~close & (d > l), (d - l) / l, 0.0)))
+        if NICKED_FLAG and len(rg.nickedJunctions()[3]) > 0:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                angles = np.nan_to_num(rg.nickedAngles(coords), nan=180.0)
+            energy += float(np.sum(np.maximum(0.0, angles - NICKEDANGLE_UPPER_BOUND) / NICKEDANGLE_UPPER_BOUND))
+        energy += float(np.sum(np.maximum(0.0, -coords[:, 2]))) / float(np.mean(l))
+        return energy
+
+    # Whether the coordinates satisfy all of the constraints and stay above the surface, as every conformation
+    # found by the sampler does (see samplePointAbove in structures.py).
+    def conformationSatisfies(self, rg, coords):
+        if np.any((coords[:, 2] < 0.0) & ~isClose(coords[:, 2], 0.0)):
+            return False
+        if not self.satisfiedEdges(rg, coords).all():
+            return False
+        if NICKED_FLAG and len(rg.nickedJunctions()[3]) > 0:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                angles = np.nan_to_num(rg.nickedAngles(coords), nan=180.0)
+            return not np.any(angles > NICKEDANGLE_UPPER_BOUND)
+        return True
+
+    # Which of the distance constraints on the region edges are satisfied by the coordinates.
+    def satisfiedEdges(self, rg, coords):
+        d = np.linalg.norm(coords[rg.edge_v1] - coords[rg.edge_v2], axis=1)
+        l = rg.edge_max_length
+        close = isClose(d, l)
+        return np.where(rg.edge_ds, close, (d <= l) | close)
+
+    # Rotate a movable component of the satisfied regions, once one or two random pivot vertexes are removed,
+    # about the pivot (or the axis through both pivots) by a random angle.
+    # Returns (moved vertex ids, new coordinates), or None if the pivots leave nothing that can be moved.
+    def pivotMove(self, rg, coords, satisfied, fixed):
+        n = rg.numVertices()
+        a = self.prng.randrange(n)
+        b = self.prng.randrange(n)
+        components = satisfiedComponents(rg, satisfied, {a, b})
+        components = [c for c in components if not fixed[c].any()]
+        if len(components) == 0:
+            return None
+        moved = components[self.prng.randrange(len(components))]
+        touching = set(adjacentVertices(rg, satisfied, moved))
+        angle = self.prng.gauss(0.0, self.pivotAngle)
+        if a != b and a in touching and b in touching:
+            axis = coords[b] - coords[a]
+            if np.linalg.norm(axis) == 0.0:
+                return None
+            centre = coords[a]
+        else:
+            axis = np.array([self.prng.gauss(0.0, 1.0) for k in range(3)])
+            centre = coords[a] if a in touching or b not in touching else coords[b]
+        return (moved, rotateAbout(coords[moved], centre, axis, angle))
+
+    # Move the component of v (in the graph of satisfied regions) so that the violated region e = (u, v) is satisfied,
+    # by rotating it about a random pivot, or translating it if it is not attached to anything (see the notes above).
+    # Returns (moved vertex ids, new coordinates), or None if no such move was found.
+    def closureMove(self, rg, coords, satisfied, fixed, e):
+        (u, v) = (int(rg.edge_v1[e]), int(rg.edge_v2[e]))
+        if self.prng.random() < 0.5:
+            (u, v) = (v, u)
+        l = float(rg.edge_max_length[e])
+        component = satisfiedComponents(rg, satisfied, set(), start=v)[0]
+        if fixed[component].any():
+            (u, v) = (v, u)
+            component = satisfiedComponents(rg, satisfied, set(), start=v)[0]
+            if fixed[component].any():
+                component = None
+        if component is not None and u not in component:
+            # Translate the whole component of v.
+            offset = coords[v] - coords[u]
+            norm = np.linalg.norm(offset)
+            if norm == 0.0:
+                offset = np.array([self.prng.gauss(0.0, 1.0) for k in range(3)])
+                norm = np.linalg.norm(offset)
+            target = coords[u] + offset * (l / norm)
+            return (component, coords[component] + (target - coords[v]))
+        a = self.prng.randrange(rg.numVertices())
+        if a == u or a == v:
+            return None
+        component = satisfiedComponents(rg, satisfied, {a}, start=v)[0]
+        if u in component or fixed[component].any():
+            return None
+        r = np.linalg.norm(coords[v] - coords[a])
+        circle = sphereIntersection(coords[a], r, coords[u], l)
+        if circle is None:
+            return None
+        (centre, radius, normal) = circle
+        w = coords[v] - centre
+        w = w - np.dot(w, normal) * normal
+        if np.linalg.norm(w) == 0.0:
+            return None
+        target = centre + w * (radius / np.linalg.norm(w))
+        source = coords[v] - coords[a]
+        dest = target - coords[a]
+        axis = np.cross(source, dest)
+        if np.linalg.norm(axis) == 0.0:
+            return None
+        angle = math.atan2(np.linalg.norm(axis), np.dot(source, dest))
+        return (component, rotateAbout(coords[component], coords[a], axis, angle))
+
+# For each vertex of the strand graph, the number of earlier vertexes with the same colour.
+def colourOccurrences(sg):
+    counts = {}
+    res = []
+    for c in sg.vertex_colors:
+        res.append(counts.get(c, 0))
+        counts[c] = res[-1] + 1
+    return res
+
+# The connected components of the graph of satisfied region edges, after removing the given vertexes,
+# as lists of vertex ids. If start is given, only the component containing start is returned.
+def satisfiedComponents(rg, satisfied, removed, start=None):
+    n = rg.numVertices()
+    adj = [[] for i in range(n)]
+    for (i, j) in zip(rg.edge_v1[satisfied].tolist(), rg.edge_v2[satisfied].tolist()):
+        adj[i].append(j)
+        adj[j].append(i)
+    seen = set(removed)
+    components = []
+    for s in ([start] if start is not None else range(n)):
+        if s in seen:
+            continue
+        seen.add(s)
+        component = [s]
+        stack = [s]
+        while stack:
+            i = stack.pop()
+            for j in adj[i]:
+                if j not in seen:
+                    seen.add(j)
+                    component.append(j)
+                    stack.append(j)
+        components.append(component)
+    return components
+
+# The vertexes outside the given set that are joined to it by satisfied region edges.
+def adjacentVertices(rg, satisfied, vertices):
+    inside = np.zeros(rg.numVertices(), dtype=bool)
+    inside[vertices] = True
+    v1 = rg.edge_v1[satisfied]
+    v2 = rg.edge_v2[satisfied]
+    return np.unique(np.concatenate((v2[inside[v1] & ~inside[v2]], v1[inside[v2] & ~inside[v1]]))).tolist()
+
+# Rotate the points (an (N, 3) array) by the given angle about the axis through centre, using Rodrigues' formula.
+def rotateAbout(points, centre, axis, angle):
+    k = axis / np.linalg.norm(axis)
+    p = points - centre
+    rotated = (p * math.cos(angle) + np.cross(k, p) * math.sin(angle) + np.outer(p @ k, k) * (1 - math.cos(angle)))
+    return rotated + centre
+
+# NumPy version of structures.sphereIntersectionCircle: the circle where the spheres of radius r1 around c1
+# and radius r2 around c2 intersect, as (centre, radius, unit normal), or None if they do not intersect.
+def sphereIntersection(c1, r1, c2, r2):
+    D = float(np.linalg.norm(c2 - c1))
+    if D == 0.0:
+        return None
+    if (D > r1 + r2 or D < abs(r1 - r2)) and not (math.isclose(D, r1 + r2) or math.isclose(D, abs(r1 - r2))):
+        return None
+    normal = (c2 - c1) / D
+    x = (D ** 2 + r1 ** 2 - r2 ** 2) / (2 * D)
+    radius = math.sqrt(max(0.0, r1 ** 2 - x ** 2))
+    return (c1 + x * normal, radius, normal)
@@ -18,8 +18,12 @@
 # 
 ##########################################################################################
 
+import copy
 import math
 import random
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 from constraintchecker_abstract import *
 from constants import *
@@ -29,30 +33,151 @@ from angle_distributions import *
 from length_distributions import *
 from structures import *
 from regiongraph import *
+from samplingplan import *
+from regiongraphcache import regionGraphFingerprint, speciesFingerprint
+from prngstreams import *
+from excludedvolume import *
+from localconcentration import *
+from rejectiondiagnostics import *
+from conformationstore import ConformationStore
+from scipy.stats import norm
+from geometricsignature import *
+from strandgraph import Site
 from tilespecies import TileSpecies
 from freespecies import FreeSpecies
 
 
 class ConstraintChecker_Sampling(ConstraintChecker_Abstract):
 
-    def __init__(self, seed=None):
+    # If adaptive is True, each component is first sampled with a cheap pass of initialTrials trials.
+    # The budget is only escalated (by escalationFactor each time, up to the full trial budget) if the
+    # closest miss seen so far is within nearMissTolerance. Since each trial is abandoned at the first constraint
+    # it violates (see sampleCoordinates), a miss is measured on the partial conformation placed so far, as the
+    # violation of that first constraint, relative to its length or angle bound (see checkPlacedConstraints).
+    # Trials abandoned because a vertex could not be placed at all (the 'surface', 'guidance' and 'closure'
+    # rejections) count as infinitely far off, so components that only fail that way are never escalated.
+    # Hopeless structures are therefore rejected
+    # after the first pass, at the price of a controlled risk of false negatives, which is reported
+    # as an upper bound on the acceptance rate at the given confidence level.
+    # If loopClosure is True, a point that closes a cycle in the region graph is placed directly
+    # on the set of points satisfying its distance constraint from the other end of the cycle
+    # (see the notes on loop closure in structures.py), and each trial carries an importance weight.
+    # This is on by default, and it finds conformations that plain rejection sampling misses within the same budget,
+    # so it changes the default verdicts (and the enumerated CRNs, see test_paper_examples.py). Set it to False
+    # to sample cycles by rejection as before.
+    # If guidedCandidates is greater than 1, every other point is grown Rosenbluth-style:
+    # that many candidate placements are drawn and one is picked according to how well it can
+    # still reach the vertexes that are already placed (see guidanceWeight below).
+    # If reuseVerdicts is True, the verdict for each component is cached by the fingerprint of the component
+    # (which includes its tether coordinates) and the trial budget, so components that are unchanged from
+    # one species to the next (e.g., the untouched strands of a track) are only sampled once.
+    # If reuseGeometry is also True, verdicts are cached by the geometric signature of the region graph of the component
+    # (see geometricsignature.py) as well, so they are reused across components with the same geometry,
+    # e.g. for every step of a robot walking along a uniformly spaced track. This is off by default, since the verdict
+    # for all of the components with the same geometry is then the verdict for whichever of them is checked first.
+    # (With independentStreams, they are all sampled from the same stream, keyed by the signature, but each is
+    # sampled in its own frame, so they can still get different verdicts.)
+    # If workers is greater than 1, the trials for each component are split across a pool of that many
+    # worker processes (see runTrials below). The verdict is still reproducible for a given seed and
+    # number of workers, but differs from the verdict with a single worker.
+    # If independentStreams is True, each component is sampled with its own random number stream
+    # (see prngstreams.py), keyed by the seed and the fingerprint of the component, so its verdict does not
+    # depend on which species were checked before it, or in what order (unless reuseGeometry is set, see above).
+    # If excludedVolume is True, regions may not pass through each other, or through the regions of the components
+    # of the same species that were placed before them (and are within reach, see obstacleComponents), where double- and single-stranded regions have the radii
+    # dsRadius and ssRadius (see excludedvolume.py). This is checked as the regions are placed.
+    # Since the verdict for a component then depends on the components placed before it, verdicts for components
+    # that follow others are only reused for the same preceding components, and not across geometries.
+    # If estimationSamples is set, each component is sampled with exactly that many trials, rather than until the
+    # first success, and its sampling_info reports the fraction of trials that were accepted, with a Wilson score
+    # confidence interval at the configured confidence level (see estimateComponent). The accepted conformations are
+    # kept as an ensemble for estimating local concentrations (see componentEnsemble and localConcentrations).
+    # If conformationStore is set (to a ConformationStore, or to the path of one), the satisfying conformation of every
+    # plausible species is appended to it (see conformationstore.py). This does not change any verdicts.
+    def __init__(self, seed=None, samplingTrials=SAMPLING_TRIALS, adaptive=False,
+                 initialTrials=ADAPTIVE_INITIAL_TRIALS, escalationFactor=ADAPTIVE_ESCALATION_FACTOR,
+                 nearMissTolerance=ADAPTIVE_NEAR_MISS_TOLERANCE, confidence=IMPLAUSIBLE_CONFIDENCE,
+                 loopClosure=True, guidedCandidates=1, reuseVerdicts=True, reuseGeometry=False, workers=1, independentStreams=True,
+                 excludedVolume=False, dsRadius=EXCLUDED_VOLUME_DS_RADIUS, ssRadius=EXCLUDED_VOLUME_SS_RADIUS,
+                 estimationSamples=None, conformationStore=None):
         super().__init__()
+        self.independentStreams = independentStreams
         self.reseed(seed=seed)
         self.ssDomainLengthDist = WormLikeChainLengthDistribution() #UniformLengthDistribution()
         self.dsDomainLengthDist = MaxLengthDistribution()
         self.tetherAngleDist = UniformSphereAngleDistribution() # UniformHemisphereAngleDistribution() # No tethering
         self.ssDomainAngleDist = UniformSphereAngleDistribution()
         self.dsdsDomainAngleDist = UniformSphereAngleDistribution() #NickedAngleDistribution() #UniformSphereAngleDistribution()
+        self.samplingTrials = samplingTrials
+        self.speciesTrialBudgets = {} # Maps species fingerprints (see speciesFingerprint) to trial budgets overriding samplingTrials
+        self.adaptive = adaptive
+        self.initialTrials = initialTrials
+        self.escalationFactor = escalationFactor
+        self.nearMissTolerance = nearMissTolerance
+        self.confidence = confidence
+        self.loopClosure = loopClosure
+        self.guidedCandidates = guidedCandidates
+        self.reuseVerdicts = reuseVerdicts
+        self.reuseGeometry = reuseGeometry
+        assert workers >= 1
+        self.workers = workers
+        self.pool = None # Pool of worker processes, created when first needed
+        self.bestSuccess = None # Lowest trial index of a success found by the workers, shared with them
+        self.excludedVolume = excludedVolume
+        self.dsRadius = dsRadius
+        self.ssRadius = ssRadius
+        assert estimationSamples is None or estimationSamples > 0
+        self.estimationSamples = estimationSamples
+        self.conformationStore = ConformationStore(conformationStore) if isinstance(conformationStore, str) else conformationStore
 
     def debugPrint(self, x, debug=False):
         if debug:
             print(x)
 
     def reseed(self, seed=None):
+        self.seed = seed
         if seed is None:
             self.prng = random.Random()
         else:
             self.prng = random.Random(seed)
+        # The global seed for the per-component streams, drawn at random if no seed was given.
+        self.streamSeed = seed if seed is not None else self.prng.getrandbits(64)
+        # Verdicts sampled with the old random number generator are forgotten.
+        self.componentVerdicts = {} # Maps component verdict keys (see componentVerdictKey) to (flag, sampling_info, coordinates)
+        self.geometricVerdicts = {} # Maps (geometric signature, trial budget) to (flag, sampling_info, canonical coordinates)
+        self.ensembles = {} # Maps component fingerprints to (coordinates, weights) ensembles (see componentEnsemble)
+
+    def verdictParameters(self, sp):
+        distributions = [distributionParameters(d) for d in (self.ssDomainLengthDist, self.dsDomainLengthDist, self.tetherAngleDist, self.ssDomainAngleDist, self.dsdsDomainAngleDist)]
+        return (type(self).__name__, self.seed, self.getTrialBudget(sp), tuple(distributions), self.adaptive, self.initialTrials, self.escalationFactor,
+                self.nearMissTolerance, self.confidence, self.loopClosure, self.guidedCandidates, self.independentStreams,
+                self.excludedVolume, self.dsRadius, self.ssRadius, self.estimationSamples, self.workers, self.reuseVerdicts, self.reuseGeometry)
+
+    def excludesVolume(self):
+        return self.excludedVolume
+
+    # Verdicts are only reproducible with a given seed, and only if they do not depend on which species were
+    # checked before: with a single random number stream, or with verdicts reused across geometries, they do.
+    def reproducibleVerdicts(self):
+        return self.seed is not None and self.independentStreams and not (self.reuseVerdicts and self.reuseGeometry)
+
+    # Set the maximum number of sampling trials to use for each component of a particular species.
+    def setTrialBudget(self, sp, trials):
+        assert trials > 0
+        self.speciesTrialBudgets[speciesFingerprint(sp)] = trials
+
+    # Get the maximum number of sampling trials to use for each component of the given species.
+    def getTrialBudget(self, sp):
+        if len(self.speciesTrialBudgets) == 0:
+            return self.samplingTrials
+        return self.speciesTrialBudgets.get(speciesFingerprint(sp), self.samplingTrials)
+
+    # Upper bound on the acceptance rate of the sampler, at the configured confidence level,
+    # given that all of the specified number of independent trials failed.
+    def acceptanceRateUpperBound(self, failed_trials):
+        if failed_trials <= 0:
+            return 1.0
+        return 1.0 - (1.0 - self.confidence) ** (1.0 / failed_trials)
 
     def isPlausible(self, sp, debug=False):
         #self.debugPrint(sp)
@@ -64,231 +189,459 @@ class ConstraintChecker_Sampling(ConstraintChecker_Abstract):
             sg_list = sp.tiles_sg
         else:
             assert False
+        budget = self.getTrialBudget(sp)
         global_coordinates =[]
+        placed = [] # The (fingerprint, segments) of each component placed so far, if excludedVolume is set
         species_sampling_info = []
-        for sg in sg_list:
-            unsuccessful_trials = 0
+        conformation = [] # The coordinates of each component, for the conformation store
+        for (k, sg) in enumerate(sg_list):
             #sg.displayRepresentation()
             if (sg.isConnected()):
-                rg = regionGraphFromStrandGraph(sg)
-                #rg.displayRepresentation()
-                for i in range(SAMPLING_TRIALS):             
-                    sampled_structures = self.sampleCoordinates(rg, global_coordinates)                
-                    flag = self.checkConstraints(rg, sampled_structures)
-                    if (flag):
-                        self.debugPrint("printing sampled_Strucutres::::")
-                        self.debugPrint("Satisfiable!!!!---Sampling")
-                        self.debugPrint("numer of unsuccessful trials  " + str(i)) 
-                        self.debugPrint("numer of unsuccessful trials  " + str(i))  
-                        sampling_info = {'sampling_unsuccessful_trials': unsuccessful_trials}
-                        species_sampling_info.append((sp, sampling_info))
-                        global_coordinates += [val[0] for val in sampled_structures.values()]
-                        #self.debugPrint("isPlausible: "+ str(flag))
-                        #self.debugPrint("sampling_unsuccessful_trials : "+ str(unsuccessful_trials))
-                        #sg.displayRepresentation()
-                        break
-                        #return (True, sampling_info)
-                    unsuccessful_trials += 1
-                if(unsuccessful_trials == SAMPLING_TRIALS):
-                    sampling_info = {'sampling_unsuccessful_trials': unsuccessful_trials}
-                    species_sampling_info.append((sp, sampling_info))
+                obstacles = None
+                context = []
+                if (self.excludedVolume):
+                    for j in self.obstacleComponents(sp, k):
+                        obstacles = addObstacles(obstacles, placed[j][1])
+                        context.append(placed[j][0])
+                flag, sampling_info, coordinates = self.componentVerdict(sg, global_coordinates, budget, obstacles, tuple(context))
+                species_sampling_info.append((sp, sampling_info))
+                if (not flag):
+                    self.debugPrint("UnSatisfiable!!!!---Sampling")
+                    self.debugPrint("number of unsuccessful trials  " + str(sampling_info['sampling_unsuccessful_trials']))
                     return (False, species_sampling_info)
+                global_coordinates += coordinates
+                conformation.append(coordinates)
+                if (self.excludedVolume):
+                    fingerprint = regionGraphFingerprint(sg)
+                    rg = self.getRegionGraph(sg, fingerprint)
+                    placed.append((fingerprint, conformationSegments(rg, np.array([(c.x, c.y, c.z) for c in coordinates]), self.dsRadius, self.ssRadius)))
             else:
                  assert False
-        self.debugPrint("UnSatisfiable!!!!---Sampling")
-        self.debugPrint("number of unsuccessful trials  " + str(unsuccessful_trials))
-        # sampling_info = {'sampling_unsuccessful_trials': unsuccessful_trials}
-        # species_sampling_info.append((sp, sampling_info))
+        if (self.conformationStore is not None):
+            self.conformationStore.put(sp, sg_list, conformation)
         return (True, species_sampling_info)
-  
-    def sampleCoordinates(self, rg, global_coordinates):
- 
-        # create four set of regions
-        dsDNA_regions = []
-        ssDNA_regions = []
-        unprocessed_regions = []
-        skipped_regions = []
-
-        # sampled_structures = {"vertex_label" : (Coordinates(x, y, z), previousDomainInfo=None)}
-        # Initial values
-        #sampled_structures = {str(max_deg_vertex) : (CartesianCoords(0, 0, 0), None)}
-        sampled_structures={}
-
-        max_deg_vertex = []
-        # max_deg_vertices = rg.findMaxDegreeVertices()
-        # max_deg_vertex = self.prng.choice(max_deg_vertices)
-        # sampled_structures[str(max_deg_vertex)] =  (CartesianCoords(0, 0, 0), None)
-        tethered_vertices = rg.getTethers()
+
+    # The indexes of the components of the species that are placed before the component with index k, and are
+    # close enough to it to get in its way if excludedVolume is set, i.e. that are within reach of it by the tether index
+    # of a tile species (see tetherindex.py), allowing for the radii of their regions.
+    def obstacleComponents(self, sp, k):
+        if isinstance(sp, TileSpecies):
+            return [j for j in sp.componentsWithinReach(k, margin=2 * max(self.dsRadius, self.ssRadius)) if j < k]
+        return list(range(k))
+
+    # Get the verdict for a single connected component, reusing a cached verdict for an identical
+    # component if reuseVerdicts is set, or for one with the same geometry if reuseGeometry is also set, and otherwise
+    # sampling it.
+    # Returns a triple (flag, sampling_info, coordinates), where coordinates is the list of coordinates of
+    # the satisfying conformation (or None if no conformation was found). Reused verdicts are marked
+    # by 'sampling_reused' in their sampling_info, which says whether the 'component' or its 'geometry' matched.
+    # The obstacles are the segments of the components placed before this one that might get in its way (see
+    # obstacleComponents), and context lists their fingerprints,
+    # which are only needed if excludedVolume is set (see excludedvolume.py).
+    def componentVerdict(self, sg, global_coordinates, budget, obstacles=None, context=()):
+        fingerprint = regionGraphFingerprint(sg)
+        key = self.componentVerdictKey(fingerprint, budget, context)
+        if (self.reuseVerdicts and key in self.componentVerdicts):
+            (flag, sampling_info, coordinates) = self.componentVerdicts[key]
+            return (flag, dict(sampling_info, sampling_reused='component'), coordinates)
+        rg = self.getRegionGraph(sg, fingerprint)
         #rg.displayRepresentation()
-        #self.debugPrint("Look here:::::")
-        #self.debugPrint(max_deg_vertices)
-        if(len(tethered_vertices) == 0):
-            # find maximum degree vertex for free species case
-            max_deg_vertices = rg.findMaxDegreeVertices()
-            max_deg_vertex = self.prng.choice(max_deg_vertices)
-            sampled_structures[str(max_deg_vertex)] =  (CartesianCoords(0, 0, 0), None)
-            # Split regions among ssDNA_region, dsDNA_region and other_region
-            for edge in rg.edge_list:
-                if (edge.v1 == max_deg_vertex or edge.v2 == max_deg_vertex):
-                    if (edge.doubleStranded):
-                        dsDNA_regions.append(edge)
-                    else:
-                        ssDNA_regions.append(edge)
-                else:
-                    unprocessed_regions.append(edge)
+        useGeometry = self.reuseVerdicts and self.reuseGeometry and len(key) == 2
+        if (useGeometry):
+            (signature, rank, transform) = geometricSignature(rg)
+            geometric_key = (signature, budget)
+            if (geometric_key in self.geometricVerdicts):
+                (flag, sampling_info, canonical_coordinates) = self.geometricVerdicts[geometric_key]
+                coordinates = fromCanonicalCoords(rank, transform, canonical_coordinates) if flag else None
+                self.componentVerdicts[key] = (flag, sampling_info, coordinates)
+                return (flag, dict(sampling_info, sampling_reused='geometry'), coordinates)
+        if (self.independentStreams and useGeometry):
+            self.prng = randomStream(self.streamSeed, 'geometry', signature)
+        elif (self.independentStreams):
+            self.prng = randomStream(self.streamSeed, fingerprint, *key[2:])
+        if (self.estimationSamples is not None):
+            flag, sampling_info, sampled_structures, ensemble = self.estimateComponent(rg, global_coordinates, self.estimationSamples, obstacles)
+            if (len(key) == 2):
+                self.ensembles[fingerprint] = ensemble
+        else:
+            flag, sampling_info, sampled_structures = self.sampleComponent(rg, global_coordinates, budget, sg, obstacles)
+        coordinates = sampled_structures.allCoords() if flag else None
+        if (self.reuseVerdicts):
+            self.componentVerdicts[key] = (flag, sampling_info, coordinates)
+        if (useGeometry):
+            self.geometricVerdicts[geometric_key] = (flag, sampling_info, toCanonicalCoords(rank, transform, coordinates) if flag else None)
+        return (flag, sampling_info, coordinates)
+
+    # The key of the verdict for a component in componentVerdicts, given its fingerprint, the trial budget, and
+    # the fingerprints of its obstacle components (which only matter if excludedVolume is set).
+    def componentVerdictKey(self, fingerprint, budget, context=()):
+        if (self.excludedVolume and len(context) > 0):
+            return (fingerprint, budget, tuple(context))
+        return (fingerprint, budget)
+
+    # Sample conformations of a single connected component, given its region graph,
+    # until one satisfies the constraints or the trial budget is exhausted.
+    # Returns a triple (flag, sampling_info, sampled_structures), where sampled_structures
+    # is the satisfying conformation (or None if no conformation was found).
+    # The sampling_info records the number of trials rejected by each constraint, and the distribution of their violations
+    # (see rejectiondiagnostics.py).
+    # The strand graph sg of the component is not needed here, but is passed on for the benefit of subclasses.
+    # The obstacles are as for componentVerdict.
+    def sampleComponent(self, rg, global_coordinates, budget, sg=None, obstacles=None):
+        if self.adaptive:
+            trials_allowed = min(self.initialTrials, budget)
         else:
-            for v, tether_coord in tethered_vertices:
-                if(v is not None):
-                    sampled_structures[str(v)] =  (CartesianCoords(tether_coord[0], tether_coord[1], 0), None)
-
-            # Split regions among ssDNA_region, dsDNA_region and other_region
-            for edge in rg.edge_list:
-                for v, tether in tethered_vertices:
-                    if (edge.v1 == v or edge.v2 == v):
-                        if (edge.doubleStranded):
-                            dsDNA_regions.append(edge)
-                        else:
-                            ssDNA_regions.append(edge)
-                    else:
-                        unprocessed_regions.append(edge)
-
-        # self.debugPrint("printing sampled_structures::::")
-        # for key, val in sampled_structures.values():
-        #     self.debugPrint(key)
-        #     self.debugPrint(val)
+            trials_allowed = budget
+        unsuccessful_trials = 0
+        best_violation = math.inf
+        rejections = {} # Number of trials rejected by each constraint
+        all_rejections = [] # The (constraint, violation) pair for every rejected trial
+        while True:
+            trials = trials_allowed - unsuccessful_trials
+            success, sampled_structures, weight, trial_rejections = self.runTrials(rg, global_coordinates, trials, obstacles)
+            for (constraint, violation) in trial_rejections:
+                rejections[constraint] = rejections.get(constraint, 0) + 1
+                best_violation = min(best_violation, violation)
+            all_rejections += trial_rejections
+            if (sampled_structures is not None):
+                unsuccessful_trials += success
+                self.debugPrint("Satisfiable!!!!---Sampling")
+                self.debugPrint("numer of unsuccessful trials  " + str(unsuccessful_trials))
+                sampling_info = {'sampling_unsuccessful_trials': unsuccessful_trials,
+                                 'sampling_trial_budget': budget,
+                                 'sampling_importance_weight': weight,
+                                 'sampling_weighted_acceptance': weight / (unsuccessful_trials + 1),
+                                 'sampling_guided_candidates': self.guidedCandidates,
+                                 'sampling_rejections': rejections,
+                                 'sampling_violations': violationSummaries(all_rejections)}
+                return (True, sampling_info, sampled_structures)
+            unsuccessful_trials += trials
+            if trials_allowed >= budget or best_violation > self.nearMissTolerance:
+                break
+            # Borderline case: the closest miss was near enough to escalate the trial budget.
+            trials_allowed = min(budget, trials_allowed * self.escalationFactor)
+        sampling_info = {'sampling_unsuccessful_trials': unsuccessful_trials,
+                         'sampling_trial_budget': budget,
+                         'sampling_early_stopped': unsuccessful_trials < budget,
+                         'sampling_acceptance_upper_bound': self.acceptanceRateUpperBound(unsuccessful_trials),
+                         'sampling_weighted_acceptance': 0.0,
+                         'sampling_guided_candidates': self.guidedCandidates,
+                         'sampling_rejections': rejections,
+                         'sampling_violations': violationSummaries(all_rejections),
+                         'sampling_confidence': self.confidence}
+        if self.adaptive:
+            sampling_info['sampling_closest_miss'] = best_violation
+        return (False, sampling_info, None)
+
+    # Sample the given number of conformations of a single connected component, given its region graph,
+    # without stopping at the first success, to estimate the probability that a conformation is accepted.
+    # Returns a tuple (flag, sampling_info, sampled_structures, ensemble), where flag says whether any conformation
+    # was accepted, sampled_structures is the first one (or None), and ensemble is a pair (coordinates, weights) of
+    # a (M, V, 3) array of the coordinates of the M accepted conformations and an array of their importance weights.
+    # The sampling_info reports the acceptance fraction, its confidence interval (see acceptanceInterval), and
+    # the mean importance weight over all trials, which estimates the acceptance probability under the
+    # unconstrained distributions.
+    def estimateComponent(self, rg, global_coordinates, trials, obstacles=None):
+        coordinates = []
+        weights = []
+        rejections = {}
+        all_rejections = []
+        first = None
+        for g in range(trials):
+            sampled_structures, weight, rejection = self.sampleCoordinates(rg, global_coordinates, obstacles)
+            if (sampled_structures is None):
+                rejections[rejection[0]] = rejections.get(rejection[0], 0) + 1
+                all_rejections.append(rejection)
+                continue
+            if (first is None):
+                first = sampled_structures
+            coordinates.append(sampled_structures.coords)
+            weights.append(weight)
+        accepted = len(coordinates)
+        sampling_info = {'sampling_unsuccessful_trials': trials - accepted,
+                         'sampling_trial_budget': trials,
+                         'sampling_acceptance': accepted / trials,
+                         'sampling_acceptance_interval': self.acceptanceInterval(accepted, trials),
+                         'sampling_weighted_acceptance': float(np.sum(weights)) / trials,
+                         'sampling_guided_candidates': self.guidedCandidates,
+                         'sampling_rejections': rejections,
+                         'sampling_violations': violationSummaries(all_rejections),
+                         'sampling_confidence': self.confidence}
+        ensemble = (np.array(coordinates).reshape(accepted, rg.numVertices(), 3), np.array(weights, dtype=float))
+        return (accepted > 0, sampling_info, first, ensemble)
+
+    # Wilson score interval for the acceptance probability, at the configured confidence level,
+    # given that the specified number of the independent trials were accepted.
+    def acceptanceInterval(self, accepted, trials):
+        z = float(norm.ppf(0.5 + self.confidence / 2))
+        p = accepted / trials
+        centre = (p + z * z / (2 * trials)) / (1 + z * z / trials)
+        half_width = z / (1 + z * z / trials) * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials))
+        return (max(0.0, centre - half_width), min(1.0, centre + half_width))
+
+    # The ensemble of accepted conformations of a connected component (see estimateComponent), as a triple
+    # (rg, coordinates, weights). This is the ensemble sampled when the component was checked, if estimationSamples
+    # is set, and is otherwise sampled (with estimationSamples or LOCAL_CONCENTRATION_SAMPLES trials, from the same
+    # random number stream as the check) the first time it is needed. Ensembles are cached by fingerprint.
+    def componentEnsemble(self, sg):
+        fingerprint = regionGraphFingerprint(sg)
+        rg = self.getRegionGraph(sg, fingerprint)
+        if fingerprint not in self.ensembles:
+            if (self.independentStreams):
+                self.prng = randomStream(self.streamSeed, fingerprint)
+            trials = self.estimationSamples if self.estimationSamples is not None else LOCAL_CONCENTRATION_SAMPLES
+            self.ensembles[fingerprint] = self.estimateComponent(rg, [], trials)[3]
+        (coordinates, weights) = self.ensembles[fingerprint]
+        return (rg, coordinates, weights)
+
+    # Estimate the local concentrations (see localconcentration.py) for pairs of sites that could bind.
+    # The sites are numbered as in the composition of the given connected components, in order (see StrandGraph.compose),
+    # and each pair is a pair of sites of either the same component or different ones. Returns a list of the
+    # local concentrations of the pairs, in the concentration units of the binding rates.
+    def localConcentrations(self, components, pairs):
+        offsets = np.cumsum([0] + [sg.numVertexes() for sg in components]).tolist()
+        def locate(s):
+            k = max(i for i in range(len(components)) if offsets[i] <= s.v)
+            return (k, Site(s.v - offsets[k], s.n, s.nmax))
+        ensembles = [self.componentEnsemble(sg) for sg in components]
+        groups = {} # Maps each pair (k1, k2) of component indexes to the list of (pair index, site1, site2) triples
+        for (p, (s1, s2)) in enumerate(pairs):
+            ((k1, t1), (k2, t2)) = (locate(s1), locate(s2))
+            groups.setdefault((k1, k2), []).append((p, t1, t2))
+        concentrations = np.zeros(len(pairs))
+        for ((k1, k2), group) in groups.items():
+            (rg1, coords1, w1) = ensembles[k1]
+            (rg2, coords2, w2) = ensembles[k2]
+            positions1 = sitePositions(components[k1], rg1, coords1, [t1 for (p, t1, t2) in group])
+            positions2 = sitePositions(components[k2], rg2, coords2, [t2 for (p, t1, t2) in group])
+            fractions = captureFractions(positions1, w1, positions2, w2, CAPTURE_RADIUS, k1 != k2)
+            concentrations[[p for (p, t1, t2) in group]] = fractions
+        return localConcentrationsFromFractions(concentrations).tolist()
+
+    # Run up to the given number of sampling trials, stopping at the first success.
+    # Returns a tuple (success, sampled_structures, weight, rejections), where success is the index of the
+    # successful trial (or None), sampled_structures and weight are as returned by sampleCoordinates for that trial,
+    # and rejections lists the (constraint, violation) pairs of the unsuccessful trials before it.
+    # With several workers, trial g is run by worker g % workers with its own random number generator
+    # (seeded from this checker's), and the success with the lowest index wins. Every worker keeps going until
+    # its next trial index exceeds that of the best success so far, so all of the trials before the winning
+    # one are always run, and the result does not depend on the timing of the workers.
+    def runTrials(self, rg, global_coordinates, trials, obstacles=None):
+        rejections = []
+        if (self.workers == 1):
+            for g in range(trials):
+                sampled_structures, weight, rejection = self.sampleCoordinates(rg, global_coordinates, obstacles)
+                if (sampled_structures is not None):
+                    return (g, sampled_structures, weight, rejections)
+                rejections.append(rejection)
+            return (None, None, 0.0, rejections)
+        if self.pool is None:
+            self.bestSuccess = multiprocessing.Value('q', trials)
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=initTrialWorker, initargs=(self.bestSuccess,))
+        self.bestSuccess.value = trials
+        base_seed = self.prng.getrandbits(64)
+        worker = self.trialWorkerChecker()
+        futures = [self.pool.submit(runTrialsInWorker, worker, rg, global_coordinates, trials, self.workers, k, base_seed, obstacles) for k in range(self.workers)]
+        results = [f.result() for f in futures]
+        best = min((r[0] for r in results if r[0] is not None), default=None)
+        limit = trials if best is None else best
+        rejections = [(g, rejection) for r in results for (g, rejection) in r[3] if g < limit]
+        rejections = [rejection for (g, rejection) in sorted(rejections, key=lambda x: x[0])]
+        for r in results:
+            if (r[0] is not None and r[0] == best):
+                return (best, r[1], r[2], rejections)
+        return (None, None, 0.0, rejections)
+
+    # A copy of this checker to send to the worker processes, without its caches or its pool.
+    def trialWorkerChecker(self):
+        worker = copy.copy(self)
+        worker.pool = None
+        worker.bestSuccess = None
+        worker.componentVerdicts = {}
+        worker.geometricVerdicts = {}
+        worker.ensembles = {}
+        worker.speciesTrialBudgets = {}
+        worker.regionGraphCache = None
+        worker.conformationStore = None
+        worker.workers = 1
+        return worker
+
+    # Shut down the pool of worker processes, if there is one.
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    # Sample coordinates for each vertex of the region graph, by executing a sampling plan
+    # (see samplingplan.py) that is computed once per region graph.
+    # Each constraint is checked as soon as all of its vertexes have been placed, and the trial
+    # is abandoned as soon as one is violated. This includes excluded volume, if excludedVolume is set:
+    # each region is checked against the regions placed before it and the obstacles as soon as both of its ends are placed.
+    # Returns a triple (sampled_structures, weight, rejection). If the trial succeeded, the sampled structures
+    # satisfy all of the constraints, the importance weight of the sample is the product of the
+    # weights of its placements (see placeVertex), and rejection is None. Otherwise, sampled_structures is None, weight is 0.0
+    # and rejection is a pair (constraint, violation) naming the constraint that was violated
+    # and how badly (see checkPlacedConstraints), or ('excluded_volume', overlap) if excludedVolume is set and
+    # two regions overlap (see excludedvolume.py), with or without the given obstacles.
+    def sampleCoordinates(self, rg, global_coordinates, obstacles=None):
+
+        # For untethered structures there is one plan per maximum degree vertex, and the root is chosen at random.
+        plans = samplingPlansForRegionGraph(rg)
+        plan = plans[0] if len(plans) == 1 else self.prng.choice(plans)
+
+        sampled_structures = SampledStructures(rg)
+        for i, coord in plan.roots:
+            sampled_structures.place(i, coord, None)
+        rejection = self.checkPlacedConstraints(rg, sampled_structures, plan.rootChecks, plan.rootJunctions)
+        if (self.excludedVolume):
+            schedule = excludedVolumeSchedule(rg, plan, self.dsRadius, self.ssRadius)
+            if (rejection is None):
+                rejection = self.checkPlacedExcludedVolume(sampled_structures, schedule[0], obstacles)
+        if (rejection is not None):
+            return (None, 0.0, rejection)
 
         dist = Distributions(self.ssDomainLengthDist, self.dsDomainLengthDist, self.tetherAngleDist, self.ssDomainAngleDist, self.dsdsDomainAngleDist)
-        while ((len(dsDNA_regions) > 0) or (len(ssDNA_regions) > 0)  or (len(unprocessed_regions) > 0)):
-           
-            if(len(dsDNA_regions) > 0):
-                region_edge = dsDNA_regions.pop(self.prng.randrange(0,len(dsDNA_regions)))
-                if (str(region_edge.v1) in sampled_structures.keys() and str(region_edge.v2) in sampled_structures.keys()):
-                    skipped_regions.append(region_edge)
-                else:
-                    sampled_structures, ssDNA_regions, dsDNA_regions, unprocessed_regions = self.sampleJunctionBetweenRegions(sampled_structures, dist, region_edge, ssDNA_regions, dsDNA_regions, unprocessed_regions, global_coordinates)
-            elif(len(ssDNA_regions) > 0 ):
-                region_edge = ssDNA_regions.pop(self.prng.randrange(0,len(ssDNA_regions)))
-                if (str(region_edge.v1) in sampled_structures.keys() and str(region_edge.v2) in sampled_structures.keys()):
-                    skipped_regions.append(region_edge)
-                else:
-                    sampled_structures, ssDNA_regions, dsDNA_regions, unprocessed_regions = self.sampleJunctionBetweenRegions(sampled_structures, dist, region_edge, ssDNA_regions, dsDNA_regions, unprocessed_regions, global_coordinates)
-            else:
-                assert False
-        return sampled_structures
-
-
-    def sampleJunctionBetweenRegions(self, sampled_structures, dist, e, ssDNA_regions, dsDNA_regions, unprocessed_regions, global_coordinates):
-        flag1 = str(e.v1) in sampled_structures.keys() 
-        flag2 = str(e.v2) in sampled_structures.keys()  
-        assert flag1 or flag2
-              
-        currentDomain = RegionDomain(e.doubleStranded, e.totalNucleotideLength)
-        if(flag1):
-            previousCoord = sampled_structures[str(e.v1)][0]
-            previousDomainInfo = sampled_structures[str(e.v1)][1]
-            label = e.v1
+        weight = 1.0
+        for (k, step) in enumerate(plan.steps):
+            w, rejection = self.placeVertex(rg, sampled_structures, dist, step, global_coordinates)
+            if (rejection is None):
+                rejection = self.checkPlacedConstraints(rg, sampled_structures, step.checkEdges, step.checkJunctions)
+            if (rejection is None and self.excludedVolume):
+                rejection = self.checkPlacedExcludedVolume(sampled_structures, schedule[k + 1], obstacles)
+            if (rejection is not None):
+                return (None, 0.0, rejection)
+            weight *= w
+        return (sampled_structures, weight, None)
+
+
+    # Place the vertex of a sampling plan step, relative to its (already placed) parent vertex.
+    # Returns a pair (weight, rejection), where weight is the importance weight of the placement
+    # (relative to the unconstrained distributions) and rejection is None, unless the placement
+    # cannot lead to a conformation that satisfies the constraints, in which case weight is 0.0 and
+    # rejection is a pair (constraint, math.inf) as for sampleCoordinates.
+    def placeVertex(self, rg, sampled_structures, dist, step, global_coordinates):
+        currentDomain = step.domain
+        previousCoord = sampled_structures.getCoords(step.parent)
+        previousDomainInfo = sampled_structures.domainInfo[step.parent]
+
+        if (self.loopClosure and step.closureEdge is not None):
+            coord, weight = self.sampleLoopClosure(sampled_structures, dist, currentDomain, previousCoord, step.closureEdge)
+            if (coord is None):
+                return (0.0, ('closure:' + str(step.closureEdge[0].label), math.inf))
+            domainUnitVec = UnitVector(coord.x - previousCoord.x, coord.y - previousCoord.y, coord.z - previousCoord.z)
+            sampledAngle = None
+        elif (self.guidedCandidates > 1):
+            coord, domainUnitVec, sampledAngle, weight = self.sampleGuidedPoint(rg, sampled_structures, dist, currentDomain, previousCoord, previousDomainInfo, step.vertex, step.parent)
+            if (coord is None):
+                return (0.0, ('guidance', math.inf))
         else:
-            previousCoord = sampled_structures[str(e.v2)][0]
-            previousDomainInfo = sampled_structures[str(e.v2)][1]
-            label = e.v2
-
-        domainUnitVec, domainLengthNM, sampledAngle = samplePoint(previousDomainInfo, currentDomain, dist, self.prng)
-        coord = CartesianCoords(previousCoord.x + domainUnitVec.x * domainLengthNM, previousCoord.y + domainUnitVec.y * domainLengthNM, previousCoord.z + domainUnitVec.z * domainLengthNM)
-        while(coord.z < 0 and (coord not in global_coordinates)):
-            domainUnitVec, domainLengthNM, sampledAngle = samplePoint(previousDomainInfo, currentDomain, dist, self.prng)
-            coord = CartesianCoords(previousCoord.x + domainUnitVec.x * domainLengthNM, previousCoord.y + domainUnitVec.y * domainLengthNM, previousCoord.z + domainUnitVec.z * domainLengthNM)
-            
-        
+            coord, domainUnitVec, sampledAngle, weight = self.sampleFreePoint(dist, currentDomain, previousCoord, previousDomainInfo)
+            if (coord is None):
+                return (0.0, ('surface', math.inf))
+
         previousDomainInfo = {}
         previousDomainInfo['unitVec'] = domainUnitVec
         previousDomainInfo['domain'] = currentDomain
         previousDomainInfo['sampledAngle'] = sampledAngle
-        previousDomainInfo['prev_label'] = label
-        if (flag1):
-            sampled_structures[str(e.v2)] = (coord, previousDomainInfo)
-        else:
-            sampled_structures[str(e.v1)] = (coord, previousDomainInfo)
-
-        # If any regions from other regions to be processed set involve that point,
-        # add them to the set of ssDNA/dsDNA regions to be processed next as appropriate.
-        del_reg = []
-        for rg_edge in unprocessed_regions:
-            if(str(rg_edge.v1) in sampled_structures.keys() or str(rg_edge.v2) in sampled_structures.keys()):
-                if (rg_edge.doubleStranded):
-                    dsDNA_regions.append(rg_edge)
-                else:
-                    ssDNA_regions.append(rg_edge)
-                del_reg.append(rg_edge)
-        for item in del_reg:
-            unprocessed_regions.remove(item)
-
-        return sampled_structures, ssDNA_regions, dsDNA_regions, unprocessed_regions
-
-    def checkConstraints(self, rg, sampled_structures):
-        if(self.checkDistanceConstraints(rg.edge_list, sampled_structures) and self.checkAngleConstraints(rg, sampled_structures)):
-
-            self.debugPrint("Plotting the coordinates from the sampled structures...")
-            #self.plot_sampled_regiongraph(rg, sampled_structures)
-            return True
-        else : 
-            return False        
-
-    def checkDistanceConstraints(self, edge_list, sampled_structures):
-        for edges in edge_list:
-            c1 = sampled_structures[str(edges.v1)][0]
-            c2 = sampled_structures[str(edges.v2)][0]
-            d = (((c1.x - c2.x) ** 2) + ((c1.y - c2.y) ** 2) + ((c1.z - c2.z) ** 2)) ** 0.5
-            # if double stranded, then equality equation otherwise inequality equation
-            if (edges.doubleStranded):
-                # Form an equality equation
-                l = (edges.totalNucleotideLength * DS_LENGTH)
-                self.debugPrint("edges.totalNucleotideLength "+ str(edges.totalNucleotideLength) + " : DS_LENGTH: " + str(DS_LENGTH))
-                self.debugPrint("label: "+ str(edges.label) + " total nucleotised LEngth *ds: "+ str(l) + " actual double bond len: "+ str(d))
-                self.debugPrint(math.isclose(d, l))
+        previousDomainInfo['prev_label'] = step.parent
+        sampled_structures.place(step.vertex, coord, previousDomainInfo)
+        return (weight, None)
+
+    # Check the distance constraints on the given region edges, and the nick angle constraints on the
+    # nicked junctions with the given indexes, all of whose vertexes must have been placed.
+    # Returns None if they are all satisfied, and otherwise a pair (constraint, violation) for the first
+    # violated constraint, where constraint is 'ds_length:<edge label>', 'ss_reach:<edge label>' or 'nick_angle:<junction key>'
+    # and violation is how badly it is violated, relative to the region length or the nick angle bound. See rejectiondiagnostics.py for the other constraints.
+    def checkPlacedConstraints(self, rg, sampled_structures, edges, junctions):
+        for e in edges:
+            c1 = sampled_structures.getCoords(e.id1)
+            c2 = sampled_structures.getCoords(e.id2)
+            d = math.sqrt((c1.x - c2.x) ** 2 + (c1.y - c2.y) ** 2 + (c1.z - c2.z) ** 2)
+            l = maxEdgeLength(e)
+            if (e.doubleStranded):
                 if (not math.isclose(d, l)):
-                    self.debugPrint("returning false 1")
-                    return False
-            else:
-                l_ss = edges.totalNucleotideLength * SS_LENGTH
-                self.debugPrint("l edges.totalNucleotideLength * SS_LENGTH")
-                self.debugPrint("label: "+ str(edges.label) + " total nucleotised LEngth *ds: "+ str(l_ss) + " actual double bond len: "+ str(d))
-                self.debugPrint(l_ss)
-                self.debugPrint(d == l_ss)
-                if (not ((d <= l_ss) or math.isclose(d, l_ss))):
-                    self.debugPrint("returning false 2")
-                    return False
-        return True
-
-    # def checkAngleConstraints(self, rg, sampled_strucutres):
-    #     if (not NICKED_FLAG):
-    #         return True
-    #     for edges1 in rg.edge_list:
-    #         for edges2 in rg.edge_list:
-    #             theta = None
-    #             if ((edges1 != edges2) and (not (edges1.v1 == edges1.v2 or edges2.v1 == edges2.v2)) and (edges1.doubleStranded and edges2.doubleStranded)):
-    #                 if (edges1.v1 == edges2.v1):
-    #                     theta = computeAngleBetweenRegions(sampled_strucutres[str(edges1.v1)][0], sampled_strucutres[str(edges1.v2)][0], sampled_strucutres[str(edges2.v2)][0])
-    #                 if (edges1.v1 == edges2.v2):
-    #                     theta = computeAngleBetweenRegions(sampled_strucutres[str(edges1.v1)][0], sampled_strucutres[str(edges1.v2)][0], sampled_strucutres[str(edges2.v1)][0])
-    #                 if (edges1.v2 == edges2.v1):
-    #                     theta = computeAngleBetweenRegions(sampled_strucutres[str(edges1.v2)][0], sampled_strucutres[str(edges1.v1)][0], sampled_strucutres[str(edges2.v2)][0])
-    #                 if (edges1.v2 == edges2.v2):
-    #                     theta = computeAngleBetweenRegions(sampled_strucutres[str(edges1.v2)][0], sampled_strucutres[str(edges1.v1)][0], sampled_strucutres[str(edges2.v1)][0])
-                    
-    #                 if (theta is not None and ((theta < NICKEDANGLE_LOWER_BOUND) or (theta > NICKEDANGLE_UPPER_BOUND))):
-    #                     return False
-    #     return True
-
-    def checkAngleConstraints(self, rg, sampled_strucutres):
-        if not NICKED_FLAG: 
-            return True
-        nicked_angles = rg.computeNickedAngles(sampled_strucutres)
-        for key, angles in nicked_angles.items():
-            self.debugPrint("Angles")
-            self.debugPrint(angles)
-            if (angles > NICKEDANGLE_UPPER_BOUND):
-                return False   
-        return True
+                    return ('ds_length:' + str(e.label), abs(d - l) / l)
+            elif (d > l and not math.isclose(d, l)):
+                return ('ss_reach:' + str(e.label), (d - l) / l)
+        if NICKED_FLAG and len(junctions) > 0:
+            (centres, ends1, ends2, keys) = rg.nickedJunctions()
+            for j in junctions:
+                theta = computeAngleBetweenRegions(sampled_structures.getCoords(centres[j]), sampled_structures.getCoords(ends1[j]), sampled_structures.getCoords(ends2[j]))
+                if (theta > NICKEDANGLE_UPPER_BOUND):
+                    return ('nick_angle:' + keys[j], (theta - NICKEDANGLE_UPPER_BOUND) / NICKEDANGLE_UPPER_BOUND)
+        return None
+
+    # Check that the regions that have just been completed, with the given entry in the excluded volume schedule,
+    # do not overlap the regions completed before them or the obstacles (see excludedvolume.py).
+    # Returns None if they do not, and otherwise the rejection ('excluded_volume', overlap).
+    def checkPlacedExcludedVolume(self, sampled_structures, checks, obstacles):
+        overlap = placedExcludedVolumeViolation(sampled_structures.coords, checks, obstacles)
+        if (overlap > 0.0):
+            return ('excluded_volume', overlap)
+        return None
+
+    # Sample a placement for the next point, from previousCoord, with no constraints other than z >= 0
+    # and the nick angle bound with the previous domain. The point is sampled directly from the allowed
+    # directions (see the notes on sampling above the surface in structures.py), so the returned importance
+    # weight is the prior probability of those directions. If there are none, returns None for the point and weight 0.0.
+    def sampleFreePoint(self, dist, currentDomain, previousCoord, previousDomainInfo):
+        coord, domainUnitVec, domainLengthNM, sampledAngle, weight = samplePointAbove(previousCoord, previousDomainInfo, currentDomain, dist, self.prng)
+        return coord, domainUnitVec, sampledAngle, weight
+
+    # Sample a placement for vertex v from its parent vertex (at previousCoord) by Rosenbluth-style guided growth:
+    # draw guidedCandidates free placements, and pick one with probability proportional to its guidance weight.
+    # Returns the point, its unit vector and sampled angle, and the importance weight z * W / (k * w)
+    # (where W is the total guidance weight of the k candidates, and w and z the guidance weight and
+    # free placement weight of the chosen one), which keeps weighted estimates of the acceptance rate unbiased.
+    # If no candidate can still satisfy the distance constraints, returns None for the point and weight 0.0.
+    def sampleGuidedPoint(self, rg, sampled_structures, dist, currentDomain, previousCoord, previousDomainInfo, v, parent):
+        candidates = []
+        total_weight = 0.0
+        for i in range(self.guidedCandidates):
+            coord, domainUnitVec, sampledAngle, z = self.sampleFreePoint(dist, currentDomain, previousCoord, previousDomainInfo)
+            if (coord is None):
+                continue
+            w = self.guidanceWeight(rg, sampled_structures, v, parent, coord)
+            candidates.append((coord, domainUnitVec, sampledAngle, z, w))
+            total_weight += w
+        if (total_weight == 0.0):
+            return None, None, None, 0.0
+        r = self.prng.uniform(0, total_weight)
+        for (coord, domainUnitVec, sampledAngle, z, w) in candidates:
+            if (w > 0.0):
+                chosen = (coord, domainUnitVec, sampledAngle, z, w)
+                r -= w
+                if (r <= 0.0):
+                    break
+        (coord, domainUnitVec, sampledAngle, z, w) = chosen
+        return coord, domainUnitVec, sampledAngle, z * total_weight / (self.guidedCandidates * w)
+
+    # Guidance weight for placing vertex v at coord: for each placed vertex a (other than the parent of v),
+    # v must end up within the maximum path length between v and a in the region graph.
+    # The weight is the product of the remaining slack (1 - distance/max path length) over all such vertexes,
+    # so it is zero if any of them is already out of reach and favours placements that keep a margin.
+    def guidanceWeight(self, rg, sampled_structures, v, parent, coord):
+        others = sampled_structures.placed.copy()
+        others[parent] = False
+        reach = rg.maxPathLengths()[v][others]
+        d = np.linalg.norm(sampled_structures.coords[others] - (coord.x, coord.y, coord.z), axis=1)
+        if np.any((d > reach) & ~isClose(d, reach)):
+            return 0.0
+        slack = np.where(reach > 0.0, np.maximum(0.0, 1.0 - d / np.where(reach > 0.0, reach, 1.0)), 1.0)
+        return float(np.prod(slack))
+
+    # Place a point that closes one or more cycles, at a sampled distance from previousCoord,
+    # directly on the set of points that satisfy the constraint from the closing edge chosen by the
+    # sampling plan. Any other closing edges are left to be checked by checkPlacedConstraints as usual.
+    # Returns the point and its importance weight (see the notes on loop closure in structures.py).
+    def sampleLoopClosure(self, sampled_structures, dist, currentDomain, previousCoord, closure_edge):
+        (closing_edge, other_vertex) = closure_edge
+        otherCoord = sampled_structures.getCoords(other_vertex)
+        domainLengthNM = sampleDomainLength(currentDomain, dist, self.prng)
+        if (closing_edge.doubleStranded):
+            return sampleSphereIntersection(previousCoord, domainLengthNM, otherCoord, closing_edge.totalNucleotideLength * DS_LENGTH, self.prng)
+        else:
+            return sampleSphereWithinBall(previousCoord, domainLengthNM, otherCoord, closing_edge.totalNucleotideLength * SS_LENGTH, self.prng)
 
     # For debugging purposes, plot region graph from given sampled coordinates
     def plot_sampled_regiongraph(self, rg, sampled_structures):
@@ -296,10 +649,44 @@ class ConstraintChecker_Sampling(ConstraintChecker_Abstract):
         fig = plt.figure(figsize=(12, 12))
         ax = fig.add_subplot(111, projection='3d')
         for edge in rg.edge_list:
-            c1 = sampled_structures[str(edge.v1)][0]
-            c2 = sampled_structures[str(edge.v2)][0]
+            c1 = sampled_structures.getCoords(edge.id1)
+            c2 = sampled_structures.getCoords(edge.id2)
             ax.plot([c1.x, c2.x],[c1.y, c2.y ],[c1.z, c2.z], label= str(edge.label))
             length = round(edge.totalNucleotideLength * DS_LENGTH) if edge.doubleStranded else round(edge.totalNucleotideLength * SS_LENGTH)
             ax.text((c1.x +c2.x)/2, (c1.y + c2.y)/2, (c1.z + c2.z)/2, (str(edge.label) + " (nt: " + str(edge.totalNucleotideLength))+", "+ str(length) +"), ( " +  str(round(c1.x)) + ", "+ str(round(c1.y)) + ", " + str(round(c1.z)) + ") ( "+ str(round(c2.x)) + ", "+ str(round(c2.y)) + ", " + str(round(c2.z)) + " )")       
         plt.legend()
         plt.show()
+
+# The lowest trial index of a success found so far, shared between the worker processes (see runTrials).
+__best_success__ = None
+
+def initTrialWorker(best_success):
+    global __best_success__
+    __best_success__ = best_success
+
+# Run the trials with indexes k, k + workers, k + 2*workers, ... below the given number of trials, in a worker process,
+# stopping at the first success or once the trial index exceeds that of a success found by another worker.
+# Returns (success, sampled_structures, weight, rejections) as for runTrials, except that the rejections are
+# (trial index, rejection) pairs.
+def runTrialsInWorker(checker, rg, global_coordinates, trials, workers, k, base_seed, obstacles=None):
+    checker.prng = randomStream(base_seed, workers, k)
+    rejections = []
+    for g in range(k, trials, workers):
+        if g > __best_success__.value:
+            break
+        sampled_structures, weight, rejection = checker.sampleCoordinates(rg, global_coordinates, obstacles)
+        if (sampled_structures is not None):
+            with __best_success__.get_lock():
+                if g < __best_success__.value:
+                    __best_success__.value = g
+            return (g, sampled_structures, weight, rejections)
+        rejections.append((g, rejection))
+    return (None, None, 0.0, rejections)
+
+# Describe a length or angle distribution by its class and its plain-valued attributes (leaving out caches and tables).
+def distributionParameters(d):
+    return (type(d).__name__, tuple(sorted((k, v) for (k, v) in vars(d).items() if isinstance(v, (bool, int, float, str)))))
+
+# Elementwise version of math.isclose (with its default relative tolerance) for arrays of distances.
+def isClose(a, b):
+    return np.abs(a - b) <= 1e-09 * np.maximum(np.abs(a), np.abs(b))
@@ -31,6 +31,8 @@ from tilespecies import *
 from reaction import Reaction
 from strandgraph import *
 from enumerator_abstract import *
+from verdictstore import VerdictStore
+from rejectiondiagnostics import rejectionReport
 
 #
 ###############################################################################################
@@ -56,8 +58,12 @@ class ReactionEnumerator_Geometric(ReactionEnumerator_Abstract):
         VALID_unbindingModeOptions = ['adjacent']
         VALID_enumerationModeOptions = ['detailed', 'infinite']
         VALID_rateOptions = ['bind', 'unbind', 'migrate','displace']
-        if sorted(self.settings.keys()) != sorted(['name', 'debug', 'maxComplexSize', 'threeWayMode',
-                                                   'unbindingMode', 'enumerationMode', 'rate', 'constraintChecker']):
+        # 'verdictStore' is optional: a VerdictStore (see verdictstore.py) to consult before checking plausibility.
+        # 'localRates' is optional: if True, the rates of localized binding reactions are scaled by the local concentration
+        # estimated by the constraint checker (see localconcentration.py).
+        REQUIRED_keys = ['name', 'debug', 'maxComplexSize', 'threeWayMode', 'unbindingMode', 'enumerationMode', 'rate', 'constraintChecker']
+        OPTIONAL_keys = ['verdictStore', 'localRates']
+        if not (set(REQUIRED_keys) <= set(self.settings.keys()) <= set(REQUIRED_keys + OPTIONAL_keys)):
             print('Settings error: wrong keys: found '+str(self.settings.keys()))
             return False
         if type(self.settings['name']) != str:
@@ -81,6 +87,12 @@ class ReactionEnumerator_Geometric(ReactionEnumerator_Abstract):
         if self.settings['constraintChecker'] == None:
             print("Settings error: Constraint Checker object is None")
             return False
+        if self.settings.get('verdictStore') is not None and not isinstance(self.settings['verdictStore'], VerdictStore):
+            print('Settings error: verdictStore is not a VerdictStore: found '+str(self.settings['verdictStore'])+' with type '+str(type(self.settings['verdictStore'])))
+            return False
+        if self.settings.get('localRates') is not None and type(self.settings['localRates']) != bool:
+            print('Settings error: wrong localRates option type: found '+str(self.settings['localRates'])+' with type '+str(type(self.settings['localRates'])))
+            return False
         if sorted(self.settings['rate'].keys()) != sorted(VALID_rateOptions):
             print('Settings error: illegal option for rate: found '+str(self.settings['rate'])+' with type '+str(type(self.settings['rate'])))
             return False            
@@ -159,7 +171,10 @@ class ReactionEnumerator_Geometric(ReactionEnumerator_Abstract):
         for (species, sampling_info) in self.implausible_species:
             if (species == sp):     
                 return False  
-        flag, sampling_info = cc.isPlausible(sp)
+        if self.settings.get('verdictStore') is not None:
+            flag, sampling_info = self.settings['verdictStore'].isPlausible(cc, sp)
+        else:
+            flag, sampling_info = cc.isPlausible(sp)
         if (flag):
             self.plausible_species += sampling_info #append(sampling_info)
             return True
@@ -168,7 +183,15 @@ class ReactionEnumerator_Geometric(ReactionEnumerator_Abstract):
             return False
 
 
-    def allBindingTransitions(self, this, sp):
+    # Aggregate the diagnostics of the trials rejected by the constraint checker, over the species checked since the
+    # enumeration started (see rejectiondiagnostics.py).
+    def samplingRejectionReport(self):
+        return rejectionReport([info for (species, info) in self.plausible_species + self.implausible_species])
+
+    # If components is given, it lists the connected components that "this" is the composition of (in order), which are held
+    # together by being in the same complex or on the same tile, so binding between their sites is localized. If the localRates
+    # setting is True, the rates of localized binding are then scaled by the local concentrations estimated by the constraint checker.
+    def allBindingTransitions(self, this, sp, components=None):
         all_binding_transitions = []
         possible_new_edges = this.possibleNewEdges()
         currently_bound_sites = this.currentlyBoundSites()
@@ -193,6 +216,12 @@ class ReactionEnumerator_Geometric(ReactionEnumerator_Abstract):
                                             'new_species':new_species_list,
                                             'rate': self.settings['rate']['bind']}
                     all_binding_transitions.append(this_binding_transition)     
+        if components is not None and self.settings.get('localRates') and len(all_binding_transitions) > 0:
+            pairs = [t['edges_added'][0].getSites() for t in all_binding_transitions]
+            concentrations = self.settings['constraintChecker'].localConcentrations(components, pairs)
+            if concentrations is not None:
+                for (t, c) in zip(all_binding_transitions, concentrations):
+                    t['rate'] = self.settings['rate']['bind'] * c
         return all_binding_transitions
 
     def allUnbindingTransitions(self, this, sp, debug = False): 
@@ -346,7 +375,7 @@ class ReactionEnumerator_Geometric(ReactionEnumerator_Abstract):
 
     # Get all unimolecular transitions possible from "this" strand graph 
     def allUnimolecularTransitions(self, this, sp): 
-        bindingTransition = self.allBindingTransitions(this, sp)
+        bindingTransition = self.allBindingTransitions(this, sp, [this])
         unbindingTransitions = self.allUnbindingTransitions(this, sp)
         threeWayMigrationTransitions = self.allThreeWayMigrationTransitions(this, sp)
         fourWayMigrationTransitions = self.allFourWayMigrationTransitions(this, sp)
@@ -358,16 +387,17 @@ class ReactionEnumerator_Geometric(ReactionEnumerator_Abstract):
     # Compute all unimolecular reactions possible starting from "this" species
     def unimolecularReactions(self, this):
         allTransitions = []
+        self.settings['constraintChecker'].setReactants([this])
         # this is a species, pass the graph of species
         if(isinstance(this, FreeSpecies)):
             allTransitions += self.allUnimolecularTransitions(this.sg, this)
         elif(isinstance(this, TileSpecies)):
             for sg in this.tiles_sg:
                 allTransitions += self.allUnimolecularTransitions(sg, this)
+            # Only components whose tethers are close enough for their strands to meet can bind to each other.
             for idx1 in range(len(this.tiles_sg)):
-                for idx2 in range(len(this.tiles_sg)):
-                    if(idx1 != idx2):
-                        allTransitions +=  self.allBindingTransitions(this.tiles_sg[idx1].compose(this.tiles_sg[idx2]), this)
+                for idx2 in this.componentsWithinReach(idx1):
+                    allTransitions +=  self.allBindingTransitions(this.tiles_sg[idx1].compose(this.tiles_sg[idx2]), this, [this.tiles_sg[idx1], this.tiles_sg[idx2]])
         else:
             assert False 
         allReactions = []
@@ -378,13 +408,22 @@ class ReactionEnumerator_Geometric(ReactionEnumerator_Abstract):
             theseProducts = t['new_species']
             thisMetadata = {'type':t['type'], 'edges_added':t['edges_added'], 'edges_removed':t['edges_removed'], 'all_edges_involved':t['all_edges_involved']}
             thisReaction = Reaction(reactants, thisFwdRate, theseProducts, bwdrate=None, metadata=thisMetadata)
-            if thisReaction not in allReactions:
+            if not self.isDuplicateReaction(thisReaction, allReactions):
                 allReactions += [thisReaction]
         return allReactions
 
+    # Check whether a reaction duplicates one in the given list. With the localRates setting, the same reaction can be found
+    # with different estimated rates (e.g. from both orders of a pair of components of a tile species), so only its reactants
+    # and products are compared, and the rate of the first one found is kept.
+    def isDuplicateReaction(self, reaction, reactions):
+        if self.settings.get('localRates'):
+            return any(r.reactants == reaction.reactants and r.products == reaction.products for r in reactions)
+        return reaction in reactions
+
     # Compute all bimolecular reactions possible when "this" species is paired with "that" species
     def bimolecularReactions(self, this, that):
         allTransitions = []
+        self.settings['constraintChecker'].setReactants([this, that])
         allReactions = []
         # Two species from different tiles aren't allowed to interact.
         if (isinstance(this, TileSpecies) and isinstance(that, TileSpecies) and this != that):
@@ -407,11 +446,20 @@ class ReactionEnumerator_Geometric(ReactionEnumerator_Abstract):
             theseProducts = t['new_species'] 
             thisMetadata = {'type':t['type'], 'edges_added':t['edges_added'], 'edges_removed':t['edges_removed'], 'all_edges_involved':t['all_edges_involved']}
             thisReaction = Reaction(reactants, thisFwdRate, theseProducts, bwdrate=None, metadata=thisMetadata)
-            if thisReaction not in allReactions:
+            if not self.isDuplicateReaction(thisReaction, allReactions):
                 allReactions += [thisReaction]
         return allReactions
 
+    # The constraint checker is closed when the enumeration finishes, or stops with an error,
+    # so that it does not hold on to worker processes (see ConstraintChecker_Sampling.close).
     def enumerateReactions(self, species_list):
+        try:
+            return self.__enumerateReactions__(species_list)
+        finally:
+            if self.settings.get('constraintChecker') is not None:
+                self.settings['constraintChecker'].close()
+
+    def __enumerateReactions__(self, species_list):
         assert self.validSettings() 
         # Checking if the species are valid or not i.e. if they are free species or TileSpecies.
         if not self.isListOfSpecies(species_list):
@@ -0,0 +1,233 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+########################################################################
+
+#
+# NOTES ON EXCLUDED VOLUME
+# ========================
+#
+# Optionally, the regions of a conformation can be required not to pass through each other.
+# Each region is treated as the straight segment between the coordinates of its two vertexes,
+# thickened to a cylinder with a radius that depends on whether it is double- or single-stranded,
+# and two regions overlap if the distance between their segments is less than the sum of their radii.
+# Regions with radius zero are left out. A single-stranded region need not follow the straight line between
+# its ends, so by default only double-stranded regions (which are stiff over the lengths of typical domains) are checked.
+#
+# Regions that are joined by a short enough path in the region graph must be allowed to touch:
+# if the two regions share a vertex, or if they are joined by a path whose maximum length is at most
+# the sum of their radii (e.g. a single nucleotide between two helices), they are exempt from the check.
+# Regions of different components (e.g. other strands tethered to the same tile) are never exempt.
+#
+# Checking every pair of regions would take time quadratic in the number of regions, so candidate pairs
+# are found with a cell list: the midpoint of each region is binned into a uniform grid of cubic cells.
+# The reach of a region is its half length plus its radius, and the midpoints of two overlapping regions
+# are at most the sum of their reaches apart, so at most twice the larger reach. The sides of the cells are
+# twice the median reach, and the longer region of each pair looks for the other in the cells within twice its
+# reach of its own, which for most regions are just the adjacent cells. (Sizing the cells for the longest region
+# instead would put nearly every region in the same few cells when region lengths are mixed, e.g. long helices
+# joined by short single-stranded linkers.) The exact distances between the segments of the candidate pairs
+# are then computed in one batch.
+#
+# While sampling, the regions are checked as soon as both of their ends are placed (see placedExcludedVolumeViolation),
+# against the regions placed before them and the obstacles, so a trial is abandoned at the first overlap.
+# Each of these checks involves only a few new regions, so it compares them against all of the others directly,
+# and which pairs it compares is worked out once for each sampling plan (see excludedVolumeSchedule).
+#
+# The components of a species are placed one at a time, each avoiding the conformations found for the components
+# before it, rather than all together, so a species can be rejected although its components could be rearranged
+# to avoid each other.
+#
+
+########################################################################
+
+import itertools
+import math
+import numpy as np
+
+########################################################################
+
+# The regions of the region graph that take part in the excluded volume check, for the given radii.
+# Returns a 4-tuple (edges, radii, exempt, positions), where edges is an array of indexes into the edge arrays of the
+# region graph (leaving out regions whose ends are the same vertex, or whose radius is zero), radii is the array of their radii,
+# exempt is a boolean array saying which pairs of them are exempt from the check (see the notes above),
+# and positions maps each edge index to its position in edges, or -1 if it is left out.
+# This is cached in the region graph.
+def excludedVolumeSegments(rg, dsRadius, ssRadius):
+    key = (dsRadius, ssRadius)
+    if key not in rg.__excluded_volume_segments__:
+        edges = np.flatnonzero((rg.edge_v1 != rg.edge_v2) & (np.where(rg.edge_ds, dsRadius, ssRadius) > 0.0))
+        radii = np.where(rg.edge_ds[edges], dsRadius, ssRadius)
+        paths = rg.maxPathLengths()
+        ends = np.stack((rg.edge_v1[edges], rg.edge_v2[edges]), axis=1)
+        separation = np.min(paths[ends[:, :, None, None], ends[None, None, :, :]].transpose(0, 2, 1, 3).reshape(len(edges), len(edges), 4), axis=2)
+        exempt = separation <= radii[:, None] + radii[None, :]
+        positions = np.full(len(rg.edge_list), -1, dtype=int)
+        positions[edges] = np.arange(len(edges))
+        rg.__excluded_volume_segments__[key] = (edges, radii, exempt, positions)
+    return rg.__excluded_volume_segments__[key]
+
+# The segments of a conformation of the region graph, as obstacles for the components checked after it.
+# The coordinates are a (V, 3) array indexed by vertex id. Returns a triple (starts, ends, radii) of arrays.
+def conformationSegments(rg, coords, dsRadius, ssRadius):
+    (edges, radii, exempt, positions) = excludedVolumeSegments(rg, dsRadius, ssRadius)
+    return (coords[rg.edge_v1[edges]], coords[rg.edge_v2[edges]], radii)
+
+# Add the segments of a conformation to the obstacles (which may be None, for no obstacles).
+def addObstacles(obstacles, segments):
+    if obstacles is None:
+        return segments
+    return tuple(np.concatenate((a, b)) for (a, b) in zip(obstacles, segments))
+
+# Measure how badly a conformation of the region graph violates the excluded volume constraint, as the
+# largest overlap between two regions (or a region and an obstacle) relative to the sum of their radii.
+# Zero means that nothing overlaps. The coordinates are a (V, 3) array indexed by vertex id, and the obstacles
+# are the segments of previously placed components (see conformationSegments), which may be None.
+# Overlaps between the obstacles themselves are not checked again.
+def excludedVolumeViolation(rg, coords, dsRadius, ssRadius, obstacles=None):
+    (edges, radii, exempt, positions) = excludedVolumeSegments(rg, dsRadius, ssRadius)
+    starts = coords[rg.edge_v1[edges]]
+    ends = coords[rg.edge_v2[edges]]
+    n = len(edges)
+    if obstacles is not None:
+        starts = np.concatenate((starts, obstacles[0]))
+        ends = np.concatenate((ends, obstacles[1]))
+        radii = np.concatenate((radii, obstacles[2]))
+    if len(radii) < 2:
+        return 0.0
+    (i, j) = candidatePairs(starts, ends, radii, n)
+    if len(i) > 0:
+        own = j < n
+        keep = np.ones(len(i), dtype=bool)
+        keep[own] = ~exempt[i[own], j[own]]
+        (i, j) = (i[keep], j[keep])
+    if len(i) == 0:
+        return 0.0
+    d = segmentDistances(starts[i], ends[i], starts[j], ends[j])
+    reach = radii[i] + radii[j]
+    return float(np.max(np.maximum(0.0, reach - d) / reach, initial=0.0))
+
+# The excluded volume checks to make while executing a sampling plan (see samplingplan.py) for the region graph:
+# a list with an entry for the roots and then one for each step, which is None if no region is completed then,
+# and otherwise a triple (pairs, completed, radii). pairs is a (4, P) array of the vertex ids of the ends of the
+# P pairs of regions (that are not exempt) in which one was just completed and the other was completed then or before,
+# followed by the sums of their radii; completed is a (2, C) array of the vertex ids of the ends of the just completed regions,
+# and radii their radii, for checking against obstacles. None of this depends on the sampled coordinates,
+# so it is computed once per plan and cached in the plan.
+def excludedVolumeSchedule(rg, plan, dsRadius, ssRadius):
+    key = (dsRadius, ssRadius)
+    if key not in plan.__excluded_volume_schedule__:
+        (edges, radii, exempt, positions) = excludedVolumeSegments(rg, dsRadius, ssRadius)
+        schedule = []
+        done = np.zeros(0, dtype=int)
+        for ids in [plan.rootCheckIds] + [step.checkEdgeIds for step in plan.steps]:
+            new = positions[ids]
+            new = new[new >= 0]
+            if len(new) == 0:
+                schedule.append(None)
+                continue
+            done = np.concatenate((done, new))
+            i = np.repeat(new, len(done))
+            j = np.tile(done, len(new))
+            keep = (i < j) | ~np.isin(j, new)
+            keep &= (i != j) & ~exempt[i, j]
+            (i, j) = (i[keep], j[keep])
+            pairs = np.array([rg.edge_v1[edges[i]], rg.edge_v2[edges[i]], rg.edge_v1[edges[j]], rg.edge_v2[edges[j]]], dtype=int)
+            completed = np.array([rg.edge_v1[edges[new]], rg.edge_v2[edges[new]]], dtype=int)
+            schedule.append((pairs, radii[i] + radii[j], completed, radii[new]))
+        plan.__excluded_volume_schedule__[key] = schedule
+    return plan.__excluded_volume_schedule__[key]
+
+# Measure how badly the regions of a partial conformation that have just been completed overlap each other, the regions
+# completed before them, or the obstacles, as for excludedVolumeViolation, given their entry in the excluded volume schedule
+# (see excludedVolumeSchedule). Only the coordinates of the ends of the regions that have been completed are used.
+def placedExcludedVolumeViolation(coords, checks, obstacles=None):
+    if checks is None:
+        return 0.0
+    (pairs, reach, completed, radii) = checks
+    p1 = coords[pairs[0]]
+    q1 = coords[pairs[1]]
+    p2 = coords[pairs[2]]
+    q2 = coords[pairs[3]]
+    if obstacles is not None and len(obstacles[2]) > 0:
+        m = len(obstacles[2])
+        p1 = np.concatenate((p1, np.repeat(coords[completed[0]], m, axis=0)))
+        q1 = np.concatenate((q1, np.repeat(coords[completed[1]], m, axis=0)))
+        p2 = np.concatenate((p2, np.tile(obstacles[0], (len(radii), 1))))
+        q2 = np.concatenate((q2, np.tile(obstacles[1], (len(radii), 1))))
+        reach = np.concatenate((reach, np.repeat(radii, m) + np.tile(obstacles[2], len(radii))))
+    if len(reach) == 0:
+        return 0.0
+    d = segmentDistances(p1, q1, p2, q2)
+    return float(np.max(np.maximum(0.0, reach - d) / reach, initial=0.0))
+
+# Find the candidate pairs (i, j) of overlapping segments with a cell list (see the notes above),
+# where i < n (so one of the pair belongs to the conformation being checked) and i < j.
+# Returns a pair of arrays of indexes.
+def candidatePairs(starts, ends, radii, n):
+    midpoints = (starts + ends) / 2
+    reaches = np.linalg.norm(ends - starts, axis=1) / 2 + radii
+    cell_size = max(2 * float(np.median(reaches)), 1e-9)
+    cells = {}
+    keys = [tuple(k) for k in np.floor(midpoints / cell_size).astype(int).tolist()]
+    for (k, key) in enumerate(keys):
+        cells.setdefault(key, []).append(k)
+    reach_list = reaches.tolist()
+    pairs = set()
+    for i in range(len(keys)):
+        (x, y, z) = keys[i]
+        span = range(-math.ceil(2 * reach_list[i] / cell_size), math.ceil(2 * reach_list[i] / cell_size) + 1)
+        for (dx, dy, dz) in itertools.product(span, repeat=3):
+            for j in cells.get((x + dx, y + dy, z + dz), ()):
+                # The longer of the two segments finds the pair, and at least one of them must be checked
+                if (reach_list[j], j) < (reach_list[i], i) and (i < n or j < n):
+                    pairs.add((min(i, j), max(i, j)))
+    pairs = sorted(pairs)
+    i = np.array([a for (a, b) in pairs], dtype=int)
+    j = np.array([b for (a, b) in pairs], dtype=int)
+    near = np.linalg.norm(midpoints[i] - midpoints[j], axis=1) <= reaches[i] + reaches[j]
+    return (i[near], j[near])
+
+# The distances between corresponding segments p1-q1 and p2-q2, given as (N, 3) arrays of their ends,
+# computed from the closest points on the two segments (clamping the closest points on the two lines to the segments).
+def segmentDistances(p1, q1, p2, q2):
+    d1 = q1 - p1
+    d2 = q2 - p2
+    r = p1 - p2
+    a = np.einsum('ij,ij->i', d1, d1)
+    e = np.einsum('ij,ij->i', d2, d2)
+    f = np.einsum('ij,ij->i', d2, r)
+    c = np.einsum('ij,ij->i', d1, r)
+    b = np.einsum('ij,ij->i', d1, d2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        denominator = a * e - b * b
+        s = np.where(denominator > 1e-12 * a * e, np.clip((b * f - c * e) / denominator, 0.0, 1.0), 0.0)
+        s = np.where(e > 0.0, s, np.clip(-c / a, 0.0, 1.0))
+        s = np.where(a > 0.0, s, 0.0)
+        t = np.where(e > 0.0, (b * s + f) / e, 0.0)
+        # Clamp t to the second segment, and recompute s for the clamped t
+        s = np.where(t < 0.0, np.clip(-c / a, 0.0, 1.0), np.where(t > 1.0, np.clip((b - c) / a, 0.0, 1.0), s))
+        s = np.where(a > 0.0, s, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+    closest1 = p1 + d1 * s[:, None]
+    closest2 = p2 + d2 * t[:, None]
+    return np.linalg.norm(closest1 - closest2, axis=1)
+
+########################################################################
@@ -0,0 +1,150 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+from constants import *
+from regiongraph import *
+import math
+import numpy as np
+
+#
+# Geometric signatures of region graphs.
+#
+# Whether a component is plausible depends only on the geometry of its region graph: the topology,
+# the length and type of each region, and the positions of the tethers. Domain names and the
+# numbering of the vertexes are irrelevant, and so is any translation of the tethers in the plane of
+# the surface, or rotation about the z axis. So, for example, every step of a robot walking along a
+# uniformly spaced track has the same geometry.
+#
+# The geometric signature captures exactly this. The vertexes are put into a canonical order by
+# colour refinement (each vertex is coloured by whether it is tethered and by the regions incident on it,
+# and colours are repeatedly refined by the colours of the neighbours), followed by a search over the
+# ways of breaking any remaining ties, keeping the ordering with the smallest signature. The tether
+# positions are then translated so that the first tether is at the origin, and rotated about the z axis
+# so that the next tether at a different position lies on the positive x axis.
+#
+# Two region graphs with equal signatures are always geometrically equivalent, since the signature
+# describes the whole geometry. If the tie-breaking search gives up (after GEOMETRIC_SIGNATURE_SEARCH_LIMIT
+# orderings), equivalent region graphs may get different signatures, which only loses some cache hits.
+#
+
+# Number of decimal places kept of the normalized tether coordinates (in nm)
+SIGNATURE_DECIMALS = 6
+
+# Compute the geometric signature of a region graph (see above). This is cached.
+# Returns a triple (signature, rank, transform), where rank maps each vertex id to its position in the
+# canonical order, and transform = (x0, y0, cos_angle, sin_angle) is the translation and rotation that
+# was applied to the tether positions (see toCanonicalCoords and fromCanonicalCoords).
+def geometricSignature(rg):
+    if rg.__geometric_signature__ is None:
+        n = rg.numVertices()
+        tethers = dict(rg.getTetherIds())
+        adj = [[] for i in range(n)]
+        for (i, j, ds, nt) in zip(rg.edge_v1.tolist(), rg.edge_v2.tolist(), rg.edge_ds.tolist(), rg.edge_nt.tolist()):
+            adj[i].append(((ds, nt), j))
+            if (i != j):
+                adj[j].append(((ds, nt), i))
+        initial = [(i in tethers, tuple(sorted(label for (label, j) in adj[i]))) for i in range(n)]
+        colours = refineColours(adj, canonicalColours(initial))
+        best = None
+        leaves = 0
+        stack = [colours]
+        while stack and (best is None or leaves < GEOMETRIC_SIGNATURE_SEARCH_LIMIT):
+            colours = stack.pop()
+            cell = nonSingletonCell(colours)
+            if cell is None:
+                leaves += 1
+                candidate = signatureForRank(rg, tethers, colours)
+                if (best is None or candidate[0] < best[0]):
+                    best = candidate
+            else:
+                # Individualize each vertex of the first non-singleton cell in turn.
+                for i in reversed(cell):
+                    individualized = [2 * c + 1 for c in colours]
+                    individualized[i] -= 1
+                    stack.append(refineColours(adj, individualized))
+        rg.__geometric_signature__ = best
+    return rg.__geometric_signature__
+
+# Replace colours (any sortable values) by their ranks among the distinct colours, so that
+# the resulting integer colours depend only on the colours themselves and not on the vertex numbering.
+def canonicalColours(colours):
+    index = dict((c, k) for (k, c) in enumerate(sorted(set(colours))))
+    return [index[c] for c in colours]
+
+# Refine a colouring of the vertexes until it is stable, i.e. until vertexes of the same colour
+# have the same number of incident regions of each type and length leading to vertexes of each colour.
+def refineColours(adj, colours):
+    while True:
+        refined = canonicalColours([(colours[i], tuple(sorted((label, colours[j]) for (label, j) in adj[i]))) for i in range(len(colours))])
+        if len(set(refined)) == len(set(colours)):
+            return refined
+        colours = refined
+
+# The vertexes in the smallest colour shared by more than one vertex, or None if all of the colours are distinct.
+def nonSingletonCell(colours):
+    counts = np.bincount(colours) if len(colours) > 0 else np.zeros(0, dtype=int)
+    shared = np.flatnonzero(counts > 1)
+    if len(shared) == 0:
+        return None
+    return [i for (i, c) in enumerate(colours) if c == shared[0]]
+
+# Signature of a region graph for the ordering given by a colouring with all colours distinct.
+def signatureForRank(rg, tethers, colours):
+    rank = canonicalColours(colours)
+    edges = tuple(sorted((min(rank[i], rank[j]), max(rank[i], rank[j]), ds, nt)
+                         for (i, j, ds, nt) in zip(rg.edge_v1.tolist(), rg.edge_v2.tolist(), rg.edge_ds.tolist(), rg.edge_nt.tolist())))
+    ordered_tethers = sorted((rank[i], float(x), float(y)) for (i, (x, y)) in tethers.items())
+    (x0, y0, cos_angle, sin_angle) = (0.0, 0.0, 1.0, 0.0)
+    if len(ordered_tethers) > 0:
+        (r, x0, y0) = ordered_tethers[0]
+        for (r, x, y) in ordered_tethers[1:]:
+            d = math.hypot(x - x0, y - y0)
+            if (d > 0.0 and not math.isclose(d, 0.0, abs_tol=1e-9)):
+                (cos_angle, sin_angle) = ((x - x0) / d, (y - y0) / d)
+                break
+    transform = (x0, y0, cos_angle, sin_angle)
+    normalized_tethers = []
+    for (r, x, y) in ordered_tethers:
+        (u, v, w) = rotateAboutZ(x - x0, y - y0, 0.0, cos_angle, -sin_angle)
+        normalized_tethers.append((r, round(u, SIGNATURE_DECIMALS) + 0.0, round(v, SIGNATURE_DECIMALS) + 0.0))
+    signature = (rg.numVertices(), edges, tuple(normalized_tethers))
+    return (signature, rank, transform)
+
+def rotateAboutZ(x, y, z, cos_angle, sin_angle):
+    return (cos_angle * x - sin_angle * y, sin_angle * x + cos_angle * y, z)
+
+# Convert a list of coordinates indexed by vertex id into the canonical frame of the geometric signature:
+# a list indexed by canonical rank, translated and rotated as the tethers were.
+def toCanonicalCoords(rank, transform, coords):
+    (x0, y0, cos_angle, sin_angle) = transform
+    res = [None] * len(coords)
+    for (i, c) in enumerate(coords):
+        res[rank[i]] = rotateAboutZ(c.x - x0, c.y - y0, c.z, cos_angle, -sin_angle)
+    return res
+
+# Convert coordinates in the canonical frame of the geometric signature (see toCanonicalCoords)
+# back into a list of coordinates indexed by vertex id, for a region graph with the given rank and transform.
+def fromCanonicalCoords(rank, transform, canonical_coords):
+    (x0, y0, cos_angle, sin_angle) = transform
+    res = []
+    for i in range(len(rank)):
+        (x, y, z) = rotateAboutZ(*canonical_coords[rank[i]], cos_angle, sin_angle)
+        res.append(CartesianCoords(x + x0, y + y0, z))
+    return res
@@ -0,0 +1,129 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+########################################################################
+
+#
+# NOTES ON LOCAL CONCENTRATIONS
+# =============================
+#
+# When two domains of the same tile species (or of the same complex) bind, the rate of binding depends on
+# how often the geometry brings them together, rather than on the concentration of a second reactant
+# in solution. Following the usual treatment of localized reactions, the binding rate is taken to be
+# the bimolecular binding rate times the effective local concentration of one domain around the other.
+#
+# The effective local concentration is estimated from an ensemble of sampled conformations that satisfy the
+# constraints (see ConstraintChecker_Sampling.componentEnsemble). Each domain is placed at its midpoint along
+# its region, which is taken to be straight. If p is the fraction of conformations in which the midpoints
+# of the two domains are within the capture radius r of each other, then the local concentration is
+#   p / (4/3 * pi * r^3)
+# molecules per cubic nm, which is converted to molar units and then to the concentration units of the
+# binding rate (see RATE_CONCENTRATION_UNIT). Since the sampled conformations carry importance weights
+# (relative to the unconstrained distributions), p is the weighted fraction.
+#
+# Binding is only enumerated if the product is plausible, so p should never be taken to be zero just because
+# none of a finite number of samples happened to bring the two domains together. The weighted fraction is
+# therefore smoothed with half a pseudo-count, as (n*p + 1/2) / (n + 1), where n is the effective sample size
+# of the ensemble (or the smaller of the two, for different components).
+#
+# If the two domains belong to different connected components of the same tile species, the components
+# are sampled independently, and p is computed over all pairs of conformations of the two components.
+#
+# The distances are computed for all of the conformations and all of the pairs of domains in one batch.
+#
+
+########################################################################
+
+import math
+import numpy as np
+from constants import *
+
+########################################################################
+
+AVOGADRO = 6.02214076e23
+CUBIC_NM_PER_LITRE = 1e24
+
+# Map each site of a connected strand graph to the region edge that it lies on in the region graph of the strand graph,
+# and the fraction of the way along that edge (from its first vertex to its second) of the midpoint of its domain.
+# Returns a dict from (v, n) pairs to (edge index, fraction) pairs. This is cached in the region graph.
+def siteFractions(sg, rg):
+    if rg.__site_fractions__ is None:
+        fractions = {}
+        for (k, r) in enumerate(rg.region_list):
+            lengths = [sg.domainLength[str(sg.getDomain(s).name)][1] for s in r.sites]
+            total = float(sum(lengths))
+            if total <= 0:
+                raise ValueError('Cannot place the domains of region ' + str(r) + ', which has no nucleotides, for local concentrations')
+            # The sites run from the first vertex of the edge to the second, unless the complementary strand
+            # has its 5' end at the first vertex (see regiongraph.APosns).
+            forward = (not r.isBoundRegion()) or (r.sites[0] < r.comp_sites[-1])
+            before = 0
+            for (i, s) in enumerate(r.sites):
+                f = (before + lengths[i] / 2) / total
+                if not forward:
+                    f = 1.0 - f
+                fractions[(s.v, s.n)] = (k, f)
+                if r.isBoundRegion():
+                    c = r.comp_sites[i]
+                    fractions[(c.v, c.n)] = (k, f)
+                before += lengths[i]
+        rg.__site_fractions__ = fractions
+    return rg.__site_fractions__
+
+# The positions of the given sites in each of a batch of conformations of the region graph, given as a (M, V, 3)
+# array of coordinates indexed by conformation and vertex id. Returns a (M, P, 3) array for P sites.
+def sitePositions(sg, rg, coords, sites):
+    fractions = siteFractions(sg, rg)
+    edges = np.array([fractions[(s.v, s.n)][0] for s in sites], dtype=int)
+    f = np.array([fractions[(s.v, s.n)][1] for s in sites], dtype=float)
+    start = coords[:, rg.edge_v1[edges]]
+    end = coords[:, rg.edge_v2[edges]]
+    return start + (end - start) * f[None, :, None]
+
+# The weighted fraction of conformations in which each pair of sites is within the capture radius, where the first
+# and second sites of the pairs have the (M1, P, 3) and (M2, P, 3) arrays of positions and the weights w1 and w2.
+# If independent is False, the two arrays come from the same conformations (so M1 = M2); otherwise, every pair of
+# conformations is counted. The fractions are smoothed as described in the notes above. Returns an array of P fractions.
+# Raises a ValueError if either ensemble is empty (or has no weight), since the fractions cannot then be estimated.
+def captureFractions(positions1, w1, positions2, w2, radius, independent):
+    if len(w1) == 0 or len(w2) == 0 or np.sum(w1) <= 0.0 or np.sum(w2) <= 0.0:
+        raise ValueError('Cannot estimate local concentrations without any accepted conformations (try more estimationSamples)')
+    if not independent:
+        captured = (np.linalg.norm(positions1 - positions2, axis=2) <= radius).astype(float)
+        fractions = (w1 @ captured) / np.sum(w1)
+        n = effectiveSampleSize(w1)
+    else:
+        d = np.linalg.norm(positions1[:, None, :, :] - positions2[None, :, :, :], axis=3)
+        captured = (d <= radius).astype(float)
+        fractions = np.einsum('i,j,ijp->p', w1, w2, captured) / (np.sum(w1) * np.sum(w2))
+        n = min(effectiveSampleSize(w1), effectiveSampleSize(w2))
+    return (n * fractions + 0.5) / (n + 1)
+
+# Kish's effective sample size of a sample with the given importance weights.
+def effectiveSampleSize(w):
+    return float(np.sum(w) ** 2 / np.sum(w * w))
+
+# Convert capture fractions to local concentrations, in the concentration units of the binding rates.
+def localConcentrationsFromFractions(fractions, radius=CAPTURE_RADIUS):
+    volume = 4.0 / 3.0 * math.pi * radius ** 3
+    molar = fractions / volume * CUBIC_NM_PER_LITRE / AVOGADRO
+    return molar / RATE_CONCENTRATION_UNIT
+
+########################################################################
@@ -0,0 +1,105 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+########################################################################
+
+#
+# NOTES ON RANDOM NUMBER STREAMS
+# ==============================
+#
+# A single random number generator shared by every check makes the verdict for a species depend on
+# how many random numbers were used by the checks that came before it, and hence on the order in
+# which the enumerator happens to check species.
+#
+# Instead, each check can draw from its own stream, identified by a key computed from the global seed
+# and whatever identifies the thing being checked (see streamKey). The streams come from the Philox
+# counter-based generator in numpy, which is keyed by a 128-bit integer: streams with different keys
+# are statistically independent, and creating a stream is cheap, so there is no need to pass state
+# from one check to the next.
+#
+# PhiloxRandom wraps such a stream as a random.Random, so it can be used wherever the checkers
+# use a random.Random. Its doubles are drawn in blocks, since calling into numpy once per number
+# would be much slower than random.Random.
+#
+
+########################################################################
+
+import hashlib
+import random
+import numpy as np
+
+########################################################################
+
+PHILOX_BUFFER_SIZE = 1024
+
+# A 128-bit key for the stream identified by the given parts, which must have a deterministic repr
+# (e.g. numbers, strings and tuples of them, like the fingerprints in regiongraphcache.py).
+def streamKey(*parts):
+    return int.from_bytes(hashlib.sha256(repr(parts).encode()).digest()[:16], 'little')
+
+class PhiloxRandom(random.Random):
+
+    def __init__(self, key=0):
+        super().__init__(key)
+
+    def seed(self, key=0, version=2):
+        self.key = key % (1 << 128)
+        self.bitGenerator = np.random.Philox(key=self.key)
+        self.generator = np.random.Generator(self.bitGenerator)
+        self.buffer = []
+        self.bufferPosition = 0
+
+    def random(self):
+        if self.bufferPosition >= len(self.buffer):
+            self.buffer = self.generator.random(PHILOX_BUFFER_SIZE).tolist()
+            self.bufferPosition = 0
+        x = self.buffer[self.bufferPosition]
+        self.bufferPosition += 1
+        return x
+
+    def getrandbits(self, k):
+        words = (k + 63) // 64
+        x = 0
+        for w in self.bitGenerator.random_raw(words).tolist():
+            x = (x << 64) | w
+        return x >> (64 * words - k)
+
+    def getstate(self):
+        return (self.key, self.bitGenerator.state, list(self.buffer), self.bufferPosition, self.gauss_next)
+
+    def setstate(self, state):
+        (key, bit_generator_state, buffer, position, gauss_next) = state
+        self.seed(key)
+        self.bitGenerator.state = bit_generator_state
+        self.buffer = list(buffer)
+        self.bufferPosition = position
+        self.gauss_next = gauss_next
+
+    def __reduce__(self):
+        return (PhiloxRandom, (self.key,), self.getstate())
+
+    def __setstate__(self, state):
+        self.setstate(state)
+
+# The stream for the given parts (see streamKey), under the given global seed.
+def randomStream(seed, *parts):
+    return PhiloxRandom(streamKey(seed, *parts))
+
+########################################################################
@@ -25,7 +25,9 @@ except:
     GraphvizAvailable = False
 
 from structures import CartesianCoords
+from constants import *
 import math
+import numpy as np
 import lib
 
 
@@ -48,6 +50,9 @@ class Position:
 
     def __metric__(self):
         return (self.s, self.w)
+
+    def __hash__(self):
+        return hash((self.s.v, self.s.n, self.w))
     
     def __eq__(self, other):
         if isinstance(other, Position):
@@ -140,6 +145,8 @@ class RegionEdge:
         self.doubleStranded = doubleStranded
         self.label = label
         self.totalNucleotideLength = totalNucleotideLength
+        self.id1 = None # Integer ids of v1 and v2, set when the edge is added to a RegionGraph
+        self.id2 = None
 
     def getLength(self):
         return self.totalNucleotideLength
@@ -152,6 +159,34 @@ class RegionGraph:
         self.vertices_list = vertices_list
         self.edge_list = edge_list # Stores vertices
         self.region_list = region_list # list of edges 
+        self.__max_path_lengths__ = None # Cache for maxPathLengths
+        self.__sampling_plans__ = None # Cache for samplingplan.samplingPlansForRegionGraph
+        self.__tether_ids__ = None # Cache for getTetherIds
+        self.__nicked_junctions__ = None # Cache for nickedJunctions
+        self.__distance_bounds__ = None # Cache for distanceBounds
+        self.__geometric_signature__ = None # Cache for geometricsignature.geometricSignature
+        self.__excluded_volume_segments__ = {} # Cache for excludedvolume.excludedVolumeSegments, by radii
+        self.__site_fractions__ = None # Cache for localconcentration.siteFractions
+
+        # Each vertex is identified by a dense integer id, namely its index in vertices_list.
+        # The edges are also stored as parallel arrays, indexed in the same order as edge_list,
+        # so that the constraints on sampled coordinates can be checked without looking up vertexes.
+        self.position_ids = positionIds(vertices_list)
+        for e in edge_list:
+            e.id1 = self.vertexId(e.v1)
+            e.id2 = self.vertexId(e.v2)
+        self.edge_v1 = np.array([e.id1 for e in edge_list], dtype=int)
+        self.edge_v2 = np.array([e.id2 for e in edge_list], dtype=int)
+        self.edge_ds = np.array([e.doubleStranded for e in edge_list], dtype=bool)
+        self.edge_nt = np.array([e.totalNucleotideLength for e in edge_list], dtype=float)
+        self.edge_max_length = np.where(self.edge_ds, self.edge_nt * DS_LENGTH, self.edge_nt * SS_LENGTH)
+
+    # Get the integer id of a vertex of this region graph.
+    def vertexId(self, v):
+        return self.position_ids[v[0]]
+
+    def numVertices(self):
+        return len(self.vertices_list)
 
     # Make a graphical representation of this region graph.
     def makeGraphicalRepresentation(self):
@@ -194,61 +229,148 @@ class RegionGraph:
 
     #Finding the vertexes with maximum degree
     def findMaxDegreeVertices(self):
-        vertex_degree = {}
-        # Go through the list of edges once and record the degree of vertexes in a dict.
-        for edge in self.edge_list:
-            for v in [edge.v1, edge.v2]:
-                if(str(v) in vertex_degree.keys()):
-                    item = vertex_degree[str(v)]
-                    vertex_degree[str(v)] = (v, (item[1] + 1))
-                else:
-                    vertex_degree[str(v)] = (v, 1)
-        # Find the vertexes with maximum degree
-        max_deg_vertices = []
-        max_value = 0
-        for k, val in vertex_degree.values():
-            if (val > max_value):
-                max_deg_vertices = [k]
-                max_value = val
-            elif(val == max_value):
-                max_deg_vertices.append(k)
-        return max_deg_vertices
+        return [self.vertices_list[i] for i in self.findMaxDegreeVertexIds()]
+
+    # Finding the ids of the vertexes with maximum degree (in increasing order)
+    def findMaxDegreeVertexIds(self):
+        degrees = np.bincount(np.concatenate((self.edge_v1, self.edge_v2)), minlength=self.numVertices())
+        return np.flatnonzero(degrees == degrees.max()).tolist()
 
     #Finding all of the tethers
     def getTethers(self):
-        tether_list = []
-        # Go through the list of edges once and record the tethers.
-        for region in self.region_list:
-            for s, teth in region.tether_info:
-                for v in self.vertices_list:
-                    if ((teth[0] == '5prime' and (Position(s, "5'") in v)) or (teth[0] == '3prime' and (Position(s, "3'") in v))) :
-                        tether_list.append((v, (teth[1][0], teth[1][1])))
-        return tether_list
-
-    # Compute the angle between the double bonded regions.        
-    def computeNickedAngles(self, sampled_strucutres): # max_allowed_Angle  
-        nicked_angles = {}     
-        for e1 in self.edge_list:
-            for e2 in self.edge_list:
-                if (e1 != e2):
-                    if((not (e1.v1 == e1.v2 or e2.v1 == e2.v2)) and (e1.doubleStranded and e2.doubleStranded)):#self.isNickedRegion(e1, e2)): 
-                        coord1 =  sampled_strucutres[str(e1.v1)][0]
-                        coord2 =  sampled_strucutres[str(e1.v2)][0]
-                        coord3 =  sampled_strucutres[str(e2.v1)][0]
-                        coord4 =  sampled_strucutres[str(e2.v2)][0]
-                        theta = None
- 
-                        if(coord1 == coord3):
-                            theta = computeAngleBetweenRegions(coord1, coord2, coord4)
-                        elif(coord1 == coord4):
-                            theta = computeAngleBetweenRegions(coord1, coord2, coord3)
-                        elif(coord2 == coord3):
-                            theta = computeAngleBetweenRegions(coord2, coord1, coord4)
-                        elif(coord2 == coord4):
-                            theta = computeAngleBetweenRegions(coord2, coord1, coord3)
-                        if (theta is not None): 
-                            nicked_angles[str(e1.label) + str(e2.label)] = theta
-        return nicked_angles
+        return [(self.vertices_list[i], tether_coord) for (i, tether_coord) in self.getTetherIds()]
+
+    # Finding all of the tethers, as a list of (vertex id, (x, y)) pairs. This is cached.
+    def getTetherIds(self):
+        if self.__tether_ids__ is None:
+            tether_list = []
+            # Go through the list of regions once and record the tethers.
+            for region in self.region_list:
+                for s, teth in region.tether_info:
+                    if (teth[0] == '5prime'):
+                        p = Position(s, "5'")
+                    elif (teth[0] == '3prime'):
+                        p = Position(s, "3'")
+                    else:
+                        continue
+                    if (p in self.position_ids):
+                        tether_list.append((self.position_ids[p], (teth[1][0], teth[1][1])))
+            self.__tether_ids__ = tether_list
+        return self.__tether_ids__
+
+    # Compute, for every pair of vertices, the length of the shortest path between them
+    # when each region is given its maximum length in nm. Since no region can be stretched
+    # beyond its maximum length, this is an upper bound on the distance between the vertices
+    # in any conformation. The result is a (V, V) array indexed by vertex id, and is cached.
+    def maxPathLengths(self):
+        if self.__max_path_lengths__ is None:
+            n = self.numVertices()
+            res = np.full((n, n), math.inf)
+            np.fill_diagonal(res, 0.0)
+            for (i, j, l) in zip(self.edge_v1.tolist(), self.edge_v2.tolist(), self.edge_max_length.tolist()):
+                if (i != j and l < res[i, j]):
+                    res[i, j] = l
+                    res[j, i] = l
+            # Floyd-Warshall
+            for k in range(n):
+                res = np.minimum(res, res[:, k, None] + res[None, k, :])
+            self.__max_path_lengths__ = res
+        return self.__max_path_lengths__
+
+    # Compute, for every pair of vertices, lower and upper bounds on the distance between them in any
+    # conformation that satisfies the constraints. Double-stranded regions have exactly their length,
+    # single-stranded regions have at most their length, tethered vertices are fixed at their tether
+    # coordinates, and (if NICKED_FLAG is set) the nick angle bound gives a minimum distance between
+    # the far ends of the two regions at each nicked junction. These bounds are then tightened by
+    # triangle inequality bound smoothing, i.e. the Floyd-Warshall-style iteration
+    #   upper[i,j] <= upper[i,k] + upper[k,j]
+    #   lower[i,j] >= lower[i,k] - upper[k,j]
+    # If the lower bound on some distance exceeds its upper bound, no conformation satisfies the constraints.
+    # Returns a pair (lower, upper) of (V, V) arrays indexed by vertex id. This is cached.
+    def distanceBounds(self):
+        if self.__distance_bounds__ is None:
+            n = self.numVertices()
+            lower = np.zeros((n, n))
+            upper = np.full((n, n), math.inf)
+            np.fill_diagonal(upper, 0.0)
+            for (i, j, ds, l) in zip(self.edge_v1.tolist(), self.edge_v2.tolist(), self.edge_ds.tolist(), self.edge_max_length.tolist()):
+                if (i != j):
+                    upper[i, j] = upper[j, i] = min(upper[i, j], l)
+                if (ds):
+                    lower[i, j] = lower[j, i] = max(lower[i, j], l)
+            if NICKED_FLAG:
+                # The angle between the two regions at a nicked junction is at least 180 - NICKEDANGLE_UPPER_BOUND degrees.
+                cos_bound = math.cos(math.radians(NICKEDANGLE_UPPER_BOUND))
+                (centres, ends1, ends2, keys) = self.nickedJunctions()
+                for (c, a, b) in zip(centres.tolist(), ends1.tolist(), ends2.tolist()):
+                    la, lb = lower[c, a], lower[c, b]
+                    l = math.sqrt(max(0.0, la ** 2 + lb ** 2 + 2 * la * lb * cos_bound))
+                    lower[a, b] = lower[b, a] = max(lower[a, b], l)
+            tethers = dict(self.getTetherIds())
+            for i, (xi, yi) in tethers.items():
+                for j, (xj, yj) in tethers.items():
+                    if (i != j):
+                        d = math.sqrt((xi - xj) ** 2 + (yi - yj) ** 2)
+                        upper[i, j] = min(upper[i, j], d)
+                        lower[i, j] = max(lower[i, j], d)
+            for k in range(n):
+                upper = np.minimum(upper, upper[:, k, None] + upper[None, k, :])
+                lower = np.maximum(lower, lower[:, k, None] - upper[None, k, :])
+                lower = np.maximum(lower, lower[None, k, :] - upper[:, k, None])
+            self.__distance_bounds__ = (lower, upper)
+        return self.__distance_bounds__
+
+    # Find the nicked junctions of this region graph, i.e., the pairs of distinct double-stranded regions
+    # (other than self-loops) that share a vertex. Since this is purely topological, it is computed once.
+    # Returns a tuple (centres, ends1, ends2, keys): the first three are arrays of vertex ids, giving the
+    # shared vertex and the far ends of the two regions for each junction, and keys is a list of
+    # str(label1)+str(label2) keys naming the junctions.
+    def nickedJunctions(self):
+        if self.__nicked_junctions__ is None:
+            centres, ends1, ends2, keys = [], [], [], []
+            seen = set()
+            ds_edges = [e for e in self.edge_list if e.doubleStranded and e.id1 != e.id2]
+            for e1 in ds_edges:
+                for e2 in ds_edges:
+                    if (e1 is not e2):
+                        if (e1.id1 == e2.id1):
+                            junction = (e1.id1, e1.id2, e2.id2)
+                        elif (e1.id1 == e2.id2):
+                            junction = (e1.id1, e1.id2, e2.id1)
+                        elif (e1.id2 == e2.id1):
+                            junction = (e1.id2, e1.id1, e2.id2)
+                        elif (e1.id2 == e2.id2):
+                            junction = (e1.id2, e1.id1, e2.id1)
+                        else:
+                            continue
+                        # The angle is symmetric in the two regions, so each junction only needs checking once.
+                        (c, a, b) = junction
+                        if (c, min(a, b), max(a, b)) not in seen:
+                            seen.add((c, min(a, b), max(a, b)))
+                            centres.append(c)
+                            ends1.append(a)
+                            ends2.append(b)
+                            keys.append(str(e1.label) + str(e2.label))
+            self.__nicked_junctions__ = (np.array(centres, dtype=int), np.array(ends1, dtype=int), np.array(ends2, dtype=int), keys)
+        return self.__nicked_junctions__
+
+    # Compute the angles (in degrees) at all of the nicked junctions at once, given an array of
+    # sampled coordinates indexed by vertex id. The coordinates can be a single (V, 3) array,
+    # giving an array of angles, or a batch of shape (B, V, 3), giving an array of shape (B, J).
+    def nickedAngles(self, coords):
+        (centres, ends1, ends2, keys) = self.nickedJunctions()
+        vect1 = coords[..., ends1, :] - coords[..., centres, :]
+        vect2 = coords[..., centres, :] - coords[..., ends2, :]
+        val = np.sum(vect1 * vect2, axis=-1) / (np.linalg.norm(vect1, axis=-1) * np.linalg.norm(vect2, axis=-1))
+        return np.degrees(np.arccos(np.clip(val, -1.0, 1.0)))
+
+    # Compute the angle between the double bonded regions, given a (V, 3) array of sampled coordinates
+    # indexed by vertex id. Returns a dict mapping the key of each nicked junction to its angle.
+    def computeNickedAngles(self, coords): # max_allowed_Angle  
+        keys = self.nickedJunctions()[3]
+        if len(keys) == 0:
+            return {}
+        return dict(zip(keys, self.nickedAngles(coords).tolist()))
 
 ###########################################################
 
@@ -295,44 +417,24 @@ def BPosns(r):
     else:
         return [Position(r.sites[-1], "3'")]
 
-# This function makes a check of rules while creating the region graph. 
-# These rules are defined in the document. 
-def check_rules(v1, v2, region_list, debug=False):
-    def debugPrint(x):
-        if debug:
-            print(x)
-    for p1 in v1:
-        for p2 in v2:                          
-            for i in range(len(region_list)):
-                if(p1 in APosns(region_list[i]) and
-                   p1 in five_prPosns(region_list[i]) and
-                   p2 in APosns(region_list[i]) and
-                   p2 in three_prPosns(region_list[i])):
-                    return True
-                if(p1 in BPosns(region_list[i]) and
-                   p1 in five_prPosns(region_list[i]) and
-                   p2 in BPosns(region_list[i]) and
-                   p2 in three_prPosns(region_list[i])):
-                    return True
-                if((p1.s.v == p2.s.v) and ((p1.s.n - 1  == p2.s.n) and p1.w == "5'" and p2.w == "3'")):
-                    return True
-                if((p1.s.v == p2.s.v) and (p1.s.n + 1 == p2.s.n) and (p1.w == "3'" and p2.w == "5'")):
-                    return True
-    return False
-
 ####################################################################################################
 
-# Check to find which vertex from vertices_list contains ALL the positions from posns, if any.
+# Map each position in the vertexes of vertices_list to the id (index in vertices_list) of its vertex.
+def positionIds(vertices_list):
+    position_ids = {}
+    for i, v in enumerate(vertices_list):
+        for p in v:
+            position_ids[p] = i
+    return position_ids
+
+# Check to find which vertex from vertices_list contains ALL the positions from posns, if any,
+# given the map from positions to vertex ids computed by positionIds.
 # In a well-constructed region graph, all positions from posns should be in the same vertex.
-def findVertexContainingPosns(vertices_list, posns):
-    for v1 in vertices_list:
-        flag = True
-        for p1 in posns:
-            if (v1 != []) and (p1 not in v1):
-                flag = False
-        if (flag):
-            return v1
-    return None # Flags an error (should not happen in a well-constructed region graph). Dealt with at call site.
+def findVertexContainingPosns(vertices_list, posns, position_ids):
+    ids = set(position_ids.get(p) for p in posns)
+    if (len(ids) != 1 or None in ids):
+        return None # Flags an error (should not happen in a well-constructed region graph). Dealt with at call site.
+    return vertices_list[ids.pop()]
 
 # Main function to create region graph from a given strand graph.
 def regionGraphFromStrandGraph(sg, debug=False):
@@ -349,28 +451,47 @@ def regionGraphFromStrandGraph(sg, debug=False):
         all_posns += five_prPosns(region_list[i])
         all_posns += three_prPosns(region_list[i])
     all_posns = sorted(all_posns)
-  
-    ######## Create Vertices ##########
-    for j in range(len(all_posns)):
-        vertices_list.append([all_posns[j]])
+    index = {p: j for j, p in enumerate(all_posns)}
 
     ####### Merge Vertices ########
-    while (True):
-        merged = False
-        for v1 in vertices_list:
-            for v2 in vertices_list:
-                    if (v1 != v2):
-                        if(check_rules(v1, v2, region_list)):
-                            v1 += v2
-                            vertices_list.remove(v2)
-                            merged = True
-
-        if(not merged):
-            break
+    # Positions are merged into vertexes with a union-find structure, by the following rules
+    # (defined in the document): the two positions at the same end of a double-stranded region
+    # are merged, as are the 5' end of a site and the 3' end of the site before it on the same strand.
+    parent = list(range(len(all_posns)))
+    def find(j):
+        while parent[j] != j:
+            parent[j] = parent[parent[j]]
+            j = parent[j]
+        return j
+    def union(j, k):
+        j = find(j)
+        k = find(k)
+        if j != k:
+            parent[max(j, k)] = min(j, k)
+    for r in region_list:
+        if r.isBoundRegion():
+            for posns in [APosns(r), BPosns(r)]:
+                union(index[posns[0]], index[posns[1]])
+    adjacent_three_pr = {(p.s.v, p.s.n): j for j, p in enumerate(all_posns) if p.w == "3'"}
+    for j, p in enumerate(all_posns):
+        if p.w == "5'" and (p.s.v, p.s.n - 1) in adjacent_three_pr:
+            union(j, adjacent_three_pr[(p.s.v, p.s.n - 1)])
+
+    ######## Create Vertices ##########
+    # Each vertex lists its positions in sorted order, and the vertexes are sorted by their first position.
+    vertex_of_root = {}
+    for j, p in enumerate(all_posns):
+        root = find(j)
+        if root not in vertex_of_root:
+            vertex_of_root[root] = []
+            vertices_list.append(vertex_of_root[root])
+        vertex_of_root[root].append(p)
+
     ######### create edges #############
+    position_ids = positionIds(vertices_list)
     for i in range(len(region_list)):
-        v1 = findVertexContainingPosns(vertices_list, APosns(region_list[i]))
-        v2 = findVertexContainingPosns(vertices_list, BPosns(region_list[i]))
+        v1 = findVertexContainingPosns(vertices_list, APosns(region_list[i]), position_ids)
+        v2 = findVertexContainingPosns(vertices_list, BPosns(region_list[i]), position_ids)
         assert (v1 is not None and v2 is not None)
         edge_list.append(RegionEdge(v1, v2, region_list[i].isBoundRegion(), i, region_list[i].totalNucleotideLength))       
 
@@ -386,21 +507,26 @@ def condenseStrandGraphToRegionList(sg, debug=False):
             print(x)
     totalNucleotideLength = 0
     regions = []
-    visited_sites= []
+    visited_sites = set() # (v, n) pairs of the sites visited so far
     sites = sg.getSites()
+    # Site-indexed map from each bound site, as a (v, n) pair, to its binding partner.
+    partners = {}
+    for e in sg.current_edges:
+        partners[(e.s1.v, e.s1.n)] = e.s2
+        partners[(e.s2.v, e.s2.n)] = e.s1
     i = 0
     label = 0
     while(i < len(sites)):
         tether_info = []
         # Single stranded case
-        if(not sg.siteIsBound(sites[i])):
+        if((sites[i].v, sites[i].n) not in partners):
             reg_ssDNA = [sites[i]]
             tether_info = addTethers(sg, sites[i], None, tether_info)
             debugPrint(sites[i])
             debugPrint(sg.getDomain(sites[i]).name)
             #totalNucleotideLength = sg.getDomain(sites[i]).domainNucleotideLength
             totalNucleotideLength = sg.domainLength[str(sg.getDomain(sites[i]).name)][1]
-            while(((i + 1) < len(sites)) and (sites[i].v == sites[i + 1].v) and (not sg.siteIsBound(sites[i+1]))):
+            while(((i + 1) < len(sites)) and (sites[i].v == sites[i + 1].v) and ((sites[i+1].v, sites[i+1].n) not in partners)):
                 #totalNucleotideLength +=  sg.getDomain(sites[i+1]).domainNucleotideLength
                 totalNucleotideLength += sg.domainLength[str(sg.getDomain(sites[i+1]).name)][1]
                 reg_ssDNA.append(sites[i+1])
@@ -412,22 +538,22 @@ def condenseStrandGraphToRegionList(sg, debug=False):
             regions.append(Region(reg_ssDNA, None, totalNucleotideLength, label, tether_info))
             debugPrint("label: "+str(label))
             label += 1
-            visited_sites += reg_ssDNA
+            visited_sites.update((s.v, s.n) for s in reg_ssDNA)
         else: # Double stranded case
             debugPrint(sites[i])
-            debugPrint(sg.getBindingPartner(sites[i]))
-            d1_comp = sg.getBindingPartner(sites[i])
+            d1_comp = partners[(sites[i].v, sites[i].n)]
+            debugPrint(d1_comp)
             reg_dsDNA_s1 = [sites[i]]
             reg_dsDNA_s2 = [d1_comp]
             tether_info = addTethers(sg, sites[i], d1_comp, tether_info)
             debugPrint(sites[i])
             debugPrint(d1_comp)
-            if((sites[i] not in visited_sites) and  (d1_comp not in visited_sites)):
+            if(((sites[i].v, sites[i].n) not in visited_sites) and ((d1_comp.v, d1_comp.n) not in visited_sites)):
                 #totalNucleotideLength = sg.getDomain(sites[i]).domainNucleotideLength
                 totalNucleotideLength = sg.domainLength[str(sg.getDomain(sites[i]).name)][1]
                 while(((i+1) < len(sites)) and (sites[i].v == sites[i + 1].v)):
-                    d2_comp = sg.getBindingPartner(sites[i + 1])
-                    if((d2_comp is not None) and (d1_comp.v == d2_comp.v) and (d1_comp.n == d2_comp.n +1) and (sites[i+1] not in visited_sites and  d2_comp not in visited_sites)):
+                    d2_comp = partners.get((sites[i + 1].v, sites[i + 1].n))
+                    if((d2_comp is not None) and (d1_comp.v == d2_comp.v) and (d1_comp.n == d2_comp.n +1) and ((sites[i+1].v, sites[i+1].n) not in visited_sites and (d2_comp.v, d2_comp.n) not in visited_sites)):
                         assert (sg.getDomain(sites[i+1]).domainNucleotideLength ==  sg.getDomain(d2_comp).domainNucleotideLength)
                         #totalNucleotideLength +=  sg.getDomain(sites[i+1]).domainNucleotideLength
                         totalNucleotideLength += sg.domainLength[str(sg.getDomain(sites[i+1]).name)][1]
@@ -444,8 +570,8 @@ def condenseStrandGraphToRegionList(sg, debug=False):
                 regions.append(Region(reg_dsDNA_s1, reg_dsDNA_s2, totalNucleotideLength, label, tether_info))
                 debugPrint("label: "+str(label))
                 label += 1
-                visited_sites += reg_dsDNA_s1
-                visited_sites += reg_dsDNA_s2
+                visited_sites.update((s.v, s.n) for s in reg_dsDNA_s1)
+                visited_sites.update((s.v, s.n) for s in reg_dsDNA_s2)
         i = (i + 1)
     return regions
 
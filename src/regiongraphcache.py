@@ -0,0 +1,93 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+from collections import OrderedDict
+from constants import *
+from regiongraph import *
+from tilespecies import TileSpecies
+from freespecies import FreeSpecies
+
+#
+# Cache of region graphs, for use by constraint checkers.
+#
+# The same connected component recurs across many species (for example, a track strand whose
+# sites are untouched by a reaction elsewhere on the tile), so region graphs are cached by a
+# fingerprint of the component. Each cached region graph carries its own caches (of maximum
+# path lengths and sampling plans), so those are reused too.
+#
+
+# Fingerprint of a strand graph component, covering exactly what its region graph depends on:
+# the vertex numbering, the length, domains and tether of the strand at each vertex,
+# the bound sites, and the domainLength table. Since the components of species are in
+# canonical form, equal components of different species have equal fingerprints.
+# Admissible and toehold edges are left out, as they do not affect the geometry.
+def regionGraphFingerprint(sg):
+    strands = []
+    for c in sg.vertex_colors:
+        info = sg.colors_info[c]
+        strands.append((info['length'], tuple(d.name for d in info['strand_type'].domains), info['tether']))
+    bonds = tuple(sorted((e.s1.v, e.s1.n, e.s2.v, e.s2.n) for e in sg.current_edges))
+    domain_lengths = tuple(sorted(sg.domainLength.items()))
+    return (tuple(strands), bonds, domain_lengths)
+
+# Fingerprint of a species: its type and the fingerprints of its components, in order.
+# Equal species have equal fingerprints, so they can be used as dictionary keys for species.
+def speciesFingerprint(sp):
+    if isinstance(sp, FreeSpecies):
+        sg_list = [sp.sg]
+    elif isinstance(sp, TileSpecies):
+        sg_list = sp.tiles_sg
+    else:
+        assert False
+    return (type(sp).__name__, tuple(regionGraphFingerprint(sg) for sg in sg_list))
+
+# Least-recently-used cache of region graphs, keyed by regionGraphFingerprint.
+# At most maxSize region graphs are kept (or any number if maxSize is None).
+class RegionGraphCache:
+
+    def __init__(self, maxSize=REGION_GRAPH_CACHE_SIZE):
+        assert maxSize is None or maxSize > 0
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+
+    # Get the region graph for the connected strand graph sg, building it if it is not in the cache.
+    # The fingerprint of sg can be supplied as key, if the caller has already computed it.
+    def getRegionGraph(self, sg, key=None):
+        if key is None:
+            key = regionGraphFingerprint(sg)
+        rg = self.entries.get(key)
+        if rg is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return rg
+        self.misses += 1
+        rg = regionGraphFromStrandGraph(sg)
+        self.entries[key] = rg
+        if self.maxSize is not None and len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+        return rg
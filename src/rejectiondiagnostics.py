@@ -0,0 +1,138 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+import math
+import numpy as np
+from constants import *
+
+#
+# Diagnostics of the trials rejected by the sampling checker.
+#
+# Each rejected trial is rejected by one constraint, named as follows (see ConstraintChecker_Sampling.sampleCoordinates):
+#   surface                  no direction for the next region keeps it above the surface (z >= 0)
+#   ds_length:<label>        a double-stranded region does not have exactly its length
+#   ss_reach:<label>         a single-stranded region is stretched beyond its length
+#   nick_angle:<junction>    the angle at a nicked junction exceeds NICKEDANGLE_UPPER_BOUND
+#   closure:<label>          a loop cannot be closed by the region with the given label
+#   guidance                 no candidate placement can still reach the vertexes already placed
+#   excluded_volume          two regions overlap (if excluded volume is checked)
+# The part of the name before the colon is the kind of the constraint.
+#
+# Along with the number of trials rejected by each constraint, the sampling_info for each component records
+# the distribution of the relative violations of the constraint (see checkPlacedConstraints), as a histogram
+# with the bins given by VIOLATION_BIN_EDGES, plus a final bin for constraints that cannot be satisfied at all
+# (whose violation is infinite). Histograms can be added up, so the distributions can be aggregated over all
+# of the components checked during an enumeration (see rejectionReport).
+#
+
+VIOLATION_BIN_EDGES = (0.0, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, math.inf)
+
+# The kind of a constraint, given its name.
+def rejectionKind(constraint):
+    return constraint.split(':', 1)[0]
+
+# Summarise a list of relative violations as a dict with the histogram of the values (see the notes above),
+# and the smallest and largest finite values (or None if there are none).
+def violationSummary(values):
+    values = np.asarray(values, dtype=float)
+    finite = values[np.isfinite(values)]
+    (histogram, edges) = np.histogram(finite, bins=np.array(VIOLATION_BIN_EDGES[:-1] + (np.finfo(float).max,)))
+    return {'histogram': histogram.tolist() + [int(np.sum(~np.isfinite(values)))],
+            'min': float(finite.min()) if len(finite) > 0 else None,
+            'max': float(finite.max()) if len(finite) > 0 else None}
+
+# The summary of the union of the values summarised by two violation summaries.
+def mergeViolationSummaries(a, b):
+    def combine(x, y, f):
+        return y if x is None else (x if y is None else f(x, y))
+    return {'histogram': [x + y for (x, y) in zip(a['histogram'], b['histogram'])],
+            'min': combine(a['min'], b['min'], min),
+            'max': combine(a['max'], b['max'], max)}
+
+# The violation summary of each constraint (see violationSummary), given a list of (constraint, violation) pairs.
+def violationSummaries(rejections):
+    values = {}
+    for (constraint, violation) in rejections:
+        values.setdefault(constraint, []).append(violation)
+    return {constraint: violationSummary(v) for (constraint, v) in values.items()}
+
+# Aggregate the rejection diagnostics in a list of sampling_info dicts (e.g. the sampling_info of each
+# (species, sampling_info) pair in the plausible_species and implausible_species lists of an enumerator).
+# Verdicts that were reused rather than sampled or decided analytically (see constraintchecker_analytic.py),
+# are only counted, and sampling_info from other checkers is skipped.
+# Returns a dict with the number of components that were sampled, reused and decided analytically, the total number of trials
+# and of rejected trials, and, for each kind of constraint, the number of trials that it rejected, the number
+# of components in which it rejected some trial, and the aggregated summary of its violations.
+def rejectionReport(sampling_infos):
+    report = {'components_sampled': 0, 'components_reused': 0, 'components_analytic': 0, 'components_implausible': 0, 'trials': 0, 'rejected_trials': 0, 'kinds': {}}
+    for info in sampling_infos:
+        if not isinstance(info, dict) or 'sampling_unsuccessful_trials' not in info:
+            continue
+        if 'sampling_reused' in info:
+            report['components_reused'] += 1
+            continue
+        if 'analytic_verdict' in info:
+            report['components_analytic'] += 1
+            continue
+        report['components_sampled'] += 1
+        if 'sampling_acceptance' in info: # A fixed number of trials (see ConstraintChecker_Sampling.estimateComponent)
+            failed = info['sampling_acceptance'] == 0.0
+            trials = info['sampling_trial_budget']
+        else:
+            failed = 'sampling_importance_weight' not in info
+            trials = info['sampling_unsuccessful_trials'] + (0 if failed else 1)
+        if failed:
+            report['components_implausible'] += 1
+        report['trials'] += trials
+        report['rejected_trials'] += info['sampling_unsuccessful_trials']
+        violations = info.get('sampling_violations', {})
+        kinds_seen = set()
+        for (constraint, count) in info.get('sampling_rejections', {}).items():
+            name = rejectionKind(constraint)
+            kind = report['kinds'].setdefault(name, {'trials': 0, 'components': 0, 'violations': None})
+            kind['trials'] += count
+            if name not in kinds_seen:
+                kind['components'] += 1
+                kinds_seen.add(name)
+            if constraint in violations:
+                kind['violations'] = violations[constraint] if kind['violations'] is None else mergeViolationSummaries(kind['violations'], violations[constraint])
+    return report
+
+# Print the aggregated rejection diagnostics (see rejectionReport) for a list of sampling_info dicts.
+def printRejectionReport(sampling_infos, splitter=' '):
+    report = rejectionReport(sampling_infos)
+    print(f'Components sampled:{splitter}{report["components_sampled"]}')
+    print(f'Components reused:{splitter}{report["components_reused"]}')
+    print(f'Components decided analytically:{splitter}{report["components_analytic"]}')
+    print(f'Components with no accepted trial:{splitter}{report["components_implausible"]}')
+    print(f'Trials:{splitter}{report["trials"]}')
+    print(f'Rejected trials:{splitter}{report["rejected_trials"]}')
+    bins = ['[' + str(lo) + ', ' + str(hi) + ')' for (lo, hi) in zip(VIOLATION_BIN_EDGES[:-1], VIOLATION_BIN_EDGES[1:])] + ['unsatisfiable']
+    for (name, kind) in sorted(report['kinds'].items(), key=lambda x: -x[1]['trials']):
+        print(f'Rejected by {name}:{splitter}{kind["trials"]} trials in {kind["components"]} components')
+        if kind['violations'] is not None:
+            v = kind['violations']
+            if v['min'] is not None:
+                print(f'  relative violation range:{splitter}{v["min"]:.4g} to {v["max"]:.4g}')
+                if name == 'nick_angle':
+                    print(f'  angle range (degrees):{splitter}{NICKEDANGLE_UPPER_BOUND * (1 + v["min"]):.4g} to {NICKEDANGLE_UPPER_BOUND * (1 + v["max"]):.4g}')
+            for (b, count) in zip(bins, v['histogram']):
+                if count > 0:
+                    print(f'  {b}:{splitter}{count}')
@@ -0,0 +1,202 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+from constants import *
+from structures import CartesianCoords
+from region_domain import RegionDomain
+from regiongraph import *
+import numpy as np
+
+#
+# Traversal plans for sampling conformations of a region graph.
+#
+# Sampling a conformation places the root vertexes (the tethers, or a single vertex of maximum
+# degree for untethered structures) and then places every other vertex relative to a parent
+# vertex that has already been placed, along a "tree edge". Any other edges between vertexes
+# that have been placed cannot be sampled directly, so they become closure checks (and are
+# candidates for loop closure). None of this bookkeeping depends on the random draws,
+# so it is computed once per region graph and each sampling trial just executes the plan.
+# Vertexes are referred to by their integer ids in the region graph throughout.
+#
+
+# The maximum distance between the ends of a region edge, in nm.
+def maxEdgeLength(e):
+    return e.totalNucleotideLength * (DS_LENGTH if e.doubleStranded else SS_LENGTH)
+
+# A single step of a sampling plan: place vertex from parent (both vertex ids), along edge.
+#   closingEdges   - list of (edge, id of other vertex) for the other edges that join vertex
+#                    to a vertex placed earlier, other than the parent (these close cycles)
+#   closureEdge    - the closing edge used for loop closure, if any (a double-stranded one if possible,
+#                    since random placement cannot satisfy those)
+#   checkEdges     - all edges (including edge) that join vertex to itself or to earlier vertexes,
+#                    whose distance constraints can therefore be checked once vertex has been placed
+#   checkEdgeIds   - the indexes of those edges in the region graph, as an array (for the excluded volume check)
+#   checkJunctions - indexes of the nicked junctions (see RegionGraph.nickedJunctions) whose
+#                    angle constraints can be checked once vertex has been placed
+class SamplingStep:
+
+    def __init__(self, vertex, parent, edge, closingEdges):
+        self.vertex = vertex
+        self.parent = parent
+        self.edge = edge
+        self.domain = RegionDomain(edge.doubleStranded, edge.totalNucleotideLength)
+        self.closingEdges = closingEdges
+        ds_closing_edges = [(e, v) for (e, v) in closingEdges if e.doubleStranded]
+        self.closureEdge = ds_closing_edges[0] if len(ds_closing_edges) > 0 else (closingEdges[0] if len(closingEdges) > 0 else None)
+        self.checkEdges = []
+        self.checkEdgeIds = []
+        self.checkJunctions = []
+
+    def __str__(self):
+        return self.__repr__()
+
+    def __repr__(self):
+        return 'place '+str(self.vertex)+' from '+str(self.parent)+' via '+str(self.edge.label)+' (closing '+str([e.label for (e, k) in self.closingEdges])+')'
+
+# A plan for sampling a conformation of a region graph.
+#   roots          - list of (vertex id, fixed coordinates) for the vertexes placed first
+#   rootChecks     - edges joining the roots, which need to be checked
+#   rootCheckIds   - the indexes of those edges in the region graph, as an array
+#   rootJunctions  - indexes of the nicked junctions between the roots, which need to be checked
+#   steps          - list of SamplingStep objects, in the order they should be executed
+# Every constraint is attached to the earliest point in the plan at which all of its vertexes
+# have been placed, so that a trial can be abandoned as soon as any constraint is violated.
+class SamplingPlan:
+
+    def __init__(self, rg, roots):
+        self.roots = roots
+        self.rootChecks = []
+        self.rootCheckIds = []
+        self.rootJunctions = []
+        self.steps = []
+        self.__excluded_volume_schedule__ = {} # Cache for excludedvolume.excludedVolumeSchedule, by radii
+        placed = set(i for (i, coord) in roots)
+        unplaced = [i for i in range(rg.numVertices()) if i not in placed]
+        while len(unplaced) > 0:
+            (vertex, parent, edge) = self.mostConstrainedVertex(rg, placed, unplaced)
+            closingEdges = []
+            for e in rg.edge_list:
+                if e is edge:
+                    continue
+                if (e.id1 == vertex and e.id2 != vertex and e.id2 != parent and e.id2 in placed):
+                    closingEdges.append((e, e.id2))
+                elif (e.id2 == vertex and e.id1 != vertex and e.id1 != parent and e.id1 in placed):
+                    closingEdges.append((e, e.id1))
+            self.steps.append(SamplingStep(vertex, parent, edge, closingEdges))
+            placed.add(vertex)
+            unplaced.remove(vertex)
+
+        # Attach each constraint to the step that places the last of its vertexes (or to the roots).
+        step_of = dict((i, None) for (i, coord) in roots)
+        for step in self.steps:
+            step_of[step.vertex] = step
+        def lastStep(vertexes):
+            steps = [step_of[i] for i in vertexes if step_of[i] is not None]
+            return max(steps, key=self.steps.index) if len(steps) > 0 else None
+        for (k, e) in enumerate(rg.edge_list):
+            step = lastStep([e.id1, e.id2])
+            (self.rootChecks if step is None else step.checkEdges).append(e)
+            (self.rootCheckIds if step is None else step.checkEdgeIds).append(k)
+        self.rootCheckIds = np.array(self.rootCheckIds, dtype=int)
+        for step in self.steps:
+            step.checkEdgeIds = np.array(step.checkEdgeIds, dtype=int)
+        (centres, ends1, ends2, keys) = rg.nickedJunctions()
+        for j in range(len(keys)):
+            step = lastStep([centres[j], ends1[j], ends2[j]])
+            (self.rootJunctions if step is None else step.checkJunctions).append(j)
+
+    # Most-constrained-first ordering heuristic: pick the unplaced vertex with the most edges
+    # to vertexes that have already been placed (so that cycles are closed, and checked, as
+    # early as possible). Ties are broken in favour of vertexes joined to the placed vertexes
+    # by a double-stranded region, then by a shorter region (so that the tightest constraints are
+    # sampled directly, and the ones with more slack are left to be checked), then by vertex id.
+    # The tree edge for the chosen vertex is the shortest double-stranded edge if possible,
+    # and otherwise the shortest single-stranded edge.
+    # Returns a triple (vertex, parent, edge).
+    def mostConstrainedVertex(self, rg, placed, unplaced):
+        best = None
+        best_score = None
+        for v in unplaced:
+            constraints = 0
+            tree_edge = None
+            for e in rg.edge_list:
+                if (e.id1 == v and e.id2 != v and e.id2 in placed) or (e.id2 == v and e.id1 != v and e.id1 in placed):
+                    constraints += 1
+                    if tree_edge is None or (e.doubleStranded, -maxEdgeLength(e)) > (tree_edge.doubleStranded, -maxEdgeLength(tree_edge)):
+                        tree_edge = e
+            if tree_edge is None:
+                continue
+            score = (constraints, tree_edge.doubleStranded, -maxEdgeLength(tree_edge))
+            if best_score is None or score > best_score:
+                best_score = score
+                best = (v, tree_edge.id1 if tree_edge.id2 == v else tree_edge.id2, tree_edge)
+        assert best is not None # Otherwise the region graph is not connected
+        return best
+
+    def __str__(self):
+        return self.__repr__()
+
+    def __repr__(self):
+        return 'roots: '+str([i for (i, c) in self.roots])+'; steps: '+str(self.steps)
+
+# Get the sampling plans for a region graph, computing them if they have not been computed already.
+# Tethered region graphs have a single plan, rooted at the tethers.
+# Untethered region graphs have one plan for each vertex of maximum degree, since the root is chosen
+# at random from those vertexes in each trial.
+def samplingPlansForRegionGraph(rg):
+    if rg.__sampling_plans__ is None:
+        tethered_vertices = rg.getTetherIds()
+        if (len(tethered_vertices) == 0):
+            rg.__sampling_plans__ = [SamplingPlan(rg, [(i, CartesianCoords(0, 0, 0))]) for i in rg.findMaxDegreeVertexIds()]
+        else:
+            roots = []
+            for i, tether_coord in tethered_vertices:
+                roots = [(j, c) for (j, c) in roots if j != i] + [(i, CartesianCoords(tether_coord[0], tether_coord[1], 0))]
+            rg.__sampling_plans__ = [SamplingPlan(rg, roots)]
+    return rg.__sampling_plans__
+
+# Coordinates sampled for the vertexes of a region graph, in the course of executing a sampling plan.
+#   coords     - (V, 3) array of coordinates in nm, indexed by vertex id
+#   domainInfo - list indexed by vertex id of the previousDomainInfo dict for the region along which
+#                the vertex was placed (None for roots, and for vertexes that have not been placed yet)
+#   placed     - (V,) boolean array recording which vertexes have been placed
+class SampledStructures:
+
+    def __init__(self, rg):
+        n = rg.numVertices()
+        self.coords = np.zeros((n, 3))
+        self.domainInfo = [None] * n
+        self.placed = np.zeros(n, dtype=bool)
+
+    def place(self, i, coord, domainInfo):
+        self.coords[i] = (coord.x, coord.y, coord.z)
+        self.domainInfo[i] = domainInfo
+        self.placed[i] = True
+
+    def getCoords(self, i):
+        (x, y, z) = self.coords[i].tolist()
+        return CartesianCoords(x, y, z)
+
+    def allCoords(self):
+        return [CartesianCoords(x, y, z) for (x, y, z) in self.coords.tolist()]
+
+    # The distance between the ends of each edge of the region graph, indexed in the same order as rg.edge_list.
+    def edgeLengths(self, rg):
+        return np.linalg.norm(self.coords[rg.edge_v1] - self.coords[rg.edge_v2], axis=1)
@@ -248,6 +248,8 @@ class StrandGraph(object):
         self.toehold_edges = toehold_edges
         self.current_edges = current_edges
         self.domainLength = domainLength
+        self.__vertex_partitions__ = None # Cache for __makeVertexPartitions__
+        self.__connected_components__ = None # Cache for connectedComponents
         # assert self.isValid()
 
     ####################################################################################################
@@ -457,7 +459,21 @@ class StrandGraph(object):
         self.admissible_edges = [e.__relabeled__(vmap) for e in self.admissible_edges]
         self.toehold_edges = [e.__relabeled__(vmap) for e in self.toehold_edges]
         self.current_edges = [e.__relabeled__(vmap) for e in self.current_edges]
+        self.__resetCaches__()
         # assert self.isValid()
+
+    # Forget the cached vertex partitions and connected components, which every method that changes
+    # this strand graph in place must call.
+    def __resetCaches__(self):
+        self.__vertex_partitions__ = None
+        self.__connected_components__ = None
+
+    # RETURN A NEW COPY of this strand graph, whose lists can be changed without changing this one.
+    # The vertex partitions are shared, since they are never changed in place.
+    def __copied__(self):
+        new_sg = StrandGraph(list(self.colors_info), list(self.vertex_colors), list(self.admissible_edges), list(self.toehold_edges), list(self.current_edges), self.domainLength)
+        new_sg.__vertex_partitions__ = self.__vertex_partitions__
+        return new_sg
     
     # RETURN A NEW VERSION of this strand graph that is relabeled according to the supplied mapping, "vmap".
     # Vmap is a list of indexes. The LIST INDEX of each value in the list
@@ -528,6 +544,7 @@ class StrandGraph(object):
         self.admissible_edges.sort()
         self.toehold_edges.sort()
         self.current_edges.sort()
+        self.__resetCaches__()
         
     def numVertexes(self):
         return len(self.vertex_colors)
@@ -608,7 +625,14 @@ class StrandGraph(object):
                 res += [e]
         return res
 
+    # The partitions are cached, since isConnected and connectedComponents are called on the same
+    # strand graphs over and over again (e.g., by the enumerator and by the constraint checker).
     def __makeVertexPartitions__(self):
+        if self.__vertex_partitions__ is None:
+            self.__vertex_partitions__ = self.__computeVertexPartitions__()
+        return self.__vertex_partitions__
+
+    def __computeVertexPartitions__(self):
         def tryToMergeVertexPartitions(vertex_partitions):
             for (idx,p1) in enumerate(vertex_partitions):
                 for (jdx,p2) in enumerate(vertex_partitions):
@@ -652,7 +676,10 @@ class StrandGraph(object):
             assert new_sg.isConnected()
             new_sg.__convertToCanonicalForm__()
             return new_sg
-        return [makeStrandGraphFromVertexPartition(vs) for vs in self.__makeVertexPartitions__()]
+        if self.__connected_components__ is None:
+            self.__connected_components__ = [makeStrandGraphFromVertexPartition(vs) for vs in self.__makeVertexPartitions__()]
+        # Callers (e.g. the species constructors) may change the components in place, so each gets its own copies
+        return [comp.__copied__() for comp in self.__connected_components__]
 
     # def connectedComponents_another(self):
     #     def filterConvertAndMaybeCheckEdges(edges, vs, doCheck):
@@ -1251,7 +1278,12 @@ def newSpeciesListFromStrandGraph(old_sp, old_strand_graph, new_strand_graph):
         new_tile_species = []
         new_tile_sg = list(old_sp.tiles_sg)
         # Remove the old strand graph components instead of removing the whole strand graph from the tile species list.
-        for comp in old_strand_graph.connectedComponents():
+        # If the old strand graph is itself one of the tile components, it is its own (only) component.
+        if any(old_strand_graph is tiles_graph for tiles_graph in old_sp.tiles_sg):
+            old_components = [old_strand_graph]
+        else:
+            old_components = old_strand_graph.connectedComponents()
+        for comp in old_components:
             for tiles_graph in old_sp.tiles_sg:
                 if(comp == tiles_graph):
                     if(tiles_graph in new_tile_sg):
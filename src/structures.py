@@ -176,47 +176,50 @@ class AbstractLinearStructure:
 
 ########################################################################
 
-# Function to use sampled deviation angle and previous unit vector
-# to create a new unit vector that deviates by that angle,
-# in a randomly chosen direction.
-def makeNextUnitVec(previousUnitVec, sampledAngle, prng):
-
-    #Center of the circle
-    center_of_circle = [previousUnitVec.x + previousUnitVec.x * math.cos(sampledAngle), 
-                          previousUnitVec.y + previousUnitVec.y * math.cos(sampledAngle),
-                          previousUnitVec.z + previousUnitVec.z * math.cos(sampledAngle)]
+# Function to find two unit vectors a and b which are perpendicular to each other
+# and to the supplied unit vector v = (v1,v2,v3), as described in the notes at the top of this file.
+# This is in the innermost loop of the sampler, so it works on plain floats rather than
+# building intermediate UnitVector objects or calling numpy.cross on tiny lists.
+# Returns the components (a1, a2, a3, b1, b2, b3).
+def perpendicularBasis(v1, v2, v3):
 
     #Finding two basis axis a and b
-    if previousUnitVec.x != 0:
-        a2 = 1
-        a3 = 1
-        a1 = ((-1) * (a2 * previousUnitVec.y + a3 * previousUnitVec.z)/ previousUnitVec.x)
-    elif previousUnitVec.y != 0:
-        a1 = 1
-        a3 = 1
-        a2 = ((-1) * (a1 * previousUnitVec.x + a3 * previousUnitVec.z)/ previousUnitVec.y)
-    elif previousUnitVec.z != 0:
-        a1 = 1
-        a2 = 1
-        a3 = ((-1) * (a1 * previousUnitVec.x + a2 * previousUnitVec.y)/ previousUnitVec.z)
+    if v1 != 0:
+        a1, a2, a3 = ((-1) * (v2 + v3) / v1), 1.0, 1.0
+    elif v2 != 0:
+        a1, a2, a3 = 1.0, ((-1) * (v1 + v3) / v2), 1.0
+    elif v3 != 0:
+        a1, a2, a3 = 1.0, 1.0, ((-1) * (v1 + v2) / v3)
     else:
         assert False
 
-    basis_vector_a = UnitVector(a1, a2, a3)
-    basis_vector_b_numpy = numpy.cross([basis_vector_a.x, basis_vector_a.y, basis_vector_a.z], [previousUnitVec.x, previousUnitVec.y, previousUnitVec.z]) 
-    basis_vector_b = UnitVector(basis_vector_b_numpy[0], basis_vector_b_numpy[1], basis_vector_b_numpy[2])
-
-    theta = prng.uniform(0, 2 * math.pi)
+    magnitude = math.sqrt((a1**2) + (a2**2) + (a3**2))
+    a1, a2, a3 = a1 / magnitude, a2 / magnitude, a3 / magnitude
+    b1, b2, b3 = a2 * v3 - a3 * v2, a3 * v1 - a1 * v3, a1 * v2 - a2 * v1
+    magnitude = math.sqrt((b1**2) + (b2**2) + (b3**2))
+    return a1, a2, a3, b1 / magnitude, b2 / magnitude, b3 / magnitude
+
+# Function to compute the direction that deviates from the unit vector v = (v1,v2,v3) by the angle sampledAngle,
+# at the parametric angle theta around the rim of the cone (see the notes at the top of this file).
+# Returns the (unnormalized) components (u1, u2, u3) of cos(sampledAngle) v + sin(sampledAngle) (cos(theta) a + sin(theta) b),
+# where a and b are the perpendicular basis of v, which is numerically equivalent to (but not bit-for-bit the same as)
+# computing the centre of the circle and the point on it explicitly.
+def nextUnitVecComponents(v1, v2, v3, sampledAngle, theta):
+    a1, a2, a3, b1, b2, b3 = perpendicularBasis(v1, v2, v3)
+    cosAngle = math.cos(sampledAngle)
     radius = math.sin(sampledAngle)
- 
-    point_on_circle = [center_of_circle[0] + radius * math.cos(theta)* basis_vector_a.x + radius * math.sin(theta) * basis_vector_b.x,
-                       center_of_circle[1] + radius * math.cos(theta)* basis_vector_a.y + radius * math.sin(theta) * basis_vector_b.y,
-                       center_of_circle[2] + radius * math.cos(theta)* basis_vector_a.z + radius * math.sin(theta) * basis_vector_b.z]
+    ra = radius * math.cos(theta)
+    rb = radius * math.sin(theta)
+    return (v1 * cosAngle + ra * a1 + rb * b1,
+            v2 * cosAngle + ra * a2 + rb * b2,
+            v3 * cosAngle + ra * a3 + rb * b3)
 
-    u1 = point_on_circle[0] - previousUnitVec.x
-    u2 = point_on_circle[1] - previousUnitVec.y
-    u3 = point_on_circle[2] - previousUnitVec.z
-    
+# Function to use sampled deviation angle and previous unit vector
+# to create a new unit vector that deviates by that angle,
+# in a randomly chosen direction.
+def makeNextUnitVec(previousUnitVec, sampledAngle, prng):
+    theta = prng.uniform(0, 2 * math.pi)
+    u1, u2, u3 = nextUnitVecComponents(previousUnitVec.x, previousUnitVec.y, previousUnitVec.z, sampledAngle, theta)
     nextUnitVec = UnitVector(u1, u2, u3)
     return nextUnitVec, sampledAngle
 
@@ -230,10 +233,11 @@ def sampleNextUnitVec(previousDomainInfo, currentDomain, distributions, prng):
     angleDistToUse = (distributions.dsdsDomainAngleDist
                       if previousDomainInfo['domain'].isDS and currentDomain.isDS
                       else distributions.ssDomainAngleDist)
-    sampledAngle = angleDistToUse.sampleAngle(prng)
     if (previousDomainInfo['domain'].isDS and currentDomain.isDS and NICKED_FLAG):
-        while(sampledAngle > NICKEDANGLE_UPPER_BOUND):
-            sampledAngle = angleDistToUse.sampleAngle(prng)
+        # Sampled angles are in radians, whereas the nick angle bound is in degrees.
+        sampledAngle, mass = angleDistToUse.sampleTruncatedAngle(prng, 0.0, math.radians(NICKEDANGLE_UPPER_BOUND))
+    else:
+        sampledAngle = angleDistToUse.sampleAngle(prng)
     return makeNextUnitVec(previousDomainInfo['unitVec'], sampledAngle, prng)
 
 # Function to sample the initial unit vector from a tether.
@@ -267,6 +271,164 @@ def samplePoint(previousDomainInfo, currentDomain, distributions, prng):
      
     return (thisDomainUnitVec, thisDomainLengthNm, sampledAngle)
 
+########################################################################
+
+#
+# NOTES ON LOOP CLOSURE
+# =====================
+#
+# When the next point to be placed is also joined to another, already placed, point q
+# (i.e., its region closes a cycle in the region graph), sampling its direction at random
+# almost never satisfies the constraint on its distance from q. Instead, given the previous
+# point p and the sampled length r1 of the region from p, we place the new point directly
+# on the set of points at distance r1 from p that also satisfy the constraint from q.
+#
+# If p is uniformly distributed on the sphere of radius r1 around c1 and D = |c1 - c2|,
+# then the distance r = |p - c2| has density r / (2 * r1 * D) on [|r1 - D|, r1 + D],
+# and p is uniformly distributed around the circle of points at any given distance r.
+# So we can sample the constrained point exactly by picking r, then a point on the circle.
+# The importance weight returned alongside the point is the prior probability of the
+# constraint being satisfied (for an inequality constraint) or its prior density
+# (for an equality constraint), multiplied by the fraction of the circle with z >= minZ.
+#
+
+# Function to sample a point on the circle with given centre, radius and unit normal,
+# restricted to the arc of the circle on which z >= minZ.
+# Returns the point and the fraction of the circle that was allowed,
+# or (None, 0.0) if no part of the circle satisfies the restriction.
+def sampleCirclePoint(center, radius, normal, prng, minZ=0.0):
+    a1, a2, a3, b1, b2, b3 = perpendicularBasis(normal.x, normal.y, normal.z)
+    amplitude = radius * math.sqrt(a3 ** 2 + b3 ** 2)
+    if amplitude == 0.0:
+        if center.z < minZ:
+            return (None, 0.0)
+        lo, hi = 0.0, 2 * math.pi
+    else:
+        t = (minZ - center.z) / amplitude
+        if t > 1.0 and not math.isclose(t, 1.0):
+            return (None, 0.0)
+        elif t <= -1.0:
+            lo, hi = 0.0, 2 * math.pi
+        else:
+            offset = math.atan2(b3, a3)
+            halfWidth = math.acos(min(t, 1.0))
+            lo, hi = offset - halfWidth, offset + halfWidth
+    theta = prng.uniform(lo, hi)
+    ca = math.cos(theta)
+    sb = math.sin(theta)
+    coord = CartesianCoords(center.x + radius * (ca * a1 + sb * b1),
+                            center.y + radius * (ca * a2 + sb * b2),
+                            center.z + radius * (ca * a3 + sb * b3))
+    return (coord, (hi - lo) / (2 * math.pi))
+
+# Function to find the circle where the spheres of radius r1 around c1 and radius r2 around c2 intersect.
+# Returns the centre, radius and unit normal of the circle, or None if the spheres do not intersect.
+def sphereIntersectionCircle(c1, r1, c2, r2):
+    D = math.sqrt((c2.x - c1.x) ** 2 + (c2.y - c1.y) ** 2 + (c2.z - c1.z) ** 2)
+    if D == 0.0:
+        return None
+    if (D > r1 + r2 or D < abs(r1 - r2)) and not (math.isclose(D, r1 + r2) or math.isclose(D, abs(r1 - r2))):
+        return None
+    normal = UnitVector(c2.x - c1.x, c2.y - c1.y, c2.z - c1.z)
+    x = (D ** 2 + r1 ** 2 - r2 ** 2) / (2 * D)
+    radius = math.sqrt(max(0.0, r1 ** 2 - x ** 2))
+    center = CartesianCoords(c1.x + x * normal.x, c1.y + x * normal.y, c1.z + x * normal.z)
+    return (center, radius, normal)
+
+# Function to sample a point at distance r1 from c1 and at distance exactly r2 from c2.
+# Returns the point and its importance weight, or (None, 0.0) if there is no such point with z >= minZ.
+def sampleSphereIntersection(c1, r1, c2, r2, prng, minZ=0.0):
+    circle = sphereIntersectionCircle(c1, r1, c2, r2)
+    if circle is None:
+        return (None, 0.0)
+    (center, radius, normal) = circle
+    coord, fraction = sampleCirclePoint(center, radius, normal, prng, minZ=minZ)
+    D = math.sqrt((c2.x - c1.x) ** 2 + (c2.y - c1.y) ** 2 + (c2.z - c1.z) ** 2)
+    return (coord, fraction * r2 / (2 * r1 * D))
+
+# Function to sample a point at distance r1 from c1 and at distance at most r2 from c2.
+# Returns the point and its importance weight, or (None, 0.0) if there is no such point with z >= minZ.
+def sampleSphereWithinBall(c1, r1, c2, r2, prng, minZ=0.0):
+    D = math.sqrt((c2.x - c1.x) ** 2 + (c2.y - c1.y) ** 2 + (c2.z - c1.z) ** 2)
+    if D == 0.0:
+        return (None, 0.0)
+    r_min = abs(r1 - D)
+    r_max = min(r1 + D, r2)
+    if r_max < r_min:
+        return (None, 0.0)
+    prior = (r_max ** 2 - r_min ** 2) / (4 * r1 * D)
+    r = math.sqrt(prng.uniform(r_min ** 2, r_max ** 2)) # Distance from c2 has density proportional to r
+    circle = sphereIntersectionCircle(c1, r1, c2, r)
+    if circle is None:
+        return (None, 0.0)
+    (center, radius, normal) = circle
+    coord, fraction = sampleCirclePoint(center, radius, normal, prng, minZ=minZ)
+    return (coord, prior * fraction)
+
+########################################################################
+
+#
+# NOTES ON SAMPLING ABOVE THE SURFACE
+# ===================================
+#
+# Points must not be placed below the surface (z < 0), and the angle between two double-stranded
+# domains must not exceed NICKEDANGLE_UPPER_BOUND. Rather than resampling until both hold,
+# samplePointAbove draws the next point directly from the allowed set, as follows.
+#
+# Given the previous point p, the previous unit vector v and the sampled length L of the domain,
+# the next unit vector u must satisfy u_z >= m, where m = (minZ - p_z) / L.
+# If u deviates from v by angle \phi, then u lies on the rim of a cone (see the notes above),
+# and the highest point of that rim has z coordinate \cos(\phi - \alpha), where \alpha = \arccos(v_z).
+# So some direction on the cone is allowed iff |\phi - \alpha| <= \beta, where \beta = \arccos(m).
+# We therefore sample \phi from the angle distribution truncated to [\alpha - \beta, \alpha + \beta]
+# (and to the nick angle bound, if it applies), and then sample u uniformly on the arc of the rim
+# with u_z >= m, using sampleCirclePoint.
+# The importance weight of the point, relative to the untruncated distributions, is the probability
+# of the allowed range of \phi multiplied by the fraction of the rim that was allowed.
+#
+
+# Function to sample the next point from previousCoord directly, such that its z coordinate is at least minZ
+# and any nick angle constraint with the previous domain is satisfied (see the notes above).
+# Returns (coord, unitVec, lengthNm, sampledAngle, weight), or a tuple of Nones with weight 0.0
+# if there is no allowed point.
+def samplePointAbove(previousCoord, previousDomainInfo, currentDomain, distributions, prng, minZ=0.0):
+    if previousDomainInfo is None:
+        angleDist = distributions.tetherAngleDist
+        previousUnitVec = UnitVector(0,0,1) ## X=0, Y=0, Z=1
+        maxAngle = math.pi
+    else:
+        bothDS = previousDomainInfo['domain'].isDS and currentDomain.isDS
+        angleDist = distributions.dsdsDomainAngleDist if bothDS else distributions.ssDomainAngleDist
+        previousUnitVec = previousDomainInfo['unitVec']
+        maxAngle = math.radians(NICKEDANGLE_UPPER_BOUND) if (bothDS and NICKED_FLAG) else math.pi
+
+    lengthNm = sampleDomainLength(currentDomain, distributions, prng)
+    if lengthNm > 0:
+        minUnitZ = (minZ - previousCoord.z) / lengthNm
+    else:
+        minUnitZ = -1.0 if previousCoord.z >= minZ else math.inf
+    if minUnitZ > 1.0 and not math.isclose(minUnitZ, 1.0):
+        return (None, None, None, None, 0.0)
+    alpha = math.acos(max(-1.0, min(1.0, previousUnitVec.z)))
+    beta = math.acos(max(-1.0, min(1.0, minUnitZ)))
+    lo = max(0.0, alpha - beta)
+    hi = min(maxAngle, alpha + beta)
+    if hi < lo:
+        return (None, None, None, None, 0.0)
+
+    sampledAngle, angleWeight = angleDist.sampleTruncatedAngle(prng, lo, hi)
+    if angleWeight == 0.0:
+        return (None, None, None, None, 0.0)
+    center = CartesianCoords(previousUnitVec.x * math.cos(sampledAngle), previousUnitVec.y * math.cos(sampledAngle), previousUnitVec.z * math.cos(sampledAngle))
+    point, fraction = sampleCirclePoint(center, math.sin(sampledAngle), previousUnitVec, prng, minZ=minUnitZ)
+    if point is None:
+        return (None, None, None, None, 0.0)
+    unitVec = UnitVector(point.x, point.y, point.z)
+    coord = CartesianCoords(previousCoord.x + unitVec.x * lengthNm, previousCoord.y + unitVec.y * lengthNm, max(minZ, previousCoord.z + unitVec.z * lengthNm))
+    return (coord, unitVec, lengthNm, sampledAngle, angleWeight * fraction)
+
+########################################################################
+
 def sampleStructure(absLinStruct, distributions):
     domainUnitVecs = []
     domainLengthsNm = []
@@ -0,0 +1,49 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+#
+# Tests of the angle distributions. Run with pytest.
+
+import math
+import random
+import numpy as np
+import pytest
+from angle_distributions import *
+
+def test_missing_table_says_how_to_build_it(tmp_path):
+    with pytest.raises(FileNotFoundError, match='buildNickedAngleTable'):
+        NickedAngleDistribution(str(tmp_path / 'missing.npz'))
+
+# A table built from (made-up) measurements is saved, loaded, and only produces angles in the measured range.
+def test_built_table_round_trip(tmp_path):
+    data = tmp_path / 'angles.tsv'
+    rng = np.random.default_rng(0)
+    data.write_text('index\tnick\tdeletion\n' + ''.join(str(i) + '\t' + str(a) + '\t0\n' for (i, a) in enumerate(rng.normal(60.0, 10.0, 200))))
+    path = str(tmp_path / 'table.npz')
+    (x_grid, cdf) = buildNickedAngleTable(str(data), path)
+    assert (cdf[0], cdf[-1]) == (0.0, 1.0)
+    assert np.all(np.diff(cdf) >= 0.0)
+    dist = NickedAngleDistribution(path)
+    angles = np.degrees(dist.sampleAngles(random.Random(1), 1000))
+    assert np.all((angles >= x_grid[0]) & (angles <= x_grid[-1]))
+    assert np.median(angles) == pytest.approx(60.0, abs=3.0)
+    (phi, weight) = dist.sampleTruncatedAngle(random.Random(1), math.radians(50.0), math.radians(70.0))
+    assert math.radians(50.0) <= phi <= math.radians(70.0)
+    assert weight == pytest.approx(float(dist.cdfAt(70.0) - dist.cdfAt(50.0)))
@@ -0,0 +1,68 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+#
+# Tests of ConformationStore. Run with pytest.
+
+import pickle
+import numpy as np
+from test_constraintchecker_sampling import boundTile
+from constraintchecker_sampling import ConstraintChecker_Sampling
+from conformationstore import ConformationStore, speciesKey
+
+def test_round_trip(tmp_path):
+    store = ConformationStore(str(tmp_path / 'conformations'))
+    (sp, other) = (boundTile(10), boundTile(10, offset=5))
+    first = [np.arange(12, dtype=float).reshape(4, 3)]
+    store.put(sp, sp.tiles_sg, first)
+    store.put(sp, sp.tiles_sg, [np.zeros((4, 3))]) # Already stored, so ignored
+    store.put(other, other.tiles_sg, [np.ones((4, 3))])
+    assert len(store) == 2
+    assert store.speciesKeys() == [speciesKey(sp), speciesKey(other)]
+    assert store.coordinates().shape == (8, 3)
+    (coords,) = store.get(sp)
+    assert coords.dtype == np.float32
+    assert np.array_equal(coords, first[0])
+    assert np.array_equal(store.get(speciesKey(other))[0], np.ones((4, 3)))
+    assert store.get(boundTile(20)) is None
+    assert [c.tolist() for c in store.componentConformations(other.tiles_sg[0])] == [np.ones((4, 3)).tolist()]
+    # A pickled store (e.g. sent to a worker process) reconnects to the same files.
+    copy = pickle.loads(pickle.dumps(store))
+    assert np.array_equal(copy.get(sp)[0], first[0])
+    copy.close()
+    store.close()
+
+# The checker stores the satisfying conformation of each plausible species, with its tethers where they should be.
+def test_checker_stores_satisfying_conformations(tmp_path):
+    path = str(tmp_path / 'conformations')
+    cc = ConstraintChecker_Sampling(seed=1, conformationStore=path)
+    for d in (10, 20, 12):
+        cc.isPlausible(boundTile(d))
+    cc.close()
+    store = ConformationStore(path)
+    assert len(store) == 2
+    assert store.get(boundTile(20)) is None
+    for d in (10, 12):
+        sp = boundTile(d)
+        (coords,) = store.get(sp)
+        rg = cc.getRegionGraph(sp.tiles_sg[0])
+        assert coords.shape == (rg.numVertices(), 3)
+        assert sorted(tuple(coords[i].tolist()) for (i, tether) in rg.getTetherIds()) == [(0.0, 0.0, 0.0), (float(d), 0.0, 0.0)]
+    store.close()
@@ -0,0 +1,106 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+#
+# Tests of ConstraintChecker_Analytic. Run with pytest.
+#
+
+import math
+import numpy as np
+import sgparser
+from constants import *
+from strandgraph import speciesFromProcess
+from constraintchecker_analytic import ConstraintChecker_Analytic, analyticVerdict, sphereDirectionCapacity, planeDirectionCapacity
+
+DOMAIN_LENGTHS = 'longDomain spcr length 5 longDomain x length 30'
+
+# The part of a region graph that analyticVerdict looks at, for graphs given by their edges (as (v1, v2, ds) triples)
+# and the ids of their tethered vertexes.
+class EdgeListGraph:
+
+    def __init__(self, n, edges, tethers=()):
+        self.n = n
+        self.edge_v1 = np.array([v1 for (v1, v2, ds) in edges], dtype=int)
+        self.edge_v2 = np.array([v2 for (v1, v2, ds) in edges], dtype=int)
+        self.edge_ds = np.array([ds for (v1, v2, ds) in edges], dtype=bool)
+        self.tethers = [(i, (float(i), 0.0)) for i in tethers]
+
+    def numVertices(self):
+        return self.n
+
+    def getTetherIds(self):
+        return self.tethers
+
+# A star of k double-stranded regions around vertex 0.
+def star(k, tethers=()):
+    return EdgeListGraph(k + 1, [(0, i, True) for i in range(1, k + 1)], tethers)
+
+def test_tammes_capacity():
+    assert sphereDirectionCapacity(180.0) == 2
+    assert sphereDirectionCapacity(120.0) == 3
+    assert sphereDirectionCapacity(90.0) == 6
+    assert sphereDirectionCapacity(75.0) == 7
+    assert sphereDirectionCapacity(10.0) is None # Beyond the table
+
+def test_plane_capacity():
+    assert planeDirectionCapacity(120.0) == 3
+    assert planeDirectionCapacity(90.0) == 4
+    assert planeDirectionCapacity(75.0) == 4
+    assert planeDirectionCapacity(0.0) == math.inf
+
+def test_untethered_star():
+    alpha = 180.0 - NICKEDANGLE_UPPER_BOUND
+    capacity = sphereDirectionCapacity(alpha)
+    assert analyticVerdict(star(capacity))[0] is True
+    assert analyticVerdict(star(capacity + 1))[0] is False
+
+def test_tethered_star():
+    alpha = 180.0 - NICKEDANGLE_UPPER_BOUND
+    plane = planeDirectionCapacity(alpha)
+    sphere = sphereDirectionCapacity(alpha)
+    assert analyticVerdict(star(plane, tethers=[1]))[0] is True
+    if plane < sphere:
+        assert analyticVerdict(star(plane + 1, tethers=[1]))[0] is None
+    assert analyticVerdict(star(sphere + 1, tethers=[1]))[0] is False
+
+def test_double_stranded_self_loop():
+    assert analyticVerdict(EdgeListGraph(2, [(0, 1, True), (1, 1, True)])) == (False, 'double-stranded self-loop')
+    assert analyticVerdict(EdgeListGraph(2, [(0, 1, True), (1, 1, False)]))[0] is True
+
+def test_undecided_graphs():
+    assert analyticVerdict(EdgeListGraph(3, [(0, 1, True), (1, 2, True), (2, 0, False)])) == (None, 'cyclic')
+    assert analyticVerdict(EdgeListGraph(2, [(0, 1, True)], tethers=[0, 1])) == (None, 'multiple tethers')
+
+def test_species_decided_without_delegate():
+    sp = speciesFromProcess(sgparser.parse('( <spcr x!i1> | <x*!i1> )'), DOMAIN_LENGTHS)[0]
+    cc = ConstraintChecker_Analytic(seed=1)
+    (flag, info) = cc.isPlausible(sp)
+    assert flag
+    assert info[0][1]['analytic_verdict'] is True
+    assert cc.analyticDecisions == 1
+
+def test_species_passed_to_delegate():
+    s = '( [[ <tether(0,0) spcr x!i1> | <tether(10,0) spcr x*!i1> ]] )'
+    sp = speciesFromProcess(sgparser.parse(s), DOMAIN_LENGTHS)[0]
+    cc = ConstraintChecker_Analytic(seed=1)
+    (flag, info) = cc.isPlausible(sp)
+    assert flag
+    assert 'analytic_verdict' not in info[0][1]
+    assert cc.analyticDecisions == 0
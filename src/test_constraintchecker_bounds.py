@@ -0,0 +1,60 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+#
+# Tests of ConstraintChecker_Bounds. Run with pytest.
+#
+
+import sgparser
+from strandgraph import speciesFromProcess
+from constraintchecker_bounds import ConstraintChecker_Bounds, distanceBoundsConflict
+
+DOMAIN_LENGTHS = 'longDomain spcr length 5 longDomain x length 30'
+
+# A tile species whose two strands are tethered the given distance apart and bound by their x domains.
+# The two spacers and the duplex reach about 3.4 + 10.2 + 3.4 = 17 nm between the tethers.
+def boundTile(distance):
+    s = '( [[ <tether(0,0) spcr x!i1> | <tether(' + str(distance) + ',0) spcr x*!i1> ]] )'
+    return speciesFromProcess(sgparser.parse(s), DOMAIN_LENGTHS)[0]
+
+def test_conflict_when_tethers_are_out_of_reach():
+    cc = ConstraintChecker_Bounds(seed=1)
+    conflict = distanceBoundsConflict(cc.getRegionGraph(boundTile(40).tiles_sg[0]))
+    assert conflict is not None
+    (i, j, lower, upper) = conflict
+    assert lower > upper
+
+def test_no_conflict_when_tethers_are_within_reach():
+    cc = ConstraintChecker_Bounds(seed=1)
+    assert distanceBoundsConflict(cc.getRegionGraph(boundTile(10).tiles_sg[0])) is None
+
+def test_rejects_without_delegate():
+    cc = ConstraintChecker_Bounds(seed=1)
+    (flag, info) = cc.isPlausible(boundTile(20))
+    assert not flag
+    assert 'bounds_conflict' in info[0][1]
+    assert cc.boundsRejections == 1
+
+def test_passes_feasible_species_to_delegate():
+    cc = ConstraintChecker_Bounds(seed=1)
+    (flag, info) = cc.isPlausible(boundTile(10))
+    assert flag
+    assert 'sampling_unsuccessful_trials' in info[0][1]
+    assert cc.boundsRejections == 0
@@ -0,0 +1,59 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+#
+# Tests of ConstraintChecker_MCMC. Run with pytest.
+
+import pytest
+from test_constraintchecker_sampling import boundTile
+from constraintchecker_mcmc import ConstraintChecker_MCMC
+
+# A product whose tethers are moved slightly from those of its reactant is satisfied by MCMC from the reactant's conformation.
+def test_warm_start_from_reactant():
+    cc = ConstraintChecker_MCMC(seed=3)
+    reactant = boundTile(10)
+    assert cc.isPlausible(reactant)[0]
+    cc.setReactants([reactant])
+    (flag, info) = cc.isPlausible(boundTile(14))
+    assert flag
+    assert cc.warmStarts == 1
+    assert info[0][1]['sampling_mcmc_steps'] > 0
+    assert info[0][1]['sampling_unsuccessful_trials'] == 0
+
+# Without reactants there is nothing to start from, so the component is sampled from scratch.
+def test_no_warm_start_without_reactants():
+    cc = ConstraintChecker_MCMC(seed=3)
+    (flag, info) = cc.isPlausible(boundTile(14))
+    assert flag
+    assert cc.warmStarts == 0
+    assert 'sampling_mcmc_steps' not in info[0][1]
+
+# A warm start can't make an implausible product plausible.
+def test_warm_start_rejects_implausible_product():
+    cc = ConstraintChecker_MCMC(seed=3, samplingTrials=20)
+    reactant = boundTile(10)
+    cc.isPlausible(reactant)
+    cc.setReactants([reactant])
+    assert not cc.isPlausible(boundTile(80))[0]
+    assert cc.warmStarts == 0
+
+def test_requires_verdict_reuse():
+    with pytest.raises(ValueError):
+        ConstraintChecker_MCMC(reuseVerdicts=False)
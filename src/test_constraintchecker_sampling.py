@@ -0,0 +1,100 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+#
+# Tests of ConstraintChecker_Sampling. Run with pytest.
+#
+
+import sgparser
+from strandgraph import speciesFromProcess
+from constraintchecker_sampling import ConstraintChecker_Sampling
+
+DOMAIN_LENGTHS = 'longDomain spcr length 5 longDomain x length 30'
+
+# A tile species whose two strands are tethered the given distance apart (from x = offset) and bound by their x domains.
+def boundTile(distance, offset=0):
+    s = '( [[ <tether(' + str(offset) + ',0) spcr x!i1> | <tether(' + str(offset + distance) + ',0) spcr x*!i1> ]] )'
+    return speciesFromProcess(sgparser.parse(s), DOMAIN_LENGTHS)[0]
+
+# Without loop closure, the first pass of 10 trials misses this plausible component, by 0.6 of the closest region length.
+def test_adaptive_stops_after_first_pass_without_near_miss():
+    cc = ConstraintChecker_Sampling(seed=1, loopClosure=False, adaptive=True, initialTrials=10, nearMissTolerance=0.1)
+    (flag, info) = cc.isPlausible(boundTile(10))
+    sampling_info = info[0][1]
+    assert not flag
+    assert sampling_info['sampling_unsuccessful_trials'] == 10
+    assert sampling_info['sampling_early_stopped']
+    assert 0.1 < sampling_info['sampling_closest_miss'] < 1.0
+
+def test_adaptive_escalates_on_near_miss():
+    cc = ConstraintChecker_Sampling(seed=1, loopClosure=False, adaptive=True, initialTrials=10, nearMissTolerance=1.0)
+    (flag, info) = cc.isPlausible(boundTile(10))
+    assert flag
+    assert info[0][1]['sampling_unsuccessful_trials'] > 10
+
+# With loop closure, the tethers are too far apart for the closing region to be placed at all.
+def test_adaptive_never_escalates_on_placement_failures():
+    cc = ConstraintChecker_Sampling(seed=1, adaptive=True, initialTrials=10, nearMissTolerance=1e9)
+    (flag, info) = cc.isPlausible(boundTile(20))
+    sampling_info = info[0][1]
+    assert not flag
+    assert sampling_info['sampling_unsuccessful_trials'] == 10
+    assert set(kind.split(':')[0] for kind in sampling_info['sampling_rejections']) == {'closure'}
+
+def test_geometry_reuse_is_opt_in():
+    cc = ConstraintChecker_Sampling(seed=1)
+    cc.isPlausible(boundTile(10))
+    (flag, info) = cc.isPlausible(boundTile(10, offset=5))
+    assert 'sampling_reused' not in info[0][1]
+    cc = ConstraintChecker_Sampling(seed=1, reuseGeometry=True)
+    cc.isPlausible(boundTile(10))
+    (flag, info) = cc.isPlausible(boundTile(10, offset=5))
+    assert info[0][1]['sampling_reused'] == 'geometry'
+    assert cc.verdictParameters(boundTile(10)) != ConstraintChecker_Sampling(seed=1).verdictParameters(boundTile(10))
+
+# Splitting the trials across worker processes gives the same verdicts on clear-cut components, and the same number of trials on rejected ones.
+def test_workers_agree_with_serial_verdicts():
+    verdicts = {}
+    for workers in (1, 2):
+        cc = ConstraintChecker_Sampling(seed=1, workers=workers, samplingTrials=20)
+        try:
+            verdicts[workers] = [cc.isPlausible(boundTile(d)) for d in (10, 20, 40)]
+        finally:
+            cc.close()
+    for workers in (1, 2):
+        assert [flag for (flag, info) in verdicts[workers]] == [True, False, False]
+        for (flag, info) in verdicts[workers][1:]:
+            assert info[0][1]['sampling_unsuccessful_trials'] == 20
+
+# With independent streams, the verdict for each species (down to the number of trials it took) does not depend on the order
+# in which the species are checked, even with a budget small enough that some plausible species are rejected.
+def test_verdicts_independent_of_check_order():
+    species = [boundTile(d, offset) for d in (8, 10, 12, 14, 16, 20) for offset in (0, 5)]
+    orders = [list(range(len(species))), list(reversed(range(len(species)))), [3, 7, 0, 11, 5, 1, 9, 2, 10, 4, 8, 6]]
+    verdicts = []
+    for order in orders:
+        cc = ConstraintChecker_Sampling(seed=1, samplingTrials=5)
+        checked = {}
+        for i in order:
+            (flag, info) = cc.isPlausible(species[i])
+            checked[i] = (flag, info[0][1]['sampling_unsuccessful_trials'])
+        verdicts.append([checked[i] for i in range(len(species))])
+    assert verdicts[0] == verdicts[1] == verdicts[2]
+    assert len(set(flag for (flag, trials) in verdicts[0])) == 2
@@ -0,0 +1,73 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+#
+# Tests of the excluded volume checks. Run with pytest.
+
+import numpy as np
+import sgparser
+from strandgraph import speciesFromProcess
+from regiongraph import regionGraphFromStrandGraph
+from samplingplan import samplingPlansForRegionGraph
+from excludedvolume import *
+
+# A tile with two duplexes of different lengths, joined by single-stranded spacers.
+def mixedTileRegionGraph():
+    s = '( [[ <tether(0,0) spcr x!i1 spcr y!i2> | <tether(10,0) spcr x*!i1> | <tether(20,0) spcr y*!i2> ]] )'
+    sp = speciesFromProcess(sgparser.parse(s), 'longDomain spcr length 5 longDomain x length 30 longDomain y length 20')[0]
+    return regionGraphFromStrandGraph(sp.tiles_sg[0])
+
+# The cell list finds exactly the pairs whose midpoints are close enough to overlap, with a mix of very short and long segments.
+def test_candidate_pairs_with_mixed_lengths():
+    rng = np.random.default_rng(0)
+    for t in range(100):
+        count = int(rng.integers(2, 40))
+        n = int(rng.integers(1, count + 1))
+        starts = rng.uniform(0, 30, (count, 3))
+        directions = rng.normal(size=(count, 3))
+        lengths = rng.choice([0.5, 2.0, 15.0], count)
+        ends = starts + directions / np.linalg.norm(directions, axis=1)[:, None] * lengths[:, None]
+        radii = rng.choice([0.5, 1.0], count)
+        (i, j) = candidatePairs(starts, ends, radii, n)
+        midpoints = (starts + ends) / 2
+        expected = set((a, b) for a in range(n) for b in range(a + 1, count)
+                       if np.linalg.norm(midpoints[a] - midpoints[b]) <= (lengths[a] + lengths[b]) / 2 + radii[a] + radii[b])
+        assert set(zip(i.tolist(), j.tolist())) == expected
+
+# Checking the regions as they are completed finds the same worst overlap as checking the whole conformation.
+def test_schedule_matches_whole_conformation_check():
+    rg = mixedTileRegionGraph()
+    plan = samplingPlansForRegionGraph(rg)[0]
+    (dsRadius, ssRadius) = (1.0, 0.5)
+    schedule = excludedVolumeSchedule(rg, plan, dsRadius, ssRadius)
+    assert len(schedule) == len(plan.steps) + 1
+    (edges, radii, exempt, positions) = excludedVolumeSegments(rg, dsRadius, ssRadius)
+    scheduled = [tuple(p) for checks in schedule if checks is not None for p in checks[0][:4].T.tolist()]
+    assert len(scheduled) == len(set(scheduled)) == int(np.sum(~exempt)) // 2
+    rng = np.random.default_rng(1)
+    obstacles = (rng.uniform(0, 10, (3, 3)), rng.uniform(0, 10, (3, 3)), np.full(3, 1.0))
+    overlapping = 0
+    for t in range(200):
+        coords = rng.uniform(0, 10, (rg.numVertices(), 3))
+        for obs in (None, obstacles):
+            whole = excludedVolumeViolation(rg, coords, dsRadius, ssRadius, obs)
+            assert math.isclose(max(placedExcludedVolumeViolation(coords, checks, obs) for checks in schedule), whole)
+            overlapping += whole > 0.0
+    assert overlapping > 0
@@ -0,0 +1,75 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+#
+# Tests of the local concentration estimates. Run with pytest.
+
+import math
+import numpy as np
+import pytest
+import sgparser
+from strandgraph import speciesFromProcess, Site
+from constraintchecker_sampling import ConstraintChecker_Sampling
+from localconcentration import *
+from constants import *
+
+# With equal weights, three of four conformations bring the sites together: p = 3/4 and n = 4, so the smoothed
+# fraction is (4 * 3/4 + 1/2) / 5 = 0.7.
+def test_capture_fraction_of_one_ensemble():
+    positions1 = np.zeros((4, 1, 3))
+    positions2 = np.array([[[1.0, 0, 0]], [[0, 1.5, 0]], [[0, 0, 1.9]], [[3.0, 0, 0]]])
+    fractions = captureFractions(positions1, np.ones(4), positions2, np.ones(4), 2.0, False)
+    assert fractions == pytest.approx([0.7])
+
+# For independent components, every pair of conformations counts: with weights (1, 3) and (1, 1), the sites meet
+# only in the pairs with the second conformation of the first component, so p = 3/4, and n = min(1.6, 2) = 1.6.
+def test_capture_fraction_of_independent_ensembles():
+    positions1 = np.array([[[10.0, 0, 0]], [[0, 0, 0]]])
+    positions2 = np.array([[[0, 0, 1.0]], [[0, 1.0, 0]]])
+    fractions = captureFractions(positions1, np.array([1.0, 3.0]), positions2, np.ones(2), 2.0, True)
+    assert fractions == pytest.approx([(1.6 * 0.75 + 0.5) / 2.6])
+
+def test_capture_fraction_needs_conformations():
+    with pytest.raises(ValueError):
+        captureFractions(np.zeros((0, 1, 3)), np.zeros(0), np.zeros((2, 1, 3)), np.ones(2), 2.0, True)
+
+# A fraction of one is one molecule in the capture sphere.
+def test_local_concentration_units():
+    molar = 1.0 / (4.0 / 3.0 * math.pi * CAPTURE_RADIUS ** 3) * 1e24 / 6.02214076e23
+    assert localConcentrationsFromFractions(np.array([1.0]))[0] == pytest.approx(molar / RATE_CONCENTRATION_UNIT)
+
+# Every conformation of a free single strand is accepted, and only the directions above the surface can be sampled
+# for its one region, so the weighted acceptance is exactly 1/2. The midpoints of its two domains, a quarter of the way
+# along the region from each end, are half as far apart as its ends, which is at most the length of one domain.
+def test_estimate_for_unconstrained_strand():
+    sp = speciesFromProcess(sgparser.parse('( <a b> )'), 'longDomain a length 5 longDomain b length 5')[0]
+    cc = ConstraintChecker_Sampling(seed=1, estimationSamples=50)
+    (flag, info) = cc.isPlausible(sp)
+    assert flag
+    assert info[0][1]['sampling_acceptance'] == 1.0
+    assert info[0][1]['sampling_weighted_acceptance'] == pytest.approx(0.5)
+    (rg, coordinates, weights) = cc.componentEnsemble(sp.sg)
+    assert coordinates.shape == (50, 2, 3)
+    positions1 = sitePositions(sp.sg, rg, coordinates, [Site(0, 0, 2)])
+    positions2 = sitePositions(sp.sg, rg, coordinates, [Site(0, 1, 2)])
+    ends = np.linalg.norm(coordinates[:, 0] - coordinates[:, 1], axis=1)
+    assert np.linalg.norm(positions1 - positions2, axis=2)[:, 0] == pytest.approx(ends / 2)
+    fractions = captureFractions(positions1, weights, positions2, weights, 5 * SS_LENGTH, False)
+    assert fractions == pytest.approx([50.5 / 51])
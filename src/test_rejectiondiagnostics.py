@@ -0,0 +1,62 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+#
+# Tests of the rejection diagnostics. Run with pytest.
+
+import math
+from test_constraintchecker_sampling import boundTile
+from constraintchecker_sampling import ConstraintChecker_Sampling
+from rejectiondiagnostics import *
+
+def test_violation_summary():
+    summary = violationSummary([0.005, 0.03, 0.03, 0.7, math.inf])
+    assert summary == {'histogram': [1, 0, 2, 0, 0, 0, 1, 0, 0, 0, 1], 'min': 0.005, 'max': 0.7}
+    merged = mergeViolationSummaries(summary, violationSummary([math.inf]))
+    assert merged == {'histogram': [1, 0, 2, 0, 0, 0, 1, 0, 0, 0, 2], 'min': 0.005, 'max': 0.7}
+
+def test_report_counts():
+    sampled = {'sampling_unsuccessful_trials': 3, 'sampling_trial_budget': 10, 'sampling_importance_weight': 1.0,
+               'sampling_rejections': {'ss_reach:1': 2, 'ds_length:2': 1},
+               'sampling_violations': {'ss_reach:1': violationSummary([0.1, 0.3]), 'ds_length:2': violationSummary([0.05])}}
+    failed = {'sampling_unsuccessful_trials': 10, 'sampling_trial_budget': 10,
+              'sampling_rejections': {'ss_reach:1': 4, 'ss_reach:3': 1, 'closure:2': 5},
+              'sampling_violations': {'ss_reach:1': violationSummary([0.01] * 4), 'ss_reach:3': violationSummary([2.0]),
+                                      'closure:2': violationSummary([math.inf] * 5)}}
+    estimated = {'sampling_unsuccessful_trials': 6, 'sampling_trial_budget': 8, 'sampling_acceptance': 0.25,
+                 'sampling_rejections': {'surface': 6}, 'sampling_violations': {'surface': violationSummary([math.inf] * 6)}}
+    reused = dict(sampled, sampling_reused='fingerprint')
+    analytic = {'sampling_unsuccessful_trials': 0, 'analytic_verdict': True}
+    report = rejectionReport([sampled, failed, estimated, reused, analytic, {'other_checker': 1}, None])
+    assert (report['components_sampled'], report['components_reused'], report['components_analytic'], report['components_implausible']) == (3, 1, 1, 1)
+    assert (report['trials'], report['rejected_trials']) == (4 + 10 + 8, 3 + 10 + 6)
+    assert {name: (kind['trials'], kind['components']) for (name, kind) in report['kinds'].items()} == \
+        {'ss_reach': (7, 2), 'ds_length': (1, 1), 'closure': (5, 1), 'surface': (6, 1)}
+    ss_reach = report['kinds']['ss_reach']['violations']
+    assert (ss_reach['min'], ss_reach['max'], sum(ss_reach['histogram'])) == (0.01, 2.0, 7)
+
+# The report on the verdicts of a real checker adds up: the rejected trials of a rejected tile are all loop closure failures.
+def test_report_on_checked_species():
+    cc = ConstraintChecker_Sampling(seed=1, samplingTrials=20)
+    infos = [info for d in (10, 20, 20) for (sp, info) in cc.isPlausible(boundTile(d))[1]]
+    report = rejectionReport(infos)
+    assert (report['components_sampled'], report['components_reused'], report['components_implausible']) == (2, 1, 1)
+    assert report['kinds']['closure']['trials'] == report['kinds']['closure']['components'] * 20 == 20
+    assert report['rejected_trials'] == sum(kind['trials'] for kind in report['kinds'].values())
@@ -0,0 +1,58 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+#
+# Tests of VerdictStore. Run with pytest.
+
+import json
+from test_constraintchecker_sampling import boundTile
+from constraintchecker_sampling import ConstraintChecker_Sampling
+from verdictstore import VerdictStore, speciesVerdictKey
+
+def test_round_trip(tmp_path):
+    store = VerdictStore(str(tmp_path / 'verdicts.db'))
+    sp = boundTile(10)
+    cc = ConstraintChecker_Sampling(seed=1)
+    (flag, info) = store.isPlausible(cc, sp)
+    assert (store.hits, store.misses, len(store)) == (0, 1, 1)
+    # A fresh checker with the same parameters is served the stored verdict, with the same sampling_info
+    # (as JSON, so tuples come back as lists).
+    (stored_flag, stored_info) = store.isPlausible(ConstraintChecker_Sampling(seed=1), sp)
+    assert (store.hits, store.misses) == (1, 1)
+    assert stored_flag == flag
+    assert [x for (x, i) in stored_info] == [sp]
+    assert stored_info[0][1] == json.loads(json.dumps(info[0][1]))
+    # Changing any parameter of the checker misses.
+    for kwargs in ({'seed': 2}, {'samplingTrials': 7}, {'reuseVerdicts': False}, {'loopClosure': False}):
+        assert speciesVerdictKey(sp, ConstraintChecker_Sampling(**dict({'seed': 1}, **kwargs))) != speciesVerdictKey(sp, cc)
+    store.isPlausible(ConstraintChecker_Sampling(seed=2), sp)
+    assert (store.hits, store.misses, len(store)) == (1, 2, 2)
+    store.close()
+
+# Verdicts that depend on what was checked before are not stored.
+def test_order_dependent_verdicts_bypass_store(tmp_path):
+    store = VerdictStore(str(tmp_path / 'verdicts.db'))
+    for cc in (ConstraintChecker_Sampling(), ConstraintChecker_Sampling(seed=1, independentStreams=False),
+               ConstraintChecker_Sampling(seed=1, reuseGeometry=True)):
+        assert not cc.reproducibleVerdicts()
+        store.isPlausible(cc, boundTile(10))
+    assert (store.hits, store.misses, len(store)) == (0, 0, 0)
+    assert ConstraintChecker_Sampling(seed=1, reuseVerdicts=False, reuseGeometry=True).reproducibleVerdicts()
+    store.close()
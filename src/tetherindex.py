@@ -0,0 +1,91 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+import math
+from constants import *
+
+#
+# Spatial index over the tethers of a tile species.
+#
+# Strands are tethered to points on the surface of the tile, and two components of a tile species
+# can only interact if their strands can reach each other. Every point of a connected component is
+# within the total contour length of its strands of each of its tethers (see componentReach), so
+# two components whose tethers are further apart than the sum of their reaches cannot interact.
+#
+# On a track with many tether sites, looking for the components near a given one by scanning every
+# tether is slow, so the tethers are binned into a uniform grid of square cells in the plane of the
+# surface, and range queries only look at the cells that overlap the query disc.
+#
+
+class TetherIndex:
+
+    # The tethers are given as a list of (item, (x, y)) pairs, where item identifies the component
+    # (or whatever else) that the tether belongs to.
+    def __init__(self, tethers, cellSize=TETHER_INDEX_CELL_SIZE):
+        assert cellSize > 0
+        self.cellSize = cellSize
+        self.cells = {} # Maps the (column, row) of each cell to the list of (item, (x, y)) pairs in it
+        self.size = 0
+        for (item, (x, y)) in tethers:
+            self.cells.setdefault(self.cellOf(x, y), []).append((item, (x, y)))
+            self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def cellOf(self, x, y):
+        return (math.floor(x / self.cellSize), math.floor(y / self.cellSize))
+
+    # All of the (item, (x, y)) pairs whose tethers are within distance r of (x, y).
+    def tethersWithin(self, x, y, r):
+        (i0, j0) = self.cellOf(x - r, y - r)
+        (i1, j1) = self.cellOf(x + r, y + r)
+        found = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                for (item, (tx, ty)) in self.cells.get((i, j), ()):
+                    if math.hypot(tx - x, ty - y) <= r:
+                        found.append((item, (tx, ty)))
+        return found
+
+    # The set of items with a tether within distance r of (x, y).
+    def itemsWithin(self, x, y, r):
+        return set(item for (item, coord) in self.tethersWithin(x, y, r))
+
+# The (x, y) coordinates of the tethers of the strands of a connected strand graph.
+def componentTethers(sg):
+    tethers = []
+    for c in sg.vertex_colors:
+        tether = sg.colors_info[c]['tether']
+        if (tether[0] is not None and tether[1] is not None):
+            tethers.append((tether[1][0], tether[1][1]))
+    return tethers
+
+# Upper bound on the distance from any tether of a connected strand graph to any point of it, namely the total
+# length of its strands with every nucleotide at its longest (single-stranded) extension. Returns math.inf if
+# the length of some domain is not known.
+def componentReach(sg):
+    nucleotides = 0
+    for c in sg.vertex_colors:
+        for d in sg.colors_info[c]['strand_type'].domains:
+            if sg.domainLength is None or str(d.name) not in sg.domainLength:
+                return math.inf
+            nucleotides += sg.domainLength[str(d.name)][1]
+    return nucleotides * max(DS_LENGTH, SS_LENGTH)
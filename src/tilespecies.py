@@ -21,7 +21,9 @@
 from speciesabstract import Species_Abstract
 from strandgraph import *
 from process import *
+from tetherindex import *
 import lib
+import math
 import os
 
 
@@ -52,6 +54,8 @@ class TileSpecies(Species_Abstract):
                 errMsg = 'Tried to create a TileSpecies object from the following connected strand graph that has no tethers:'+os.linesep+str(self)
                 lib.error(errMsg)                
         self.tiles_sg.sort()
+        self.__tether_index__ = None # Cache for tetherIndex
+        self.__component_reaches__ = None # Cache for componentReaches
 
     def __metric__(self):
         metric_sg = []
@@ -111,10 +115,42 @@ class TileSpecies(Species_Abstract):
 
     def removeSpeciesFromTileSpeciesList(self, sp):
         self.tiles_sg.remove(sp)
+        self.__tether_index__ = None
+        self.__component_reaches__ = None
 
     def addSpeciesInTileSpeciesList(self, sg):
         assert sg.isConnected()
         self.tiles_sg.append(sg)
+        self.__tether_index__ = None
+        self.__component_reaches__ = None
+
+    # Spatial index over the tethers of all of the components (see tetherindex.py),
+    # whose items are the indexes of the components in tiles_sg. This is cached.
+    def tetherIndex(self):
+        if self.__tether_index__ is None:
+            self.__tether_index__ = TetherIndex([(i, t) for (i, sg) in enumerate(self.tiles_sg) for t in componentTethers(sg)])
+        return self.__tether_index__
+
+    # The reach of each component in tiles_sg (see tetherindex.componentReach). This is cached.
+    def componentReaches(self):
+        if self.__component_reaches__ is None:
+            self.__component_reaches__ = [componentReach(sg) for sg in self.tiles_sg]
+        return self.__component_reaches__
+
+    # The indexes of the other components in tiles_sg that are close enough to interact with the component
+    # with index i, i.e. that have a tether within the sum of the reaches of the two components (plus the
+    # given margin) of a tether of component i. The result is sorted.
+    def componentsWithinReach(self, i, margin=0.0):
+        reaches = self.componentReaches()
+        if math.isinf(max(reaches)):
+            return [j for j in range(len(self.tiles_sg)) if j != i]
+        index = self.tetherIndex()
+        found = set()
+        for (x, y) in componentTethers(self.tiles_sg[i]):
+            for (j, (tx, ty)) in index.tethersWithin(x, y, reaches[i] + max(reaches) + margin):
+                if j != i and math.hypot(tx - x, ty - y) <= reaches[i] + reaches[j] + margin:
+                    found.add(j)
+        return sorted(found)
 
     def displayRepresentation(self):
         for sg in self.tiles_sg:
@@ -0,0 +1,113 @@
+
+##########################################################################################
+# 
+# Copyright (C) 2024 Matthew Lakin, Sarika Kumar
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# 
+##########################################################################################
+
+import hashlib
+import json
+import sqlite3
+import constants
+from constants import *
+from regiongraphcache import speciesFingerprint
+
+#
+# Persistent store of plausibility verdicts, shared between runs and between processes.
+#
+# A verdict depends only on the species, the constants in constants.py, and the configuration of the
+# constraint checker (its distributions, seed, trial budget and so on; see verdictParameters). So verdicts
+# are keyed by a hash of all three, and a re-run with the same settings can skip checking any species
+# that was checked before. Changing any constant or checker setting changes every key, so stale verdicts
+# are never used.
+#
+# The store is an SQLite database in write-ahead logging mode, which allows any number of processes
+# to read and write the same store at once. Each process has its own connection (including after
+# the store is pickled and sent to another process), and a writer waits up to timeout seconds for
+# another writer to finish. If two processes check the same species, the first verdict stored is kept.
+#
+# The sampling_info of each verdict is stored as JSON (so tuples come back as lists), rather than pickled,
+# so that reading a store that someone else can write to cannot run their code. Checkers whose verdicts are
+# not reproducible (e.g. a sampling checker without a seed, see reproducibleVerdicts) bypass the store,
+# since their verdicts would otherwise be served later as if they were deterministic.
+#
+
+# The constants (from constants.py) that verdicts may depend on, as a sorted tuple of (name, value) pairs.
+def constantsFingerprint():
+    return tuple(sorted((k, v) for (k, v) in vars(constants).items() if k.isupper() and isinstance(v, (bool, int, float, str))))
+
+# The key for the verdict of the constraint checker cc on the species sp: a hash of the fingerprint of
+# sp (see speciesFingerprint), the checker's verdict parameters and the constants.
+def speciesVerdictKey(sp, cc):
+    description = speciesFingerprint(sp) + (cc.verdictParameters(sp), constantsFingerprint())
+    return hashlib.sha256(repr(description).encode('utf-8')).hexdigest()
+
+class VerdictStore:
+
+    def __init__(self, path, timeout=VERDICT_STORE_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.__connect__()
+
+    def __connect__(self):
+        self.connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, flag INTEGER NOT NULL, info TEXT NOT NULL)')
+
+    # Connections cannot be shared between processes, so a pickled store reconnects when it is unpickled.
+    def __getstate__(self):
+        return {'path': self.path, 'timeout': self.timeout, 'hits': self.hits, 'misses': self.misses}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__connect__()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    # Look up a verdict. Returns a pair (flag, info_list), where info_list is the list of sampling_info
+    # dicts that the checker returned for the components, or None if there is no verdict for the key.
+    def get(self, key):
+        row = self.connection.execute('SELECT flag, info FROM verdicts WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return (bool(row[0]), json.loads(row[1]))
+
+    # Store a verdict, unless there already is one for the key.
+    def put(self, key, flag, info_list):
+        self.connection.execute('INSERT OR IGNORE INTO verdicts (key, flag, info) VALUES (?, ?, ?)', (key, int(flag), json.dumps(info_list)))
+
+    # Check the species sp with the constraint checker cc, using the stored verdict if there is one and
+    # storing the verdict otherwise. Returns (flag, sampling_info) as cc.isPlausible does.
+    def isPlausible(self, cc, sp):
+        if not cc.reproducibleVerdicts():
+            return cc.isPlausible(sp)
+        key = speciesVerdictKey(sp, cc)
+        stored = self.get(key)
+        if stored is not None:
+            (flag, info_list) = stored
+            cc.storedVerdict(sp, flag, info_list)
+            return (flag, [(sp, info) for info in info_list])
+        flag, sampling_info = cc.isPlausible(sp)
+        self.put(key, flag, [info for (x, info) in sampling_info])
+        return (flag, sampling_info)